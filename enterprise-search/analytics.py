@@ -1,12 +1,25 @@
 """
 搜索分析模块
-记录和分析搜索行为
+记录和分析搜索行为：内存占用固定（最近日志环形缓冲、延迟直方图、热门查询 Sketch），
+统计定期以追加方式写入磁盘，重启后恢复
 """
 
-from typing import List, Dict, Any
+import json
+import os
+import time
+from typing import List, Dict, Any, Optional, Protocol
 from dataclasses import dataclass, field
 from datetime import datetime
-from collections import Counter
+from collections import deque
+
+from config import config
+from sketches import (
+    HyperLogLog,
+    LatencyHistogram,
+    TopK,
+    decode_array,
+    encode_array,
+)
 
 
 @dataclass
@@ -18,14 +31,103 @@ class SearchLog:
     result_count: int
     latency_ms: float
     expanded_terms: List[str] = field(default_factory=list)
+    stage_latencies: Dict[str, float] = field(default_factory=dict)
+
+    def to_row(self) -> list:
+        return [
+            self.query,
+            round(self.timestamp.timestamp(), 3),
+            self.result_count,
+            round(self.latency_ms, 3),
+            self.expanded_terms,
+            {stage: round(ms, 3) for stage, ms in self.stage_latencies.items()},
+        ]
+
+    @classmethod
+    def from_row(cls, row: list) -> "SearchLog":
+        query, timestamp, result_count, latency_ms, expanded_terms, stages = row
+        return cls(
+            query=query,
+            timestamp=datetime.fromtimestamp(timestamp),
+            result_count=result_count,
+            latency_ms=latency_ms,
+            expanded_terms=expanded_terms,
+            stage_latencies=stages,
+        )
+
+
+class CacheStatsProvider(Protocol):
+    """提供命中统计的缓存"""
+
+    def stats(self) -> Dict[str, Any]: ...
 
 
 class SearchAnalytics:
-    """搜索分析器"""
+    """
+    搜索分析器
+    日志文件每行一条 JSON 记录：{"logs": [...]} 为上次写入后的新日志，
+    {"snapshot": {...}} 为完整统计；增量记录过多时整个文件压缩为一条快照
+    """
+
+    VERSION = 1
+    TOTAL_STAGE = "total"
+    # 最多统计的阶段数（阶段名来自检索路名称，防止意外的名称让直方图无限增加）
+    MAX_STAGES = 32
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(
+        self,
+        path: str = None,
+        recent_size: int = None,
+        top_queries_size: int = None,
+        flush_every: int = None,
+        flush_interval: float = None,
+        compact_every: int = None,
+    ):
+        self.path = config.analytics_path if path is None else path
+        recent_size = config.analytics_recent_size if recent_size is None else recent_size
+        self.top_queries_size = (
+            config.analytics_top_queries if top_queries_size is None else top_queries_size
+        )
+        self.flush_every = config.analytics_flush_every if flush_every is None else flush_every
+        self.flush_interval = (
+            config.analytics_flush_interval if flush_interval is None else flush_interval
+        )
+        self.compact_every = (
+            config.analytics_compact_every if compact_every is None else compact_every
+        )
+
+        # 最近的搜索日志（环形缓冲）
+        self.logs: deque = deque(maxlen=recent_size)
+        self.zero_result_queries: deque = deque(maxlen=recent_size)
+        self.caches: Dict[str, CacheStatsProvider] = {}
+        self._reset()
+
+        # 上次写入后的新日志（条数达到 flush_every 时立即写入，不会无限增长）
+        self._pending: List[SearchLog] = []
+        self._last_flush = time.monotonic()
+        self._records = 0  # 文件中快照之后的增量记录数
+        if self.path:
+            self._load()
+
+    def _reset(self):
+        self.logs.clear()
+        self.zero_result_queries.clear()
+        self.total_searches = 0
+        self.zero_result_count = 0
+        self.latency_sum = 0.0
+        self.result_sum = 0
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.top_queries = TopK(self.top_queries_size)
+        self.unique_queries = HyperLogLog()
+
+    def register_cache(self, name: str, cache: CacheStatsProvider):
+        """注册缓存，其命中率会出现在统计信息中"""
+        self.caches[name] = cache
 
-    def __init__(self):
-        self.logs: List[SearchLog] = []
-        self.query_counter: Counter = Counter()
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各缓存的命中统计"""
+        return {name: cache.stats() for name, cache in self.caches.items()}
 
     def log_search(
         self,
@@ -33,58 +135,212 @@ class SearchAnalytics:
         result_count: int,
         latency_ms: float,
         expanded_terms: List[str] = None,
+        stage_latencies: Dict[str, float] = None,
     ):
-        """记录搜索"""
+        """记录搜索（stage_latencies 为各阶段耗时，分别统计分位数）"""
         log = SearchLog(
             query=query,
             timestamp=datetime.now(),
             result_count=result_count,
             latency_ms=latency_ms,
             expanded_terms=expanded_terms or [],
+            stage_latencies=stage_latencies or {},
         )
+        self._ingest(log)
+
+        if self.path:
+            self._pending.append(log)
+            if (
+                len(self._pending) >= self.flush_every
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+
+    def _ingest(self, log: SearchLog):
         self.logs.append(log)
-        self.query_counter[query] += 1
+        self.total_searches += 1
+        self.latency_sum += log.latency_ms
+        self.result_sum += log.result_count
+        if log.result_count == 0:
+            self.zero_result_count += 1
+            self.zero_result_queries.append(log.query)
+        self.top_queries.add(log.query)
+        self.unique_queries.add(log.query)
+
+        self._histogram(self.TOTAL_STAGE).record(log.latency_ms)
+        for stage, ms in log.stage_latencies.items():
+            histogram = self._histogram(stage)
+            if histogram is not None:
+                histogram.record(ms)
+
+    def _histogram(self, stage: str) -> Optional[LatencyHistogram]:
+        histogram = self.histograms.get(stage)
+        if histogram is None and len(self.histograms) < self.MAX_STAGES:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        return histogram
+
+    def get_percentiles(self, stage: str = TOTAL_STAGE) -> Dict[str, float]:
+        """某阶段延迟的 p50/p95/p99（毫秒）"""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            return {f"p{p}": 0.0 for p in self.PERCENTILES}
+        return {f"p{p}": histogram.percentile(p) for p in self.PERCENTILES}
 
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
-        if not self.logs:
-            return {
-                "total_searches": 0,
-                "avg_latency_ms": 0,
-                "avg_results": 0,
-            }
-
+        total = self.total_searches
         return {
-            "total_searches": len(self.logs),
-            "avg_latency_ms": sum(log.latency_ms for log in self.logs) / len(self.logs),
-            "avg_results": sum(log.result_count for log in self.logs) / len(self.logs),
-            "unique_queries": len(self.query_counter),
+            "total_searches": total,
+            "avg_latency_ms": self.latency_sum / total if total else 0,
+            "avg_results": self.result_sum / total if total else 0,
+            "unique_queries": self.unique_queries.count(),
+            "zero_result_rate": self.zero_result_count / total if total else 0,
+            "latency": {
+                stage: {**self.get_percentiles(stage), "count": histogram.total}
+                for stage, histogram in self.histograms.items()
+            },
+            "cache": self.get_cache_stats(),
         }
 
     def get_top_queries(self, n: int = 10) -> List[tuple]:
-        """获取热门查询"""
-        return self.query_counter.most_common(n)
+        """获取热门查询（次数为估计值，可能略高）"""
+        return self.top_queries.most_common(n)
 
     def get_recent_searches(self, n: int = 10) -> List[SearchLog]:
         """获取最近搜索"""
-        return self.logs[-n:][::-1]
+        return list(self.logs)[-n:][::-1]
 
     def get_zero_result_queries(self) -> List[str]:
-        """获取无结果的查询"""
-        return [log.query for log in self.logs if log.result_count == 0]
+        """获取最近无结果的查询"""
+        return list(self.zero_result_queries)
 
     def get_slow_queries(self, threshold_ms: float = 2000) -> List[SearchLog]:
-        """获取慢查询"""
+        """获取最近的慢查询"""
         return [log for log in self.logs if log.latency_ms > threshold_ms]
 
+    def flush(self):
+        """把新日志追加到文件，增量记录过多时压缩为快照"""
+        self._last_flush = time.monotonic()
+        if not self.path or not self._pending:
+            return
+
+        if self._records + 1 >= self.compact_every:
+            self._pending.clear()
+            self.compact()
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        record = {"logs": [log.to_row() for log in self._pending]}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._pending.clear()
+        self._records += 1
+
+    def compact(self):
+        """用一条完整快照替换文件内容"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        record = {"snapshot": self._snapshot()}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self._records = 0
+
+    def close(self):
+        """写入尚未保存的日志"""
+        self.flush()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        sketch = self.top_queries.sketch
+        return {
+            "version": self.VERSION,
+            "total_searches": self.total_searches,
+            "zero_result_count": self.zero_result_count,
+            "latency_sum": self.latency_sum,
+            "result_sum": self.result_sum,
+            "histograms": {
+                stage: histogram.to_sparse() for stage, histogram in self.histograms.items()
+            },
+            "sketch": [sketch.depth, sketch.width, encode_array(sketch.table)],
+            "top_queries": list(self.top_queries.candidates.items()),
+            "unique_queries": encode_array(self.unique_queries.registers),
+            "logs": [log.to_row() for log in self.logs],
+            "zero_result_queries": list(self.zero_result_queries),
+        }
+
+    def _restore(self, snapshot: Dict[str, Any]):
+        self._reset()
+        self.total_searches = snapshot["total_searches"]
+        self.zero_result_count = snapshot["zero_result_count"]
+        self.latency_sum = snapshot["latency_sum"]
+        self.result_sum = snapshot["result_sum"]
+        for stage, sparse in snapshot["histograms"].items():
+            histogram = self._histogram(stage)
+            if histogram is not None:
+                histogram.merge_sparse(sparse)
+
+        depth, width, table = snapshot["sketch"]
+        sketch = self.top_queries.sketch
+        if (depth, width) == (sketch.depth, sketch.width):
+            sketch.table = decode_array(table, sketch.table.dtype, sketch.table.shape)
+        candidates = sorted(snapshot["top_queries"], key=lambda item: -item[1])
+        self.top_queries.candidates = dict(candidates[: self.top_queries_size])
+
+        registers = self.unique_queries.registers
+        self.unique_queries.merge(
+            decode_array(snapshot["unique_queries"], registers.dtype, registers.shape)
+        )
+        self.logs.extend(SearchLog.from_row(row) for row in snapshot["logs"])
+        self.zero_result_queries.extend(snapshot["zero_result_queries"])
+
+    def _load(self):
+        """回放日志文件：快照恢复完整统计，其后的增量日志逐条累加"""
+        if not os.path.exists(self.path):
+            return
+
+        records = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时可能留下写了一半的最后一行
+                    continue
+                if "snapshot" in record:
+                    if record["snapshot"].get("version") != self.VERSION:
+                        continue
+                    self._restore(record["snapshot"])
+                    records = 0
+                else:
+                    for row in record.get("logs", []):
+                        self._ingest(SearchLog.from_row(row))
+                    records += 1
+        self._records = records
+        if records >= self.compact_every:
+            self.compact()
+
     def format_stats(self) -> str:
         """格式化统计信息"""
         stats = self.get_stats()
-        return f"""
+        text = f"""
 📊 搜索统计
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 总搜索次数: {stats["total_searches"]}
-唯一查询数: {stats.get("unique_queries", 0)}
+唯一查询数: {stats["unique_queries"]}
 平均延迟: {stats["avg_latency_ms"]:.1f}ms
 平均结果数: {stats["avg_results"]:.1f}
+无结果比例: {stats["zero_result_rate"]:.1%}
 """
+        for stage, latency in stats["latency"].items():
+            text += (
+                f"延迟 {stage}: p50 {latency['p50']:.1f}ms / p95 {latency['p95']:.1f}ms / "
+                f"p99 {latency['p99']:.1f}ms ({latency['count']} 次)\n"
+            )
+        for name, cache_stats in stats["cache"].items():
+            text += (
+                f"缓存 {name}: 命中率 {cache_stats['hit_rate']:.1%} "
+                f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})\n"
+            )
+        return text
@@ -0,0 +1,137 @@
+"""
+向量量化基准测试
+在带标注的查询集上对比全精度、int8 和 PQ 存储的内存占用与召回率（重排前后）
+
+标注查询集可以是 .npz 文件，包含 vectors (n, dim)、queries (q, dim)，
+可选 neighbors (q, k) 为每个查询的相关向量行号；缺少 neighbors 时以全精度精确检索结果为标注
+
+用法:
+    python benchmarks/bench_quantization.py --n 100000 --dim 768
+    python benchmarks/bench_quantization.py --data labelled.npz --rerank-factor 2,4,8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_vector_index import make_vectors
+from vector_index import NumpyVectorIndex, normalize
+
+
+console = Console()
+
+
+def load_dataset(args):
+    """读取标注查询集，未指定时生成合成数据"""
+    if args.data:
+        with np.load(args.data) as data:
+            vectors = normalize(data["vectors"])
+            queries = normalize(data["queries"])
+            neighbors = data["neighbors"] if "neighbors" in data else None
+        return vectors, queries, neighbors
+
+    vectors = make_vectors(args.n, args.dim, clusters=max(8, args.n // 500), seed=0)
+    rng = np.random.default_rng(1)
+    queries = normalize(
+        vectors[rng.integers(0, args.n, args.queries)]
+        + rng.normal(scale=0.05, size=(args.queries, args.dim)).astype(np.float32)
+    )
+    return vectors, queries, None
+
+
+def measure(index: NumpyVectorIndex, queries: np.ndarray, k: int, truth) -> dict:
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = index.search(query[None, :], k)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += len({int(id_) for id_, _ in hits} & expected)
+    return {
+        "p50": float(np.percentile(latencies, 50)),
+        "recall": found / sum(min(k, len(expected)) for expected in truth),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量量化基准测试")
+    parser.add_argument("--data", help="标注查询集 .npz（vectors、queries、可选 neighbors）")
+    parser.add_argument("--n", type=int, default=50000, help="合成向量数量")
+    parser.add_argument("--dim", type=int, default=768, help="合成向量维度")
+    parser.add_argument("--queries", type=int, default=200, help="合成查询数量")
+    parser.add_argument("--k", type=int, default=10, help="返回数量")
+    parser.add_argument("--rerank-factor", default="4", help="重排候选倍数，逗号分隔")
+    parser.add_argument("--pq-subspaces", type=int, default=0, help="PQ 分段数（0 为自动）")
+    parser.add_argument("--ivf", action="store_true", help="同时启用 IVF（默认精确扫描）")
+    args = parser.parse_args()
+
+    vectors, queries, neighbors = load_dataset(args)
+    n, dim = vectors.shape
+    k = args.k
+    if neighbors is None:
+        neighbors = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    truth = [{int(row) for row in row_ids[:k] if row >= 0} for row_ids in neighbors]
+    ids = [str(i) for i in range(n)]
+    full_bytes = vectors.nbytes
+
+    table = Table(title=f"向量量化基准 (n={n}, dim={dim}, k={k})")
+    for column in (
+        "存储",
+        "字节/向量",
+        "常驻内存(MB)",
+        "压缩比",
+        "重排倍数",
+        f"Recall@{k}",
+        "p50(ms)",
+    ):
+        table.add_column(column)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for quantization in ("none", "int8", "pq"):
+            index = NumpyVectorIndex(
+                os.path.join(tmp_dir, quantization),
+                ivf_threshold=1 if args.ivf else 0,
+                quantization=quantization,
+                pq_subspaces=args.pq_subspaces,
+            )
+            index.add(ids, vectors)
+            # 保存后 float32 向量改为内存映射，常驻内存只剩编码
+            index.save()
+
+            if quantization == "none":
+                bytes_per_vector = dim * 4
+                resident = full_bytes
+                factors = [0]
+            else:
+                bytes_per_vector = index.quantizer.bytes_per_vector
+                resident = index.resident_bytes()
+                factors = [0] + [int(value) for value in args.rerank_factor.split(",")]
+
+            for factor in factors:
+                index.rerank_factor = factor
+                stats = measure(index, queries, k, truth)
+                table.add_row(
+                    quantization,
+                    str(bytes_per_vector),
+                    f"{resident / 1024 / 1024:.1f}",
+                    f"{full_bytes / resident:.1f}x",
+                    str(factor) if factor else "-",
+                    f"{stats['recall']:.3f}",
+                    f"{stats['p50']:.2f}",
+                )
+
+    console.print(table)
+    console.print("[dim]重排倍数为 - 时只按量化后的近似分数排序；重排读取内存映射中的 float32 向量[/dim]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+检索基准测试
+在本地生成的中英文合成语料上离线测量 BM25Retriever、VectorRetriever、HybridSearcher 和 Reranker
+的吞吐（QPS）、延迟分位数以及 Recall@k / nDCG@k；向量模型、查询扩展 LLM 和重排序后端均为确定性替身，
+无需网络。结果写入 JSON 报告，可与其他提交的报告对比
+
+用法:
+    python benchmarks/bench_retrieval.py --docs 20000 --queries 300
+    python benchmarks/bench_retrieval.py --baseline benchmarks/results/retrieval-abc1234.json
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+# 添加项目根目录到路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cache import LRUCache, TieredCache
+from chunk_store import ChunkStore
+from bm25_retriever import BM25Retriever
+from embedding_cache import CachedEmbeddings
+from hybrid_search import HybridSearcher
+from reranker import Reranker
+from tokenizer import Tokenizer, get_tokenizer
+from vector_index import NumpyVectorIndex
+from vector_retriever import VectorRetriever
+from synthetic import (
+    FakeEmbeddings,
+    FakeExpander,
+    FakeRerankBackend,
+    LabelledQuery,
+    build_corpus,
+    register_vocabulary,
+)
+
+
+console = Console()
+
+REPORT_VERSION = 1
+COMPONENTS = ("bm25", "vector", "hybrid", "rerank")
+
+
+def recall_at_k(ranking: Sequence[str], relevance: Dict[str, int], k: int) -> float:
+    """前 k 个结果中相关文档的占比（分母为 min(k, 相关文档数)）"""
+    if not relevance:
+        return 0.0
+    found = sum(1 for chunk_id in ranking[:k] if relevance.get(chunk_id, 0) > 0)
+    return found / min(k, len(relevance))
+
+
+def ndcg_at_k(ranking: Sequence[str], relevance: Dict[str, int], k: int) -> float:
+    """分级相关度的 nDCG@k，增益为 2^rel - 1"""
+    dcg = sum(
+        (2 ** relevance.get(chunk_id, 0) - 1) / math.log2(i + 2)
+        for i, chunk_id in enumerate(ranking[:k])
+    )
+    ideal = sorted(relevance.values(), reverse=True)[:k]
+    idcg = sum((2**grade - 1) / math.log2(i + 2) for i, grade in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def latency_summary(latencies_ms: List[float], elapsed: float) -> Dict[str, float]:
+    latencies = np.asarray(latencies_ms)
+    return {
+        "qps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def run_component(
+    search: Callable[[LabelledQuery], List],
+    queries: List[LabelledQuery],
+    k: int,
+) -> Dict[str, float]:
+    """逐条执行查询，返回吞吐、延迟分位数和检索质量"""
+    latencies, recalls, ndcgs = [], [], []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        results = search(query)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+        ranking = [result.document.metadata["chunk_id"] for result in results]
+        recalls.append(recall_at_k(ranking, query.relevance, k))
+        ndcgs.append(ndcg_at_k(ranking, query.relevance, k))
+    elapsed = time.perf_counter() - start
+
+    return {
+        **latency_summary(latencies, elapsed),
+        f"recall@{k}": float(np.mean(recalls)),
+        f"ndcg@{k}": float(np.mean(ndcgs)),
+    }
+
+
+def memory_cache(size: int = 100000, **kwargs) -> TieredCache:
+    """只有内存层的缓存（基准测试不读写磁盘缓存）"""
+    return TieredCache(LRUCache(max_size=size), **kwargs)
+
+
+def git_revision() -> Dict[str, object]:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True)
+
+    try:
+        commit = git("rev-parse", "--short", "HEAD").stdout.strip()
+        dirty = git("status", "--porcelain", "--untracked-files=no", ".").stdout.strip() != ""
+    except OSError:
+        return {"commit": "", "dirty": False}
+    return {"commit": commit, "dirty": dirty}
+
+
+def run_benchmark(args, tokenizer: Tokenizer = None) -> Dict[str, object]:
+    """构建合成语料和索引，依次测量各组件，返回报告（主题词会加入 tokenizer 的词典）"""
+    tokenizer = tokenizer or get_tokenizer()
+    tokenizer.warm_up()
+    register_vocabulary(tokenizer)
+
+    start = time.perf_counter()
+    corpus = build_corpus(
+        n_docs=args.docs,
+        n_queries=args.queries,
+        n_topics=args.topics,
+        zh_ratio=args.zh_ratio,
+        seed=args.seed,
+    )
+    corpus_seconds = time.perf_counter() - start
+    concepts = corpus.concepts
+    k = args.k
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = ChunkStore(":memory:")
+
+        start = time.perf_counter()
+        bm25 = BM25Retriever(store, tokenizer)
+        bm25.build_index(corpus.documents)
+        bm25_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fake_embeddings = FakeEmbeddings(concepts, dim=args.dim, tokenizer=tokenizer)
+        embeddings = CachedEmbeddings(
+            fake_embeddings,
+            cache=memory_cache(
+                encode=lambda vector: vector.tobytes(),
+                decode=lambda data: np.frombuffer(data, dtype=np.float32),
+            ),
+            namespace="bench",
+        )
+        index = NumpyVectorIndex(
+            os.path.join(tmp_dir, "vectors"),
+            ivf_threshold=args.ivf_threshold,
+            quantization=args.quantization,
+        )
+        vector = VectorRetriever(store, index, embeddings)
+        ids = [doc.metadata["chunk_id"] for doc in corpus.documents]
+        for i in range(0, len(ids), 1000):
+            batch = corpus.documents[i : i + 1000]
+            vectors = np.asarray(
+                fake_embeddings.embed_documents([doc.page_content for doc in batch]),
+                dtype=np.float32,
+            )
+            index.add(ids[i : i + 1000], vectors, batch)
+        # 触发合并（以及 IVF 训练、量化）
+        index.search(vectors[:1], 1)
+        vector_seconds = time.perf_counter() - start
+
+        hybrid = HybridSearcher(bm25, vector)
+        expander = FakeExpander(tokenizer)
+        reranker = Reranker(
+            FakeRerankBackend(concepts, args.rerank_latency_ms, tokenizer), memory_cache()
+        )
+
+        def expansions(query: LabelledQuery) -> List[str]:
+            return expander(query.text) if args.expansion else []
+
+        # 重排序只计重排本身的耗时，候选取自混合检索
+        hybrid_results = {
+            query.query_id: hybrid.search(query.text, expansions=expansions(query)).results
+            for query in corpus.queries
+        }
+        searches = {
+            "bm25": lambda query: bm25.search(query.text, k),
+            "vector": lambda query: vector.search(query.text, k),
+            "hybrid": lambda query: hybrid.search(
+                query.text, expansions=expansions(query)
+            ).results[:k],
+            "rerank": lambda query: reranker.rerank(
+                query.text, hybrid_results[query.query_id], top_n=k
+            ),
+        }
+
+        def clear_caches():
+            tokenizer.cache.clear()
+            embeddings.cache.memory.clear()
+            reranker.cache.memory.clear()
+
+        components = {}
+        for name in COMPONENTS:
+            # 每个组件从冷缓存开始，避免前一个组件的查询分词、查询向量缓存影响结果
+            searches[name](corpus.queries[0])  # 预热（首次调用的惰性初始化）
+            clear_caches()
+            components[name] = run_component(searches[name], corpus.queries, k)
+        hybrid.shutdown()
+
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        **git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "params": {
+            "docs": args.docs,
+            "queries": args.queries,
+            "topics": args.topics,
+            "zh_ratio": args.zh_ratio,
+            "seed": args.seed,
+            "k": k,
+            "dim": args.dim,
+            "quantization": args.quantization,
+            "ivf_threshold": args.ivf_threshold,
+            "expansion": args.expansion,
+            "rerank_latency_ms": args.rerank_latency_ms,
+        },
+        "build": {
+            "corpus_s": corpus_seconds,
+            "bm25_s": bm25_seconds,
+            "vector_s": vector_seconds,
+            "avg_relevant": float(np.mean([len(q.relevance) for q in corpus.queries])),
+        },
+        "components": components,
+    }
+
+
+def print_report(report: Dict[str, object], baseline: Dict[str, object] = None):
+    k = report["params"]["k"]
+    metrics = ("qps", "p50_ms", "p95_ms", "p99_ms", f"recall@{k}", f"ndcg@{k}")
+    params = report["params"]
+    title = (
+        f"检索基准 (docs={params['docs']}, queries={params['queries']}, k={k}, "
+        f"commit={report['commit'] or '-'}{'+' if report['dirty'] else ''})"
+    )
+    table = Table(title=title)
+    table.add_column("组件")
+    for metric in metrics:
+        table.add_column(metric, justify="right")
+
+    for name, values in report["components"].items():
+        base = (baseline or {}).get("components", {}).get(name, {})
+        cells = []
+        for metric in metrics:
+            value = values[metric]
+            if "@" in metric:
+                cell = f"{value:.3f}"
+            else:
+                cell = f"{value:.1f}" if metric == "qps" else f"{value:.2f}"
+            if metric in base and base[metric]:
+                cell += f" ({(value - base[metric]) / base[metric]:+.1%})"
+            cells.append(cell)
+        table.add_row(name, *cells)
+
+    console.print(table)
+    build = report["build"]
+    console.print(
+        f"[dim]构建: 语料 {build['corpus_s']:.1f}s | BM25 {build['bm25_s']:.1f}s | "
+        f"向量 {build['vector_s']:.1f}s | 平均相关文档 {build['avg_relevant']:.0f} 篇[/dim]"
+    )
+    if baseline:
+        console.print(f"[dim]括号内为相对基线 {baseline.get('commit') or '-'} 的变化[/dim]")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="检索基准测试（离线）")
+    parser.add_argument("--docs", type=int, default=5000, help="合成文档数量")
+    parser.add_argument("--queries", type=int, default=200, help="标注查询数量")
+    parser.add_argument("--topics", type=int, default=20, help="主题数量")
+    parser.add_argument("--zh-ratio", type=float, default=0.7, help="中文文档和查询的比例")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--k", type=int, default=10, help="评估 Recall@k / nDCG@k 的 k")
+    parser.add_argument("--dim", type=int, default=256, help="替身向量维度")
+    parser.add_argument("--quantization", default="none", help="向量量化：none / int8 / pq")
+    parser.add_argument("--ivf-threshold", type=int, default=0, help="IVF 阈值（0 为精确检索）")
+    parser.add_argument(
+        "--no-expansion", dest="expansion", action="store_false", help="混合检索不使用查询扩展"
+    )
+    parser.add_argument(
+        "--rerank-latency-ms", type=float, default=0, help="模拟重排序接口每次调用的耗时"
+    )
+    parser.add_argument("--output", help="报告路径（默认 benchmarks/results/retrieval-<commit>.json）")
+    parser.add_argument("--baseline", help="对比的基线报告")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    report = run_benchmark(args)
+
+    output = args.output or os.path.join(
+        ROOT, "benchmarks", "results", f"retrieval-{report['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    console.print(f"[dim]报告已写入 {output}[/dim]")
+
+
+if __name__ == "__main__":
+    main()
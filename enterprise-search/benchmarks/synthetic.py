@@ -0,0 +1,232 @@
+"""
+离线基准数据
+本地生成的中英文合成语料和带分级相关度标注的查询集，以及不依赖网络的确定性替身：
+向量模型（概念哈希）、查询扩展（中英互译）和重排序后端（概念重合度）
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from rerank_backends import RerankBackend
+from tokenizer import Tokenizer, get_tokenizer
+
+
+# 主题词表：(中文, 英文) 同义词对，同一对在向量替身中表示同一个概念
+VOCABULARY = [
+    ("缓存", "cache"), ("数据库", "database"), ("索引", "index"), ("查询", "query"),
+    ("事务", "transaction"), ("副本", "replica"), ("分片", "shard"), ("日志", "log"),
+    ("监控", "monitoring"), ("告警", "alert"), ("部署", "deployment"), ("容器", "container"),
+    ("集群", "cluster"), ("节点", "node"), ("负载", "load"), ("延迟", "latency"),
+    ("吞吐", "throughput"), ("内存", "memory"), ("磁盘", "disk"), ("网络", "network"),
+    ("协议", "protocol"), ("加密", "encryption"), ("证书", "certificate"), ("权限", "permission"),
+    ("认证", "authentication"), ("审计", "audit"), ("备份", "backup"), ("恢复", "recovery"),
+    ("迁移", "migration"), ("版本", "version"), ("接口", "interface"), ("网关", "gateway"),
+    ("队列", "queue"), ("消息", "message"), ("订阅", "subscription"), ("调度", "scheduler"),
+    ("任务", "task"), ("线程", "thread"), ("进程", "process"), ("死锁", "deadlock"),
+    ("压缩", "compression"), ("序列化", "serialization"), ("编码", "encoding"), ("模型", "model"),
+    ("训练", "training"), ("推理", "inference"), ("向量", "vector"), ("检索", "retrieval"),
+    ("排序", "ranking"), ("召回", "recall"), ("分词", "tokenizer"), ("语料", "corpus"),
+    ("报表", "report"), ("预算", "budget"), ("合同", "contract"), ("发票", "invoice"),
+    ("采购", "procurement"), ("供应商", "supplier"), ("库存", "inventory"), ("物流", "logistics"),
+    ("招聘", "recruitment"), ("绩效", "performance"), ("考勤", "attendance"), ("薪酬", "salary"),
+    ("培训", "workshop"), ("客户", "customer"), ("订单", "order"), ("退款", "refund"),
+    ("优惠", "discount"), ("会员", "membership"), ("营销", "marketing"), ("渠道", "channel"),
+    ("合规", "compliance"), ("风险", "risk"), ("隐私", "privacy"), ("政策", "policy"),
+    ("流程", "workflow"), ("审批", "approval"), ("文档", "document"), ("模板", "template"),
+]
+
+# 各主题共用的填充词
+FILLER = {
+    "zh": "系统 平台 方案 说明 配置 管理 方法 问题 情况 需要 支持 功能 设计 实现 提高 保证".split(),
+    "en": "system platform solution guide config manage method issue case need "
+    "support feature design implement improve ensure".split(),
+}
+
+
+@dataclass
+class LabelledQuery:
+    """带标注的查询：relevance 为 chunk_id -> 相关度等级（2 高度相关，1 相关）"""
+
+    query_id: str
+    text: str
+    topic: int
+    relevance: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class SyntheticCorpus:
+    documents: List[Document]
+    queries: List[LabelledQuery]
+    topics: List[List[int]]  # 每个主题包含的词对序号
+
+    @property
+    def concepts(self) -> Dict[str, str]:
+        """词 -> 概念（中英文同义词映射到同一个概念）"""
+        return {form: en for zh, en in VOCABULARY for form in (zh, en)}
+
+
+def build_corpus(
+    n_docs: int = 5000,
+    n_queries: int = 200,
+    n_topics: int = 20,
+    words_per_topic: int = 8,
+    doc_length: int = 60,
+    zh_ratio: float = 0.7,
+    seed: int = 0,
+) -> SyntheticCorpus:
+    """
+    生成语料和查询集（同样的参数总是得到同样的结果）
+    每篇文档属于一个主题，约三分之一的词取自主题词表，其余为填充词；
+    查询由同一主题的两个词组成，该主题中包含全部查询词的文档相关度为 2，包含其一为 1
+    """
+    rng = np.random.default_rng(seed)
+    topics = [
+        sorted(rng.choice(len(VOCABULARY), words_per_topic, replace=False).tolist())
+        for _ in range(n_topics)
+    ]
+
+    documents = []
+    topic_docs: List[List[tuple]] = [[] for _ in range(n_topics)]
+    for i in range(n_docs):
+        topic = int(rng.integers(n_topics))
+        language = "zh" if rng.random() < zh_ratio else "en"
+        length = int(rng.integers(doc_length // 2, doc_length * 3 // 2))
+        words, pairs = [], set()
+        for _ in range(length):
+            if rng.random() < 0.35:
+                pair = topics[topic][int(rng.integers(words_per_topic))]
+                pairs.add(pair)
+                words.append(VOCABULARY[pair][0 if language == "zh" else 1])
+            else:
+                words.append(FILLER[language][int(rng.integers(len(FILLER[language])))])
+        documents.append(
+            Document(
+                page_content=_join(words, language),
+                metadata={
+                    "chunk_id": f"doc{i}",
+                    "doc_id": f"doc{i}",
+                    "filename": f"doc{i}.txt",
+                    "file_type": "TXT",
+                    "topic": topic,
+                    "language": language,
+                },
+            )
+        )
+        topic_docs[topic].append((f"doc{i}", pairs))
+
+    queries = []
+    for i in range(n_queries):
+        topic = int(rng.integers(n_topics))
+        pairs = rng.choice(topics[topic], 2, replace=False).tolist()
+        language = 0 if rng.random() < zh_ratio else 1
+        words = [VOCABULARY[pair][language] for pair in pairs]
+        text = _join(words, "zh" if language == 0 else "en")
+        relevance = {}
+        for chunk_id, doc_pairs in topic_docs[topic]:
+            hits = sum(pair in doc_pairs for pair in pairs)
+            if hits:
+                relevance[chunk_id] = 2 if hits == len(pairs) else 1
+        queries.append(LabelledQuery(f"q{i}", text, topic, relevance))
+
+    return SyntheticCorpus(documents, queries, topics)
+
+
+def register_vocabulary(tokenizer: Tokenizer = None):
+    """把主题词加入分词词典（相当于配置 JIEBA_USER_DICT）"""
+    tokenizer = tokenizer or get_tokenizer()
+    for zh, _ in VOCABULARY:
+        tokenizer.add_word(zh)
+
+
+def _join(words: List[str], language: str) -> str:
+    if language == "en":
+        return " ".join(words)
+    # 中文每 6 个词加一个逗号，模拟句子
+    return "".join(word + ("，" if i % 6 == 5 else "") for i, word in enumerate(words))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    确定性向量替身：分词后把同义词映射到同一概念，按概念做特征哈希并归一化
+    中文查询能命中英文文档，效果上接近真实的跨语言语义向量
+    """
+
+    def __init__(self, concepts: Dict[str, str], dim: int = 256, tokenizer: Tokenizer = None):
+        self.concepts = concepts
+        self.dim = dim
+        self.tokenizer = tokenizer or get_tokenizer()
+        self._slots: Dict[str, tuple] = {}
+
+    def _slot(self, concept: str) -> tuple:
+        slot = self._slots.get(concept)
+        if slot is None:
+            digest = hashlib.blake2b(concept.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            slot = self._slots[concept] = (value % self.dim, 1.0 if value >> 63 else -1.0)
+        return slot
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in self.tokenizer.tokenize(text):
+            index, sign = self._slot(self.concepts.get(token, token))
+            # 主题词权重高于填充词
+            vector[index] += sign * (3.0 if token in self.concepts else 1.0)
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeExpander:
+    """查询扩展替身（代替 LLM）：返回查询中主题词的另一种语言表达"""
+
+    def __init__(self, tokenizer: Tokenizer = None):
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.translations = {}
+        for zh, en in VOCABULARY:
+            self.translations[zh], self.translations[en] = en, zh
+
+    def __call__(self, query: str) -> List[str]:
+        words = [self.translations.get(token) for token in self.tokenizer.tokenize_query(query)]
+        words = [word for word in words if word]
+        return [" ".join(words)] if words else []
+
+
+class FakeRerankBackend(RerankBackend):
+    """
+    重排序替身：分数为查询概念在文档中的覆盖率（并按出现次数微调）
+    latency_ms 模拟远程评分接口每次调用的耗时
+    """
+
+    name = "fake"
+
+    def __init__(self, concepts: Dict[str, str], latency_ms: float = 0, tokenizer=None):
+        self.concepts = concepts
+        self.latency_ms = latency_ms
+        self.tokenizer = tokenizer or get_tokenizer()
+
+    def _concepts(self, tokens) -> List[str]:
+        return [self.concepts.get(token, token) for token in tokens]
+
+    def score(self, query: str, contents: List[str]) -> List[float]:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        wanted = set(self._concepts(self.tokenizer.tokenize_query(query)))
+        scores = []
+        for content in contents:
+            found = self._concepts(self.tokenizer.tokenize(content))
+            counts = {concept: found.count(concept) for concept in wanted}
+            coverage = sum(1 for count in counts.values() if count) / max(1, len(wanted))
+            density = sum(counts.values()) / max(1, len(found))
+            scores.append(round(90 * coverage + 10 * min(1.0, density * 4), 4))
+        return scores
@@ -3,22 +3,28 @@ BM25 检索器模块
 基于词频的关键词检索
 """
 
+import os
 import re
-from typing import List, Tuple
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 
-import jieba
-from rank_bm25 import BM25Okapi
+import numpy as np
 from langchain_core.documents import Document
 
 from config import config
+from chunk_store import ChunkStore
+from inverted_index import InvertedIndex, InvertedIndexBuilder
+from search_filter import SearchFilter
+from tokenizer import Tokenizer, get_tokenizer
+from tracing import span
 
 
 @dataclass
 class BM25Result:
     """BM25 检索结果"""
 
-    document: Document
+    document: Document  # 来自文档块存储的 LazyDocument，访问文本时才读取
     score: float
     rank: int
 
@@ -26,54 +32,185 @@ class BM25Result:
 class BM25Retriever:
     """BM25 检索器"""
 
-    def __init__(self):
-        self.documents: List[Document] = []
-        self.tokenized_docs: List[List[str]] = []
-        self.bm25: BM25Okapi = None
+    # build_index 每次处理的文档块数
+    BUILD_WINDOW = 500
+
+    def __init__(self, store: ChunkStore = None, tokenizer: Tokenizer = None):
+        # 只常驻 chunk_id，文档块文本按需从存储中读取
+        self.store = store if store is not None else ChunkStore(":memory:")
+        # 与高亮器共用分词服务，同一查询只分词一次
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.chunk_ids: List[str] = []
+        self.index: InvertedIndex = None
+        self._builder: InvertedIndexBuilder = None
+        self._building_ids: List[str] = []
+        # 存储行号 -> 索引文档号（过滤时使用），存储或索引变化后重建
+        self._doc_of_row: Optional[np.ndarray] = None
+        self._doc_of_row_generation = -1
 
     def _tokenize(self, text: str) -> List[str]:
         """分词（支持中英文）"""
-        # 英文转小写
-        text = text.lower()
-
-        # 中文分词
-        tokens = list(jieba.cut(text))
-
-        # 过滤停用词和短词
-        tokens = [t.strip() for t in tokens if len(t.strip()) > 1]
-
-        return tokens
-
-    def build_index(self, documents: List[Document]):
-        """构建 BM25 索引"""
-        self.documents = documents
-        self.tokenized_docs = [self._tokenize(doc.page_content) for doc in documents]
-        self.bm25 = BM25Okapi(self.tokenized_docs)
-
-    def search(self, query: str, top_k: int = None) -> List[BM25Result]:
-        """搜索"""
-        if not self.bm25:
+        return self.tokenizer.tokenize(text)
+
+    def _tokenize_query(self, query: str) -> List[str]:
+        """查询分词（经过分词缓存）"""
+        return list(self.tokenizer.tokenize_query(query))
+
+    def build_index(self, documents: Iterable[Document]):
+        """构建 BM25 索引（同时写入文档块存储）"""
+        self.begin_build()
+        documents = iter(documents)
+        while True:
+            window = list(islice(documents, self.BUILD_WINDOW))
+            if not window:
+                break
+            self.store.add(window)
+            self.add_documents(window)
+        self.finish_build()
+
+    def begin_build(self):
+        """开始增量构建"""
+        self._builder = InvertedIndexBuilder()
+        self._building_ids = []
+
+    def add_documents(self, documents: Iterable[Document]):
+        """分词并加入正在构建的索引（文本不保留，需由调用方写入存储）"""
+        documents = list(documents)
+        # 整批分词（批量较大时并行）
+        for doc, tokens in zip(
+            documents, self.tokenizer.tokenize_batch(doc.page_content for doc in documents)
+        ):
+            self._builder.add(tokens)
+            self._building_ids.append(doc.metadata.get("chunk_id", ""))
+
+    def finish_build(self):
+        """完成构建并替换当前索引"""
+        chunk_ids = self._building_ids
+        self.index = self._builder.finish() if chunk_ids else None
+        self.chunk_ids = chunk_ids
+        self._doc_of_row = None
+        self._builder, self._building_ids = None, []
+
+    def search(
+        self, query: str, top_k: int = None, search_filter: SearchFilter = None
+    ) -> List[BM25Result]:
+        """搜索（search_filter 限定检索范围，只对满足条件的倒排项打分）"""
+        if not self.index:
             return []
 
         top_k = top_k or config.bm25_top_k
 
         # 分词查询
-        tokenized_query = self._tokenize(query)
-
-        # 获取分数
-        scores = self.bm25.get_scores(tokenized_query)
+        with span("bm25.tokenize"):
+            tokens = self._tokenize_query(query)
+        return self._search_tokens(tokens, top_k, self._candidates(search_filter))
 
-        # 排序并获取 top_k
-        scored_docs = list(zip(self.documents, scores))
-        scored_docs.sort(key=lambda x: x[1], reverse=True)
+    def search_batch(
+        self, queries: List[str], top_k: int = None, search_filter: SearchFilter = None
+    ) -> List[List[BM25Result]]:
+        """批量检索多个查询变体（相同的变体只分词、打分一次）"""
+        if not self.index:
+            return [[] for _ in queries]
 
-        results = []
-        for rank, (doc, score) in enumerate(scored_docs[:top_k], 1):
-            if score > 0:  # 只返回有匹配的结果
-                results.append(BM25Result(document=doc, score=score, rank=rank))
-
-        return results
+        top_k = top_k or config.bm25_top_k
+        candidates = self._candidates(search_filter)
+
+        results_by_query = {}
+        for query in queries:
+            if query not in results_by_query:
+                with span("bm25.tokenize"):
+                    tokens = self._tokenize_query(query)
+                results_by_query[query] = self._search_tokens(tokens, top_k, candidates)
+
+        return [results_by_query[query] for query in queries]
+
+    def _candidates(self, search_filter: SearchFilter) -> Optional[np.ndarray]:
+        """满足过滤条件的索引文档号（升序），没有过滤条件时返回 None"""
+        if not search_filter:
+            return None
+
+        with span("bm25.filter") as filter_span:
+            doc_ids = self._filtered_doc_ids(search_filter)
+            filter_span.set_attribute("candidates", len(doc_ids))
+        return doc_ids
+
+    def _filtered_doc_ids(self, search_filter: SearchFilter) -> np.ndarray:
+        generation = self.store.generation
+        if self._doc_of_row is None or self._doc_of_row_generation != generation:
+            rows = self.store.rows(self.chunk_ids)
+            doc_of_row = np.full(len(self.store), -1, dtype=np.int64)
+            found = rows >= 0
+            doc_of_row[rows[found]] = np.flatnonzero(found)
+            self._doc_of_row, self._doc_of_row_generation = doc_of_row, generation
+
+        doc_ids = self._doc_of_row[self.store.filter_rows(search_filter)]
+        doc_ids = doc_ids[doc_ids >= 0]
+        doc_ids.sort()
+        return doc_ids
+
+    def _search_tokens(
+        self, tokens: List[str], top_k: int, candidates: np.ndarray = None
+    ) -> List[BM25Result]:
+        """按分词结果检索"""
+        # 只对查询词的倒排链打分，并用 argpartition 取 top_k
+        with span("bm25.score", tokens=len(tokens)):
+            doc_ids, scores = self.index.top_k(tokens, top_k, candidates)
+
+        hits = [(doc_id, score) for doc_id, score in zip(doc_ids, scores) if score > 0]
+        # 结果只引用存储中的行，文本在展示或重排序时才读取
+        documents = self.store.get_many([self.chunk_ids[doc_id] for doc_id, _ in hits])
+
+        return [
+            BM25Result(document=document, score=float(score), rank=rank)
+            for rank, (document, (_, score)) in enumerate(zip(documents, hits), 1)
+        ]
+
+    def save(self, path: str = None, fingerprint: str = ""):
+        """保存索引到磁盘"""
+        if not self.index:
+            return
+
+        path = path or config.bm25_index_path
+        self.index.save(path, self.chunk_ids, fingerprint=self._index_fingerprint(fingerprint))
+
+    def _index_fingerprint(self, fingerprint: str) -> str:
+        """索引指纹：文档指纹加分词配置指纹（停用词、词典变化后原有倒排项与查询分词不再一致）"""
+        return f"{fingerprint}:{self.tokenizer.fingerprint()}"
+
+    def load(
+        self,
+        chunk_ids: List[str] = None,
+        path: str = None,
+        fingerprint: str = None,
+    ) -> bool:
+        """
+        从磁盘加载索引（内存映射），索引过期或不匹配时返回 False
+        chunk_ids 为 None 时不校验文档块顺序（由调用方在导入完成后校验）
+        """
+        path = path or config.bm25_index_path
+        if not os.path.exists(path):
+            return False
+
+        header = InvertedIndex.read_header(path)
+        if header is None:
+            return False
+        if (
+            fingerprint is not None
+            and header["fingerprint"] != self._index_fingerprint(fingerprint)
+        ):
+            return False
+
+        index, saved_ids = InvertedIndex.load(path, header)
+
+        # 文档块必须与建索引时一一对应
+        if chunk_ids is not None and chunk_ids != saved_ids:
+            return False
+
+        self.chunk_ids = saved_ids
+        self.index = index
+        self._doc_of_row = None
+        return True
 
     def get_doc_count(self) -> int:
         """获取文档数量"""
-        return len(self.documents)
+        return len(self.chunk_ids)
@@ -0,0 +1,258 @@
+"""
+缓存模块
+LRU + TTL 内存缓存，可选 SQLite 持久化层
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence
+
+
+DEFAULT_NORMALIZATION = ("strip", "lower", "whitespace")
+
+# 查询归一化规则
+NORMALIZATION_RULES: Dict[str, Callable[[str], str]] = {
+    "strip": str.strip,
+    "lower": str.lower,
+    "whitespace": lambda text: re.sub(r"\s+", " ", text),
+    # 全角转半角等兼容字符统一
+    "nfkc": lambda text: unicodedata.normalize("NFKC", text),
+    # 去除首尾标点（如 "缓存？" 与 "缓存"）
+    "punct": lambda text: re.sub(r"^[\W_]+|[\W_]+$", "", text),
+}
+
+
+def normalize_query(query: str, rules: Sequence[str] = DEFAULT_NORMALIZATION) -> str:
+    """查询归一化：默认去首尾空白、转小写、合并连续空白"""
+    for rule in rules:
+        query = NORMALIZATION_RULES[rule](query)
+    return query
+
+
+class LRUCache:
+    """有界 LRU 缓存，支持过期时间和按字节数限制容量（线程安全）"""
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl_seconds: float = None,
+        max_bytes: int = None,
+        sizeof: Callable[[Any], int] = None,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        # key -> (写入时间, 值)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, record_stats: bool = True) -> Optional[Any]:
+        """读取缓存，未命中或已过期时返回 None（record_stats 为 False 时不计入命中统计）"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                if record_stats:
+                    self.misses += 1
+                return None
+
+            created_at, value = item
+            if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+                self._pop(key)
+                if record_stats:
+                    self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            if record_stats:
+                self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, created_at: float = None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (created_at or time.time(), value)
+            if self.sizeof:
+                self.nbytes += self.sizeof(value)
+
+            while len(self._data) > self.max_size or (
+                self.max_bytes and self.nbytes > self.max_bytes and len(self._data) > 1
+            ):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key: Hashable):
+        _, value = self._data.pop(key)
+        if self.sizeof:
+            self.nbytes -= self.sizeof(value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class SQLiteCache:
+    """SQLite 持久化缓存，值以 BLOB 存储"""
+
+    # 每写入多少次检查一次容量
+    PRUNE_INTERVAL = 256
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "cache",
+        ttl_seconds: float = None,
+        max_entries: int = None,
+    ):
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，未命中或已过期时返回 None"""
+        item = self.get_item(key)
+        return item[1] if item else None
+
+    def get_item(self, key: str) -> Optional[tuple]:
+        """读取 (写入时间, 值)"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT created_at, value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            if self.ttl_seconds and time.time() - row[0] > self.ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            return row[0], row[1]
+
+    def set(self, key: str, value: bytes, created_at: float = None):
+        """写入缓存"""
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) "
+                "VALUES (?, ?, ?)",
+                (key, value, created_at or time.time()),
+            )
+            self._conn.commit()
+
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune()
+
+    def _prune(self):
+        """删除过期条目，并在超出容量时删除最早写入的条目"""
+        if self.ttl_seconds:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,),
+            )
+        if self.max_entries:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY created_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """内存 LRU + 可选磁盘层的两级缓存"""
+
+    def __init__(
+        self,
+        memory: LRUCache,
+        disk: SQLiteCache = None,
+        encode: Callable[[Any], bytes] = None,
+        decode: Callable[[bytes], Any] = None,
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.encode = encode or (lambda value: json.dumps(value).encode("utf-8"))
+        self.decode = decode or (lambda data: json.loads(data.decode("utf-8")))
+        self.disk_hits = 0
+
+    def get(self, key: str, record_stats: bool = True) -> Optional[Any]:
+        """先查内存，再查磁盘（命中后回填内存）；record_stats 为 False 时不计入命中统计（如预热）"""
+        value = self.memory.get(key, record_stats)
+        if value is not None or self.disk is None:
+            return value
+
+        item = self.disk.get_item(key)
+        if item is None:
+            return None
+
+        created_at, data = item
+        value = self.decode(data)
+        self.memory.set(key, value, created_at=created_at)
+        if record_stats:
+            self.disk_hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, self.encode(value))
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计（磁盘命中也计入命中）"""
+        stats = self.memory.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        stats["disk_hits"] = self.disk_hits
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,317 @@
+"""
+文档块存储模块
+文档块文本顺序写入一个文本文件（内存映射读取），常用元数据按列存放在紧凑数组中，
+其余加载器元数据序列化为 JSON 后去重存放；检索结果只持有行号，需要展示或重排序时才读取文本
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import config
+from search_filter import SearchFilter
+
+
+class LazyDocument:
+    """
+    延迟加载的文档块（与 Document 一样提供 page_content 和 metadata）
+    metadata 由列数组拼出，page_content 首次访问时才从文本文件读取
+    """
+
+    __slots__ = ("store", "row", "_metadata", "_text")
+
+    def __init__(self, store: "ChunkStore", row: int):
+        self.store = store
+        self.row = row
+        self._metadata: Optional[Dict[str, Any]] = None
+        self._text: Optional[str] = None
+
+    @property
+    def page_content(self) -> str:
+        if self._text is None:
+            self._text = self.store.text(self.row)
+        return self._text
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = self.store.metadata(self.row)
+        return self._metadata
+
+    def to_document(self) -> Document:
+        """转换为 LangChain Document"""
+        return Document(page_content=self.page_content, metadata=dict(self.metadata))
+
+    def __repr__(self) -> str:
+        return f"LazyDocument(chunk_id={self.store.chunk_ids[self.row]!r})"
+
+
+class ChunkStore:
+    """文档块存储（线程安全）"""
+
+    NO_PAGE = -1
+    NO_EXTRA = -1
+
+    # 按列存放的元数据字段，其余字段存入 _extras
+    COLUMN_FIELDS = frozenset(
+        ("doc_id", "filename", "source", "chunk_id", "chunk_index", "chunk_hash", "page")
+    )
+
+    def __init__(self, path: str = None):
+        """path 为 ":memory:" 时文本保存在内存中"""
+        self.path = path or config.chunk_store_path
+        self._lock = threading.Lock()
+        # 每次修改后递增，供依赖行号的缓存判断是否过期
+        self.generation = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._reset_columns()
+        self.reset()
+
+    def _reset_columns(self):
+        self.chunk_ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        # 第 i 个文档块的文本为 blob[offsets[i]:offsets[i + 1]]
+        self._offsets = array("q", [0])
+        # 文档级元数据只存一份，文档块通过 _doc 列引用
+        self._docs: List[Tuple[str, str, str]] = []
+        self._doc_rows: Dict[Tuple[str, str, str], int] = {}
+        self._doc = array("i")
+        self._chunk_index = array("i")
+        self._page = array("i")
+        self._chunk_hash = bytearray()  # 每块 20 字节 SHA-1
+        # 其余元数据的 JSON（同一文档的文档块通常相同，只存一份），_extra 列为序号
+        self._extras: List[str] = []
+        self._extra_rows: Dict[str, int] = {}
+        self._extra = array("i")
+        # 过滤用的位图索引，存储变化后首次过滤时重建
+        self._filter_index: Optional[FilterIndex] = None
+
+    def reset(self):
+        """清空存储（重新导入前调用）"""
+        with self._lock:
+            self._close_blob()
+            self._reset_columns()
+            self.generation += 1
+            if self.path == ":memory:":
+                self._blob = bytearray()
+            else:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "w+b")
+
+    def add(self, chunks: Iterable[Document]):
+        """追加一批文档块"""
+        with self._lock:
+            self.generation += 1
+            for chunk in chunks:
+                metadata = chunk.metadata
+                chunk_id = metadata["chunk_id"]
+                if chunk_id in self._rows:
+                    raise ValueError(f"重复的 chunk_id: {chunk_id}")
+
+                data = chunk.page_content.encode("utf-8")
+                if self._file is not None:
+                    self._file.write(data)
+                else:
+                    self._blob += data
+                self._offsets.append(self._offsets[-1] + len(data))
+
+                doc_key = (
+                    metadata.get("doc_id", ""),
+                    metadata.get("filename", ""),
+                    metadata.get("source", ""),
+                )
+                doc_row = self._doc_rows.get(doc_key)
+                if doc_row is None:
+                    doc_row = self._doc_rows[doc_key] = len(self._docs)
+                    self._docs.append(doc_key)
+
+                self._rows[chunk_id] = len(self.chunk_ids)
+                self.chunk_ids.append(chunk_id)
+                self._doc.append(doc_row)
+                self._chunk_index.append(metadata.get("chunk_index", 0))
+                page = metadata.get("page")
+                self._page.append(self.NO_PAGE if page is None else int(page))
+                # 缺少哈希时按文本计算（与重排序缓存键的计算方式一致）
+                chunk_hash = metadata.get("chunk_hash") or hashlib.sha1(data).hexdigest()
+                self._chunk_hash += bytes.fromhex(chunk_hash)
+                self._extra.append(self._intern_extra(metadata))
+
+    def _intern_extra(self, metadata: Dict[str, Any]) -> int:
+        """列以外的元数据序列化后去重，返回序号（调用方持有锁）"""
+        extra = {key: value for key, value in metadata.items() if key not in self.COLUMN_FIELDS}
+        if not extra:
+            return self.NO_EXTRA
+        data = json.dumps(extra, ensure_ascii=False, sort_keys=True, default=str)
+        extra_row = self._extra_rows.get(data)
+        if extra_row is None:
+            extra_row = self._extra_rows[data] = len(self._extras)
+            self._extras.append(data)
+        return extra_row
+
+    def text(self, row: int) -> str:
+        """读取文档块文本"""
+        start, end = self._offsets[row], self._offsets[row + 1]
+        if start == end:
+            return ""
+        if self._file is None:
+            return bytes(self._blob[start:end]).decode("utf-8")
+
+        with self._lock:
+            # 写入后首次读取或文件变大时重新映射
+            if self._mmap is None or len(self._mmap) < end:
+                self._file.flush()
+                if self._mmap is not None:
+                    self._mmap.close()
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap[start:end].decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """由列数组和其余元数据组装文档块元数据"""
+        extra_row = self._extra[row]
+        metadata = json.loads(self._extras[extra_row]) if extra_row != self.NO_EXTRA else {}
+        doc_fields = zip(("doc_id", "filename", "source"), self._docs[self._doc[row]])
+        metadata.update((key, value) for key, value in doc_fields if value)
+        metadata.update(
+            {
+                "chunk_id": self.chunk_ids[row],
+                "chunk_index": self._chunk_index[row],
+                "chunk_hash": self._chunk_hash[row * 20 : (row + 1) * 20].hex(),
+            }
+        )
+        if self._page[row] != self.NO_PAGE:
+            metadata["page"] = self._page[row]
+        return metadata
+
+    def rows(self, chunk_ids: List[str]) -> np.ndarray:
+        """chunk_id 对应的行号，不存在的为 -1"""
+        rows = (self._rows.get(chunk_id, -1) for chunk_id in chunk_ids)
+        return np.fromiter(rows, dtype=np.int64, count=len(chunk_ids))
+
+    def filter_rows(self, search_filter: SearchFilter) -> np.ndarray:
+        """满足过滤条件的行号（升序）"""
+        with self._lock:
+            if self._filter_index is None or self._filter_index.generation != self.generation:
+                self._filter_index = FilterIndex(
+                    self._docs,
+                    np.array(self._doc, dtype=np.int32),
+                    np.array(self._page, dtype=np.int32),
+                    self.generation,
+                )
+            filter_index = self._filter_index
+        return filter_index.rows(search_filter)
+
+    def get(self, chunk_id: str) -> LazyDocument:
+        return LazyDocument(self, self._rows[chunk_id])
+
+    def get_many(self, chunk_ids: List[str]) -> List[LazyDocument]:
+        """按 chunk_id 取文档块，保持传入顺序"""
+        missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in self._rows]
+        if missing:
+            raise KeyError(f"文档块不存在: {missing[0]}")
+        return [LazyDocument(self, self._rows[chunk_id]) for chunk_id in chunk_ids]
+
+    def iter_chunks(self, chunk_ids: List[str]) -> Iterator[LazyDocument]:
+        """按给定顺序逐个读取文档块"""
+        for chunk_id in chunk_ids:
+            yield self.get(chunk_id)
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._rows
+
+    def _close_blob(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close_blob()
+
+
+class FilterIndex:
+    """
+    元数据过滤的位图索引
+    doc_id、文件名、文件类型都是文档级字段：每个取值对应一个文档位图，
+    命中的文档再通过按文档分组的行号表展开，只访问满足条件的行；页码条件对页码列做向量化比较
+    """
+
+    FIELDS = ("doc_ids", "filenames", "file_types")
+
+    def __init__(
+        self,
+        docs: List[Tuple[str, str, str]],
+        doc: np.ndarray,
+        page: np.ndarray,
+        generation: int = 0,
+    ):
+        self.generation = generation
+        self.n_rows = len(doc)
+        self.page = page
+
+        # 字段 -> 取值 -> 文档位图
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {name: {} for name in self.FIELDS}
+        for doc_row, (doc_id, filename, _) in enumerate(docs):
+            file_type = os.path.splitext(filename)[1].lstrip(".").upper()
+            for name, value in zip(self.FIELDS, (doc_id, filename, file_type)):
+                if not value:
+                    continue
+                bitmap = self.bitmaps[name].get(value)
+                if bitmap is None:
+                    bitmap = self.bitmaps[name][value] = np.zeros(len(docs), dtype=bool)
+                bitmap[doc_row] = True
+
+        # CSR 结构: 第 d 个文档的行号为 doc_rows[doc_offsets[d]:doc_offsets[d + 1]]
+        self.doc_rows = np.argsort(doc, kind="stable").astype(np.int64)
+        self.doc_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc, minlength=len(docs)), out=self.doc_offsets[1:])
+
+    def doc_mask(self, search_filter: SearchFilter) -> Optional[np.ndarray]:
+        """满足文档级条件的文档位图，没有文档级条件时返回 None"""
+        mask = None
+        for name in self.FIELDS:
+            values = getattr(search_filter, name)
+            if not values:
+                continue
+            field_mask = np.zeros(len(self.doc_offsets) - 1, dtype=bool)
+            for value in values:
+                bitmap = self.bitmaps[name].get(value)
+                if bitmap is not None:
+                    field_mask |= bitmap
+            mask = field_mask if mask is None else mask & field_mask
+        return mask
+
+    def rows(self, search_filter: SearchFilter) -> np.ndarray:
+        doc_mask = self.doc_mask(search_filter)
+        if doc_mask is None:
+            rows = np.arange(self.n_rows, dtype=np.int64)
+        else:
+            docs = np.flatnonzero(doc_mask)
+            rows = np.concatenate(
+                [self.doc_rows[self.doc_offsets[d] : self.doc_offsets[d + 1]] for d in docs]
+                or [np.zeros(0, dtype=np.int64)]
+            )
+            rows.sort()
+
+        if search_filter.has_page_range:
+            pages = self.page[rows]
+            keep = pages != ChunkStore.NO_PAGE
+            if search_filter.page_min is not None:
+                keep &= pages >= search_filter.page_min
+            if search_filter.page_max is not None:
+                keep &= pages <= search_filter.page_max
+            rows = rows[keep]
+        return rows
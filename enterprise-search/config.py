@@ -20,23 +20,136 @@ class Config:
     llm_model: str = os.getenv("LLM_MODEL", "gemini-2.0-flash")
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
 
+    # 查询向量缓存
+    query_normalization: tuple = tuple(
+        os.getenv("QUERY_NORMALIZATION", "strip,lower,whitespace").split(",")
+    )
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    embedding_cache_max_mb: float = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+    embedding_cache_ttl: float = float(os.getenv("EMBEDDING_CACHE_TTL", "0"))  # 0 表示不过期
+    embedding_cache_persist: bool = (
+        os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+    )
+    embedding_cache_disk_size: int = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "100000"))
+    embedding_cache_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "embedding_cache.sqlite3"
+    )
+
+    # 向量索引：chroma 或 numpy（进程内索引，向量数达到 ivf_threshold 后使用 IVF 近似检索）
+    vector_backend: str = os.getenv("VECTOR_BACKEND", "chroma")
+    ivf_threshold: int = int(os.getenv("IVF_THRESHOLD", "50000"))  # 0 表示始终精确检索
+    ivf_nlist: int = int(os.getenv("IVF_NLIST", "0"))  # 0 表示按 sqrt(n) 自动确定
+    ivf_nprobe: int = int(os.getenv("IVF_NPROBE", "16"))
+    # numpy 索引的量化存储：none / int8 / pq，启用后用 float32 向量重排 k * rerank_factor 个候选
+    vector_quantization: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    rerank_factor: int = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+    pq_subspaces: int = int(os.getenv("PQ_SUBSPACES", "0"))  # 0 表示每段 8 维
+
+    # 文档向量化（构建索引时分批、并发、限速写入）
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    embed_workers: int = int(os.getenv("EMBED_WORKERS", "4"))
+    embed_requests_per_minute: float = float(os.getenv("EMBED_RPM", "300"))  # 0 表示不限速
+    embed_max_retries: int = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+    embed_checkpoint_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "embedding_checkpoint.txt"
+    )
+
     # 检索参数
     bm25_top_k: int = int(os.getenv("BM25_TOP_K", "20"))
     vector_top_k: int = int(os.getenv("VECTOR_TOP_K", "20"))
     rerank_top_n: int = int(os.getenv("RERANK_TOP_N", "5"))
     rrf_k: int = int(os.getenv("RRF_K", "60"))
+    # 结果融合：rrf / combsum / combmnz，各路权重，融合后保留的候选数（0 表示全部保留）
+    fusion_method: str = os.getenv("FUSION_METHOD", "rrf")
+    bm25_weight: float = float(os.getenv("BM25_WEIGHT", "1.0"))
+    vector_weight: float = float(os.getenv("VECTOR_WEIGHT", "1.0"))
+    fusion_top_k: int = int(os.getenv("FUSION_TOP_K", "50"))
+
+    # 并行检索（关闭后各路依次在调用线程中执行，检索超时和扩展截止时间都不生效）
+    parallel_retrieval: bool = os.getenv("PARALLEL_RETRIEVAL", "true").lower() == "true"
+    retrieval_workers: int = int(os.getenv("RETRIEVAL_WORKERS", "8"))
+    bm25_timeout_ms: int = int(os.getenv("BM25_TIMEOUT_MS", "1000"))
+    vector_timeout_ms: int = int(os.getenv("VECTOR_TIMEOUT_MS", "3000"))
+
+    # 多查询融合：扩展查询一起检索，并以较低权重参与 RRF
+    multi_query: bool = os.getenv("MULTI_QUERY", "true").lower() == "true"
+    max_expansions: int = int(os.getenv("MAX_EXPANSIONS", "3"))
+    expansion_weight: float = float(os.getenv("EXPANSION_WEIGHT", "0.5"))
+    # 扩展查询每路检索的超时（从该路提交时计算）
+    expansion_budget_ms: int = int(os.getenv("EXPANSION_BUDGET_MS", "2000"))
+    # 流水线模式：查询扩展与原始查询检索同时进行，超过截止时间的扩展结果不再等待
+    pipelined_search: bool = os.getenv("PIPELINED_SEARCH", "true").lower() == "true"
+    expansion_deadline_ms: int = int(os.getenv("EXPANSION_DEADLINE_MS", "1200"))
+
+    # 查询扩展/改写结果缓存
+    query_cache_size: int = int(os.getenv("QUERY_CACHE_SIZE", "2000"))
+    query_cache_ttl: float = float(os.getenv("QUERY_CACHE_TTL", str(7 * 86400)))
+    query_cache_persist: bool = os.getenv("QUERY_CACHE_PERSIST", "true").lower() == "true"
+    query_cache_disk_size: int = int(os.getenv("QUERY_CACHE_DISK_SIZE", "50000"))
+    query_cache_warm_top_n: int = int(os.getenv("QUERY_CACHE_WARM_TOP_N", "100"))
+    query_cache_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "query_cache.sqlite3"
+    )
 
     # 文本处理
     chunk_size: int = 500
     chunk_overlap: int = 100
+    # 文档解析进程数（1 表示单进程）
+    ingest_workers: int = int(os.getenv("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # 分词：语料批量分词的进程数（1 表示单进程）、查询分词缓存条数、
+    # jieba 用户词典和停用词表（每行一个词，为空时只使用内置停用词）
+    tokenize_workers: int = int(os.getenv("TOKENIZE_WORKERS", str(min(4, os.cpu_count() or 1))))
+    token_cache_size: int = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+    user_dict_path: str = os.getenv("JIEBA_USER_DICT", "")
+    stop_words_path: str = os.getenv("STOP_WORDS_PATH", "")
+
+    # 搜索分析：最近日志条数、热门查询候选数，统计每 flush_every 次搜索或
+    # flush_interval 秒追加写入一次，增量记录达到 compact_every 条时压缩为快照
+    analytics_recent_size: int = int(os.getenv("ANALYTICS_RECENT_SIZE", "1000"))
+    analytics_top_queries: int = int(os.getenv("ANALYTICS_TOP_QUERIES", "200"))
+    analytics_flush_every: int = int(os.getenv("ANALYTICS_FLUSH_EVERY", "50"))
+    analytics_flush_interval: float = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "30"))
+    analytics_compact_every: int = int(os.getenv("ANALYTICS_COMPACT_EVERY", "200"))
+    analytics_path: str = os.path.join(os.path.dirname(__file__), "data", "analytics.jsonl")
+    # 链路追踪导出：none / jsonl（每行一条 trace）/ otlp（OpenTelemetry OTLP/JSON）
+    trace_export: str = os.getenv("TRACE_EXPORT", "none")
+    trace_path: str = os.getenv(
+        "TRACE_PATH", os.path.join(os.path.dirname(__file__), "data", "traces.jsonl")
+    )
 
     # 路径
     docs_dir: str = os.path.join(os.path.dirname(__file__), "docs")
     data_dir: str = os.path.join(os.path.dirname(__file__), "data")
+    bm25_index_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "bm25_index.bin"
+    )
+    manifest_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "index_manifest.json"
+    )
+    vector_index_dir: str = os.path.join(os.path.dirname(__file__), "data", "vector_index")
+    chunk_store_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "chunks.bin"
+    )
 
     # Reranker
     reranker_model: str = os.getenv("RERANKER_MODEL", "")
     use_llm_reranker: bool = True  # 使用 LLM 作为 reranker
+    # listwise: 一次请求为全部候选评分; pointwise: 每个候选单独评分（并发）
+    rerank_mode: str = os.getenv("RERANK_MODE", "listwise")
+    rerank_concurrency: int = int(os.getenv("RERANK_CONCURRENCY", "5"))
+    # 本地 Cross-Encoder（RERANKER_MODEL 指向模型目录时启用）
+    reranker_batch_size: int = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+    reranker_max_length: int = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+    reranker_threads: int = int(os.getenv("RERANKER_THREADS", str(os.cpu_count() or 1)))
+
+    # 重排序分数缓存
+    rerank_cache_size: int = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    rerank_cache_ttl: float = float(os.getenv("RERANK_CACHE_TTL", "86400"))
+    rerank_cache_persist: bool = os.getenv("RERANK_CACHE_PERSIST", "true").lower() == "true"
+    rerank_cache_disk_size: int = int(os.getenv("RERANK_CACHE_DISK_SIZE", "100000"))
+    rerank_cache_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "rerank_cache.sqlite3"
+    )
 
     def validate(self) -> bool:
         """验证配置"""
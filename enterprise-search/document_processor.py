@@ -3,10 +3,15 @@
 处理文档加载、分块和索引
 """
 
+import hashlib
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any
-from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Dict, Any, Tuple
+from dataclasses import dataclass, field, replace
 
 from langchain_community.document_loaders import (
     PyPDFLoader,
@@ -27,6 +32,39 @@ class ProcessedDocument:
     filename: str
     file_type: str
     chunks: List[Document] = field(default_factory=list)
+    content_hash: str = ""
+    # 流式导入后 chunks 会被释放，只保留 chunk_id
+    chunk_ids: List[str] = field(default_factory=list)
+
+    def release(self) -> "ProcessedDocument":
+        """返回不含文档块文本的精简副本"""
+        return replace(self, chunks=[])
+
+
+@dataclass
+class IngestError:
+    """单个文件的处理错误"""
+
+    filename: str
+    error: str
+
+
+@dataclass
+class IngestStats:
+    """文档处理进度和吞吐量"""
+
+    total_files: int = 0
+    files: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+    @property
+    def files_per_s(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def chunks_per_s(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
 
 
 class DocumentProcessor:
@@ -45,9 +83,31 @@ class DocumentProcessor:
             separators=["\n\n", "\n", "。", ".", "！", "!", "？", "?", "；", ";", " "],
         )
         self.documents: Dict[str, ProcessedDocument] = {}
+        self.errors: List[IngestError] = []
+        self.last_ingest_stats: IngestStats = IngestStats()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """计算文本内容哈希"""
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        """计算文件内容哈希"""
+        hasher = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
 
     def process_file(self, file_path: str) -> ProcessedDocument:
         """处理单个文件"""
+        processed = self.load_file(file_path)
+        self.documents[processed.doc_id] = processed
+        return processed
+
+    def load_file(self, file_path: str) -> ProcessedDocument:
+        """加载并分块单个文件（不登记到 self.documents）"""
         path = Path(file_path)
         ext = path.suffix.lower()
 
@@ -66,15 +126,24 @@ class DocumentProcessor:
         # 分块
         chunks = self.splitter.split_documents(raw_docs)
 
-        # 添加元数据
+        # 添加元数据（chunk_id 由内容派生，内容不变则 ID 不变）
         doc_id = path.stem
+        seen: Dict[str, int] = {}
         for i, chunk in enumerate(chunks):
+            chunk_hash = self.hash_text(chunk.page_content)
+            base_id = f"{doc_id}_{self.hash_text(path.name + chunk_hash)[:16]}"
+            # 同一文件中内容重复的块按出现次序区分
+            occurrence = seen.get(base_id, 0)
+            seen[base_id] = occurrence + 1
+            chunk_id = base_id if occurrence == 0 else f"{base_id}_{occurrence}"
+
             chunk.metadata.update(
                 {
                     "doc_id": doc_id,
                     "filename": path.name,
-                    "chunk_id": f"{doc_id}_{i}",
+                    "chunk_id": chunk_id,
                     "chunk_index": i,
+                    "chunk_hash": chunk_hash,
                 }
             )
 
@@ -83,33 +152,117 @@ class DocumentProcessor:
             filename=path.name,
             file_type=ext[1:].upper(),
             chunks=chunks,
+            content_hash=self.hash_file(path),
+            chunk_ids=[chunk.metadata["chunk_id"] for chunk in chunks],
         )
 
-        self.documents[doc_id] = processed
         return processed
 
-    def process_directory(self, dir_path: str = None) -> List[ProcessedDocument]:
-        """处理目录中的所有文档"""
+    def list_files(self, dir_path: str = None) -> List[Path]:
+        """列出目录中支持的文件"""
+        path = Path(dir_path or config.docs_dir)
+        return [
+            file_path
+            for ext in self.LOADERS.keys()
+            for file_path in path.glob(f"*{ext}")
+        ]
+
+    def process_directory(
+        self,
+        dir_path: str = None,
+        workers: int = None,
+        progress_callback: Callable[[int, int, "IngestStats"], None] = None,
+    ) -> List[ProcessedDocument]:
+        """处理目录中的所有文档（结果全部保留在内存中）"""
+        return list(self.iter_directory(dir_path, workers, progress_callback))
+
+    def iter_directory(
+        self,
+        dir_path: str = None,
+        workers: int = None,
+        progress_callback: Callable[[int, int, "IngestStats"], None] = None,
+    ) -> Iterator[ProcessedDocument]:
+        """
+        流式处理目录中的文档，按文件列表顺序逐个产出
+        workers > 1 时使用多进程并行解析和分块，同时在途的文件不超过 workers 的两倍；
+        self.documents 只登记不含文本的精简副本，单个文件的错误记录在 self.errors 中
+        """
         dir_path = dir_path or config.docs_dir
         path = Path(dir_path)
 
         if not path.exists():
             os.makedirs(path)
-            return []
+            return
 
-        processed = []
-        for ext in self.LOADERS.keys():
-            for file_path in path.glob(f"*{ext}"):
-                try:
-                    doc = self.process_file(str(file_path))
-                    processed.append(doc)
-                except Exception as e:
-                    print(f"  ⚠️  处理失败 {file_path.name}: {e}")
+        files = self.list_files(dir_path)
+        workers = config.ingest_workers if workers is None else workers
+        workers = min(workers, len(files))
 
-        return processed
+        self.errors = []
+        stats = IngestStats(total_files=len(files))
+        self.last_ingest_stats = stats
+        start = time.perf_counter()
+
+        def collect(file_path: Path, load):
+            processed = None
+            try:
+                processed = load()
+            except Exception as e:
+                self.errors.append(IngestError(file_path.name, str(e)))
+            else:
+                self.documents[processed.doc_id] = processed.release()
+                stats.chunks += len(processed.chunk_ids)
+            stats.files += 1
+            stats.seconds = time.perf_counter() - start
+            if progress_callback:
+                progress_callback(stats.files, stats.total_files, stats)
+            return processed
+
+        if workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker
+            ) as executor:
+                pending = deque()
+                queued = iter(files)
+                while True:
+                    # 补足在途任务
+                    for file_path in islice(queued, workers * 2 - len(pending)):
+                        pending.append(
+                            (file_path, executor.submit(_ingest_file, str(file_path)))
+                        )
+                    if not pending:
+                        break
+
+                    # 按提交顺序取结果，保证与串行处理的顺序一致
+                    file_path, future = pending.popleft()
+                    processed = collect(file_path, lambda: _deserialize(future.result()))
+                    if processed:
+                        yield processed
+        else:
+            for file_path in files:
+                processed = collect(file_path, lambda: self.load_file(str(file_path)))
+                if processed:
+                    yield processed
+
+    def get_fingerprint(self, dir_path: str = None) -> str:
+        """根据目录中文件的名称、大小和修改时间计算指纹，用于判断索引是否过期"""
+        dir_path = dir_path or config.docs_dir
+        path = Path(dir_path)
+
+        hasher = hashlib.sha1()
+        hasher.update(f"{config.chunk_size}:{config.chunk_overlap}".encode())
+
+        if path.exists():
+            for file_path in sorted(self.list_files(dir_path)):
+                stat = file_path.stat()
+                hasher.update(
+                    f"{file_path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode()
+                )
+
+        return hasher.hexdigest()
 
     def get_all_chunks(self) -> List[Document]:
-        """获取所有文档块"""
+        """获取所有文档块（流式导入的文档不保留文本）"""
         all_chunks = []
         for doc in self.documents.values():
             all_chunks.extend(doc.chunks)
@@ -117,12 +270,45 @@ class DocumentProcessor:
 
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
-        total_chunks = sum(len(doc.chunks) for doc in self.documents.values())
+        total_chunks = sum(len(doc.chunk_ids) for doc in self.documents.values())
         return {
             "total_documents": len(self.documents),
             "total_chunks": total_chunks,
             "documents": [
-                {"name": doc.filename, "type": doc.file_type, "chunks": len(doc.chunks)}
+                {"name": doc.filename, "type": doc.file_type, "chunks": len(doc.chunk_ids)}
                 for doc in self.documents.values()
             ],
         }
+
+
+# 多进程解析：每个工作进程持有一个 DocumentProcessor
+_worker_processor: DocumentProcessor = None
+
+
+def _init_worker():
+    global _worker_processor
+    _worker_processor = DocumentProcessor()
+
+
+def _ingest_file(file_path: str) -> Tuple:
+    """在工作进程中解析并分块，返回紧凑的元组形式（避免传输 Document 对象）"""
+    processed = _worker_processor.load_file(file_path)
+    return (
+        processed.doc_id,
+        processed.filename,
+        processed.file_type,
+        processed.content_hash,
+        [(chunk.page_content, chunk.metadata) for chunk in processed.chunks],
+    )
+
+
+def _deserialize(data: Tuple) -> ProcessedDocument:
+    doc_id, filename, file_type, content_hash, chunks = data
+    return ProcessedDocument(
+        doc_id=doc_id,
+        filename=filename,
+        file_type=file_type,
+        content_hash=content_hash,
+        chunks=[Document(page_content=text, metadata=metadata) for text, metadata in chunks],
+        chunk_ids=[metadata["chunk_id"] for _, metadata in chunks],
+    )
@@ -0,0 +1,103 @@
+"""
+查询向量缓存模块
+包装 Embeddings，重复或仅有空白、大小写差异的查询不再请求向量接口
+"""
+
+from typing import Callable, List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import config
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_query
+
+
+class CachedEmbeddings(Embeddings):
+    """带查询向量缓存的 Embeddings（文档向量不缓存）"""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: TieredCache = None,
+        normalization: Sequence[str] = None,
+        namespace: str = None,
+        embed_queries_fn: Callable[[List[str]], List[List[float]]] = None,
+    ):
+        self.embeddings = embeddings
+        self.embed_queries_fn = embed_queries_fn
+        self.normalization = normalization or config.query_normalization
+        # 不同模型的向量不能混用
+        self.namespace = namespace or config.embedding_model
+        self.cache = cache or self._create_cache()
+
+    @staticmethod
+    def _create_cache() -> TieredCache:
+        """创建缓存：内存层按字节数限制，向量以 float32 存储"""
+        disk = None
+        if config.embedding_cache_persist:
+            disk = SQLiteCache(
+                config.embedding_cache_path,
+                table="query_embeddings",
+                ttl_seconds=config.embedding_cache_ttl or None,
+                max_entries=config.embedding_cache_disk_size,
+            )
+        return TieredCache(
+            LRUCache(
+                max_size=config.embedding_cache_size,
+                ttl_seconds=config.embedding_cache_ttl or None,
+                max_bytes=int(config.embedding_cache_max_mb * 1024 * 1024),
+                sizeof=lambda vector: vector.nbytes,
+            ),
+            disk,
+            encode=lambda vector: vector.tobytes(),
+            decode=lambda data: np.frombuffer(data, dtype=np.float32),
+        )
+
+    def _cache_key(self, text: str) -> str:
+        return f"{self.namespace}\x00{normalize_query(text, self.normalization)}"
+
+    def embed_query(self, text: str) -> List[float]:
+        """查询向量（优先使用缓存）"""
+        return self.embed_query_array(text).tolist()
+
+    def embed_query_array(self, text: str) -> np.ndarray:
+        """查询向量，返回 float32 数组"""
+        key = self._cache_key(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+            self.cache.set(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[np.ndarray]:
+        """批量获取查询向量，未命中缓存的查询合并为一次请求"""
+        keys = [self._cache_key(text) for text in texts]
+        vectors = [self.cache.get(key) for key in keys]
+
+        # 归一化后相同的查询只请求一次
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+
+        if missing:
+            missing_texts = list(missing.values())
+            if self.embed_queries_fn:
+                embedded = self.embed_queries_fn(missing_texts)
+            else:
+                embedded = [self.embeddings.embed_query(text) for text in missing_texts]
+
+            fetched = {}
+            for key, values in zip(missing, embedded):
+                fetched[key] = np.asarray(values, dtype=np.float32)
+                self.cache.set(key, fetched[key])
+            vectors = [
+                vector if vector is not None else fetched[key]
+                for key, vector in zip(keys, vectors)
+            ]
+
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """文档向量直接透传"""
+        return self.embeddings.embed_documents(texts)
@@ -0,0 +1,148 @@
+"""
+结果融合模块
+多路检索结果在 NumPy 数组上融合：文档块映射为整数编号，分数用 bincount 累加，
+截断到 top_k 之后才构建结果对象
+"""
+
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import config
+from chunk_store import LazyDocument
+
+
+FUSION_METHODS = ("rrf", "combsum", "combmnz")
+
+
+@dataclass
+class FusionSource:
+    """一路待融合的结果列表（元素需提供 document、score、rank）"""
+
+    name: str
+    results: List
+    weight: float = 1.0
+
+
+@dataclass
+class FusedCandidates:
+    """融合后的 top-k 候选（数组形式，按融合分数降序）"""
+
+    documents: List[Document]
+    scores: np.ndarray
+    # 形状 (来源数, 候选数)：候选在各来源中的名次，未命中为 0
+    ranks: np.ndarray
+    source_names: List[str]
+    total: int = 0  # 截断前去重后的候选数
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def source_ranks(self, name: str) -> np.ndarray:
+        return self.ranks[self.source_names.index(name)]
+
+
+def chunk_keys(documents: Sequence) -> np.ndarray:
+    """
+    文档块映射为整数编号
+    全部来自同一文档块存储时直接使用行号，否则按 chunk_id 依次编号
+    """
+    stores = {id(doc.store) for doc in documents if isinstance(doc, LazyDocument)}
+    if len(stores) == 1 and all(isinstance(doc, LazyDocument) for doc in documents):
+        return np.fromiter((doc.row for doc in documents), dtype=np.int64, count=len(documents))
+
+    numbering = {}
+    keys = (
+        numbering.setdefault(doc.metadata.get("chunk_id", id(doc)), len(numbering))
+        for doc in documents
+    )
+    return np.fromiter(keys, dtype=np.int64, count=len(documents))
+
+
+class FusionEngine:
+    """
+    多路结果融合
+    rrf: sum(weight / (k + rank))
+    combsum: sum(weight * 归一化分数)，分数在每路内按最小值、最大值归一化
+    combmnz: combsum * 命中的来源数
+    """
+
+    def __init__(self, method: str = None, rrf_k: int = None):
+        self.method = (method or config.fusion_method).lower()
+        if self.method not in FUSION_METHODS:
+            raise ValueError(f"不支持的融合方法: {self.method}")
+        self.rrf_k = config.rrf_k if rrf_k is None else rrf_k
+
+    def fuse(self, sources: List[FusionSource], top_k: int = None) -> FusedCandidates:
+        """融合多路结果，只保留分数最高的 top_k 个（0 或 None 表示全部保留）"""
+        sources = [source for source in sources if source.weight > 0]
+        source_names = [source.name for source in sources]
+        documents = [result.document for source in sources for result in source.results]
+        if not documents:
+            empty_ranks = np.zeros((len(sources), 0), dtype=np.int64)
+            return FusedCandidates([], np.zeros(0), empty_ranks, source_names)
+
+        lengths = [len(source.results) for source in sources]
+        source_ids = np.repeat(np.arange(len(sources)), lengths)
+        weights = np.repeat([source.weight for source in sources], lengths)
+        ranks = np.fromiter(
+            (result.rank for source in sources for result in source.results),
+            dtype=np.int64,
+            count=len(documents),
+        )
+
+        # 去重：inverse 为每条结果对应的候选编号
+        keys, inverse = np.unique(chunk_keys(documents), return_inverse=True)
+        n = len(keys)
+
+        if self.method == "rrf":
+            contributions = weights / (self.rrf_k + ranks)
+        else:
+            contributions = weights * self._normalized_scores(sources, lengths)
+        fused = np.bincount(inverse, weights=contributions, minlength=n)
+
+        if self.method == "combmnz":
+            hits = np.zeros((len(sources), n), dtype=bool)
+            hits[source_ids, inverse] = True
+            fused *= hits.sum(axis=0)
+
+        # 分数相同时按首次出现的顺序（先 BM25、再向量、再扩展查询）
+        first = np.full(n, len(documents), dtype=np.int64)
+        np.minimum.at(first, inverse, np.arange(len(documents)))
+
+        selected = np.arange(n)
+        if top_k and n > top_k:
+            kth = np.partition(fused, n - top_k)[n - top_k]
+            selected = np.flatnonzero(fused >= kth)
+        order = selected[np.lexsort((first[selected], -fused[selected]))][:top_k or None]
+
+        # 只为保留的候选填充各来源名次
+        position = np.full(n, -1, dtype=np.int64)
+        position[order] = np.arange(len(order))
+        kept = position[inverse] >= 0
+        top_ranks = np.zeros((len(sources), len(order)), dtype=np.int64)
+        top_ranks[source_ids[kept], position[inverse[kept]]] = ranks[kept]
+
+        return FusedCandidates(
+            documents=[documents[i] for i in first[order]],
+            scores=fused[order],
+            ranks=top_ranks,
+            source_names=source_names,
+            total=n,
+        )
+
+    @staticmethod
+    def _normalized_scores(sources: List[FusionSource], lengths: List[int]) -> np.ndarray:
+        """每路分数按最小值、最大值归一化到 [0, 1]（分数全部相同时为 1）"""
+        parts = []
+        for source, length in zip(sources, lengths):
+            scores = np.fromiter(
+                (result.score for result in source.results), dtype=np.float64, count=length
+            )
+            if length:
+                low, high = scores.min(), scores.max()
+                scores = (scores - low) / (high - low) if high > low else np.ones(length)
+            parts.append(scores)
+        return np.concatenate(parts)
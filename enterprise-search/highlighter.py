@@ -1,87 +1,188 @@
 """
 结果高亮模块
-对搜索结果进行关键词高亮
+对搜索结果进行关键词高亮：全部关键词构建一个 Aho–Corasick 自动机，一次线性扫描找出所有匹配，
+按关键词密度选取最佳片段
 """
 
-import re
-from typing import List
-
-import jieba
+from collections import Counter
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from cache import LRUCache
+from tokenizer import Tokenizer, get_tokenizer
+from tracing import traced
+
+
+class Match(NamedTuple):
+    """关键词匹配区间 text[start:end]"""
+
+    start: int
+    end: int
+    keyword: int  # 关键词序号
+
+
+def fold_case(text: str) -> str:
+    """转小写且保持长度不变（个别字符转小写后长度会变化，这些字符保持原样）"""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch if len(ch.lower()) != 1 else ch.lower() for ch in text)
+
+
+class KeywordAutomaton:
+    """Aho–Corasick 自动机：一次扫描找出全部关键词的所有出现位置（不区分大小写）"""
+
+    def __init__(self, keywords: Sequence[str]):
+        self.keywords = list(dict.fromkeys(fold_case(kw) for kw in keywords if kw))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每个状态结束的关键词序号（已合并失败链上的输出）
+        self._output: List[Tuple[int, ...]] = [()]
+        self._build()
+
+    def _build(self):
+        for index, keyword in enumerate(self.keywords):
+            node = 0
+            for ch in keyword:
+                next_node = self._goto[node].get(ch)
+                if next_node is None:
+                    next_node = self._goto[node][ch] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                node = next_node
+            self._output[node] += (index,)
+
+        # 按广度优先顺序计算失败链接
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fallback = self._goto[fail].get(ch, 0)
+                self._fail[child] = fallback if fallback != child else 0
+                self._output[child] += self._output[self._fail[child]]
+                queue.append(child)
+
+    def find_all(self, text: str) -> List[Match]:
+        """返回所有匹配（可能重叠），按结束位置排序"""
+        goto, fail, output = self._goto, self._fail, self._output
+        lengths = [len(keyword) for keyword in self.keywords]
+        matches = []
+        node = 0
+        for i, ch in enumerate(fold_case(text)):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in output[node]:
+                matches.append(Match(i + 1 - lengths[index], i + 1, index))
+        return matches
 
 
 class Highlighter:
     """结果高亮器"""
 
-    def __init__(self, highlight_start: str = "<mark>", highlight_end: str = "</mark>"):
+    def __init__(
+        self,
+        highlight_start: str = "<mark>",
+        highlight_end: str = "</mark>",
+        tokenizer: Tokenizer = None,
+    ):
         self.start = highlight_start
         self.end = highlight_end
+        # 与 BM25 检索器共用分词服务，检索时的查询分词结果直接复用
+        self.tokenizer = tokenizer or get_tokenizer()
+        # 关键词组合 -> 自动机
+        self._automata = LRUCache(max_size=256)
 
     def highlight(self, text: str, query: str, max_length: int = 200) -> str:
         """高亮文本中的关键词"""
-        # 提取查询关键词
-        keywords = self._extract_keywords(query)
+        return self.highlight_batch([text], query, max_length)[0]
 
+    @traced("highlight")
+    def highlight_batch(self, texts: List[str], query: str, max_length: int = 200) -> List[str]:
+        """高亮同一查询的全部结果（关键词和自动机只构建一次）"""
+        keywords = self._extract_keywords(query)
         if not keywords:
-            return self._truncate(text, max_length)
-
-        # 找到最佳片段
-        snippet = self._find_best_snippet(text, keywords, max_length)
-
-        # 高亮关键词
-        highlighted = self._highlight_keywords(snippet, keywords)
-
-        return highlighted
+            return [self._truncate(text, max_length) for text in texts]
+
+        automaton = self._automaton(keywords)
+        snippets = []
+        for text in texts:
+            matches = self._select(automaton.find_all(text))
+            if not matches:
+                snippets.append(self._truncate(text, max_length))
+                continue
+            start, end = self._best_window(matches, len(text), max_length)
+            snippets.append(self._render(text, start, end, matches))
+        return snippets
 
     def _extract_keywords(self, query: str) -> List[str]:
-        """提取关键词"""
-        # 中文分词
-        tokens = list(jieba.cut(query))
-        # 过滤短词
-        keywords = [t.strip() for t in tokens if len(t.strip()) > 1]
-        return keywords
-
-    def _find_best_snippet(
-        self, text: str, keywords: List[str], max_length: int
-    ) -> str:
-        """找到包含最多关键词的片段"""
-        text_lower = text.lower()
-
-        # 找到第一个关键词出现的位置
-        first_pos = len(text)
-        for kw in keywords:
-            pos = text_lower.find(kw.lower())
-            if pos != -1 and pos < first_pos:
-                first_pos = pos
-
-        # 计算片段的起始和结束位置
-        half_len = max_length // 2
-        start = max(0, first_pos - half_len)
-        end = min(len(text), start + max_length)
-
-        # 调整起始位置
-        if end - start < max_length:
-            start = max(0, end - max_length)
-
-        snippet = text[start:end]
-
-        # 添加省略号
-        if start > 0:
-            snippet = "..." + snippet
+        """提取关键词（与检索使用相同的分词结果，已过滤短词和停用词）"""
+        return list(self.tokenizer.tokenize_query(query))
+
+    def _automaton(self, keywords: List[str]) -> KeywordAutomaton:
+        key = tuple(keywords)
+        automaton = self._automata.get(key)
+        if automaton is None:
+            automaton = KeywordAutomaton(keywords)
+            self._automata.set(key, automaton)
+        return automaton
+
+    @staticmethod
+    def _select(matches: List[Match]) -> List[Match]:
+        """重叠的匹配取最左、最长的一个，返回按位置排序的不重叠匹配"""
+        selected = []
+        last_end = 0
+        for match in sorted(matches, key=lambda m: (m.start, -m.end)):
+            if match.start >= last_end:
+                selected.append(match)
+                last_end = match.end
+        return selected
+
+    @staticmethod
+    def _best_window(matches: List[Match], text_length: int, max_length: int) -> Tuple[int, int]:
+        """
+        滑动窗口选取关键词最密集的片段：先比较窗口内不同关键词的个数，再比较匹配次数
+        返回片段的 (起始, 结束) 位置，命中区间居中
+        """
+        counts: Counter = Counter()
+        best, best_score = (0, 1), (-1, -1)
+        j = 0
+        for i, first in enumerate(matches):
+            # 窗口至少包含当前匹配（单个关键词长于 max_length 时也成立）
+            while j < len(matches) and (j == i or matches[j].end - first.start <= max_length):
+                counts[matches[j].keyword] += 1
+                j += 1
+
+            score = (len(counts), j - i)
+            if score > best_score:
+                best, best_score = (i, j), score
+
+            counts[first.keyword] -= 1
+            if not counts[first.keyword]:
+                del counts[first.keyword]
+
+        span_start, span_end = matches[best[0]].start, matches[best[1] - 1].end
+        start = span_start - max(0, max_length - (span_end - span_start)) // 2
+        start = max(0, min(start, text_length - max_length))
+        return start, min(text_length, start + max_length)
+
+    def _render(self, text: str, start: int, end: int, matches: List[Match]) -> str:
+        """拼接片段：只在最后 join 一次，不逐个关键词替换整段文本"""
+        parts = ["..."] if start > 0 else []
+        position = start
+        for match in matches:
+            if match.start < start or match.end > end:
+                continue
+            parts.extend(
+                (text[position : match.start], self.start, text[match.start : match.end], self.end)
+            )
+            position = match.end
+        parts.append(text[position:end])
         if end < len(text):
-            snippet = snippet + "..."
-
-        return snippet
-
-    def _highlight_keywords(self, text: str, keywords: List[str]) -> str:
-        """高亮关键词（保持原文大小写）"""
-        result = text
-
-        for kw in keywords:
-            # 不区分大小写的替换
-            pattern = re.compile(re.escape(kw), re.IGNORECASE)
-            result = pattern.sub(lambda m: f"{self.start}{m.group()}{self.end}", result)
-
-        return result
+            parts.append("...")
+        return "".join(parts)
 
     def _truncate(self, text: str, max_length: int) -> str:
         """截断文本"""
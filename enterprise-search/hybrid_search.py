@@ -3,14 +3,25 @@
 结合 BM25 和向量检索，使用 RRF 算法融合
 """
 
-from typing import List, Dict, Set
-from dataclasses import dataclass
+import contextvars
+import time
+from functools import partial
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeoutError,
+)
+from typing import Any, Callable, List, Dict, Optional, Set, Tuple
+from dataclasses import dataclass, field
 
 from langchain_core.documents import Document
 
 from config import config
 from bm25_retriever import BM25Retriever, BM25Result
+from fusion import FusedCandidates, FusionEngine, FusionSource
 from vector_retriever import VectorRetriever, VectorResult
+from search_filter import SearchFilter
+from tracing import span
 
 
 @dataclass
@@ -22,6 +33,8 @@ class HybridResult:
     bm25_rank: int = 0
     vector_rank: int = 0
     sources: List[str] = None
+    expansion_hits: int = 0  # 被多少个扩展查询结果列表命中
+    extra_ranks: Dict[str, int] = None  # 额外检索路中的名次
 
     def __post_init__(self):
         self.sources = []
@@ -29,6 +42,105 @@ class HybridResult:
             self.sources.append("BM25")
         if self.vector_rank > 0:
             self.sources.append("Vector")
+        if self.expansion_hits > 0:
+            self.sources.append("Expansion")
+        self.extra_ranks = self.extra_ranks or {}
+        self.sources.extend(self.extra_ranks)
+
+
+@dataclass
+class ExtraRetriever:
+    """额外的检索路（如标题字段 BM25），retriever 需提供 search(query, top_k)"""
+
+    retriever: Any
+    weight: float = 1.0
+    top_k: int = 20
+    timeout_ms: int = 1000
+
+
+# 原始查询的检索路；扩展查询的检索路超时只会丢弃扩展结果，不算降级
+PRIMARY_LEGS = ("bm25", "vector")
+
+# 进程内的 BM25 检索路，使用单独的线程池
+LOCAL_LEGS = ("bm25", "bm25_expanded")
+
+
+@dataclass
+class RetrievalLeg:
+    """单路检索的执行情况"""
+
+    name: str
+    results: List = field(default_factory=list)
+    latency_ms: float = 0.0
+    timed_out: bool = False
+    error: str = ""
+    start_ms: float = 0.0  # 相对检索开始的启动时间
+
+    @property
+    def ok(self) -> bool:
+        return not self.timed_out and not self.error
+
+
+@dataclass
+class StageTiming:
+    """流水线中单个阶段的时间区间（相对检索开始，毫秒）"""
+
+    name: str
+    start_ms: float
+    end_ms: float
+    status: str = "ok"  # ok / timeout / error
+
+    @property
+    def duration_ms(self) -> float:
+        return self.end_ms - self.start_ms
+
+
+@dataclass
+class HybridSearchOutcome:
+    """混合检索输出"""
+
+    results: List[HybridResult]
+    legs: Dict[str, RetrievalLeg] = field(default_factory=dict)
+    stats: Dict = field(default_factory=dict)
+    fusion_ms: float = 0.0
+    total_ms: float = 0.0
+    timeline: List[StageTiming] = field(default_factory=list)
+
+    @property
+    def bm25_results(self) -> List[BM25Result]:
+        leg = self.legs.get("bm25")
+        return leg.results if leg else []
+
+    @property
+    def vector_results(self) -> List[VectorResult]:
+        leg = self.legs.get("vector")
+        return leg.results if leg else []
+
+    @property
+    def expanded_terms(self) -> List[str]:
+        """按时到达并参与检索的扩展查询"""
+        leg = self.legs.get("expansion")
+        return leg.results if leg and leg.ok else []
+
+    @property
+    def degraded(self) -> bool:
+        """原始查询是否有检索路超时或失败（结果只来自部分检索器）"""
+        return any(
+            not leg.ok for name, leg in self.legs.items() if name in PRIMARY_LEGS
+        )
+
+    @property
+    def leg_latencies_ms(self) -> Dict[str, float]:
+        return {name: leg.latency_ms for name, leg in self.legs.items()}
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """各阶段耗时（毫秒）"""
+        return {
+            **self.leg_latencies_ms,
+            "fusion": self.fusion_ms,
+            "total": self.total_ms,
+        }
 
 
 class HybridSearcher:
@@ -38,80 +150,277 @@ class HybridSearcher:
         self,
         bm25_retriever: BM25Retriever,
         vector_retriever: VectorRetriever,
+        extra_retrievers: Dict[str, ExtraRetriever] = None,
+        fusion: FusionEngine = None,
     ):
         self.bm25 = bm25_retriever
         self.vector = vector_retriever
-        self.rrf_k = config.rrf_k
+        # 额外检索路与 BM25、向量检索并行执行，结果按各自权重参与融合
+        self.extra = extra_retrievers or {}
+        self.fusion = fusion or FusionEngine()
+        # 超时的检索任务无法中断，会一直占用线程直到完成：向量检索、查询扩展等
+        # 依赖网络的检索路与 BM25 分用两个线程池，远程接口卡住时 BM25 仍能按时返回（降级为仅 BM25）
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.retrieval_workers,
+            thread_name_prefix="hybrid-search",
+        )
+        self.local_executor = ThreadPoolExecutor(
+            max_workers=config.retrieval_workers,
+            thread_name_prefix="hybrid-search-bm25",
+        )
+
+    def shutdown(self):
+        """关闭检索线程池"""
+        self.executor.shutdown()
+        self.local_executor.shutdown()
 
     def search(
         self,
         query: str,
         bm25_k: int = None,
         vector_k: int = None,
-    ) -> List[HybridResult]:
-        """执行混合检索"""
+        expansions: List[str] = None,
+        expand_fn: Callable[[str], List[str]] = None,
+        search_filter: SearchFilter = None,
+        top_k: int = None,
+    ) -> HybridSearchOutcome:
+        """
+        执行混合检索（可附带扩展查询，多查询融合）
+
+        传入 expand_fn 时为流水线模式：原始查询立即开始检索，查询扩展同时进行，
+        扩展结果在 expansion_deadline_ms 内返回才会参与检索和融合；
+        search_filter 在各检索器内部生效（只扫描满足条件的倒排项和向量），扩展查询同样受限；
+        融合结果只保留前 top_k 个（默认 config.fusion_top_k）
+        """
+        start = time.perf_counter()
         bm25_k = bm25_k or config.bm25_top_k
         vector_k = vector_k or config.vector_top_k
+        top_k = config.fusion_top_k if top_k is None else top_k
 
-        # 并行检索
-        bm25_results = self.bm25.search(query, bm25_k)
-        vector_results = self.vector.search(query, vector_k)
+        def bind(func: Callable) -> Callable:
+            return partial(func, search_filter=search_filter) if search_filter else func
 
-        # RRF 融合
-        return self._rrf_fusion(bm25_results, vector_results)
+        # 并行检索（向量检索超时或失败时降级为仅 BM25）
+        tasks = {
+            "bm25": (bind(self.bm25.search), query, bm25_k, config.bm25_timeout_ms),
+            "vector": (
+                bind(self.vector.search),
+                query,
+                vector_k,
+                config.vector_timeout_ms,
+            ),
+        }
+        for name, extra in self.extra.items():
+            tasks[name] = (bind(extra.retriever.search), query, extra.top_k, extra.timeout_ms)
+        futures = self._submit_legs(tasks)
+
+        legs = {}
+        if expand_fn is not None:
+            legs["expansion"] = self._run_expansion(expand_fn, query, start)
+            expansions = legs["expansion"].results
+
+        # 扩展查询每个检索器批量执行一次，超出延迟预算的直接丢弃
+        expansions = [term for term in (expansions or []) if term and term != query]
+        if expansions:
+            budget_ms = config.expansion_budget_ms
+            expansion_tasks = {
+                "bm25_expanded": (
+                    bind(self.bm25.search_batch),
+                    expansions,
+                    bm25_k,
+                    budget_ms,
+                ),
+                "vector_expanded": (
+                    bind(self.vector.search_batch),
+                    expansions,
+                    vector_k,
+                    budget_ms,
+                ),
+            }
+            tasks.update(expansion_tasks)
+            if futures is not None:
+                futures.update(self._submit_legs(expansion_tasks))
+
+        legs.update(self._collect_legs(tasks, futures, start))
+        bm25_results = legs["bm25"].results
+        vector_results = legs["vector"].results
+        expansion_lists = [
+            results
+            for name in ("bm25_expanded", "vector_expanded")
+            if name in legs
+            for results in legs[name].results
+        ]
+
+        extra_results = {name: legs[name].results for name in self.extra}
+
+        # 结果融合
+        fusion_start = time.perf_counter()
+        with span("fusion", method=self.fusion.method) as fusion_span:
+            fused = self._fuse(bm25_results, vector_results, expansion_lists, extra_results, top_k)
+            results = self._to_results(fused)
+            fusion_span.set_attribute("candidates", fused.total)
+        end = time.perf_counter()
+
+        stats = self.get_search_stats(bm25_results, vector_results, results)
+        stats["hybrid_count"] = fused.total
+        stats["expansion_lists"] = len(expansion_lists)
+        if search_filter:
+            stats["filter"] = search_filter.describe()
+
+        timeline = [
+            StageTiming(
+                name,
+                leg.start_ms,
+                leg.start_ms + leg.latency_ms,
+                "timeout" if leg.timed_out else "error" if leg.error else "ok",
+            )
+            for name, leg in legs.items()
+        ]
+        timeline.append(
+            StageTiming("fusion", (fusion_start - start) * 1000, (end - start) * 1000)
+        )
+        timeline.sort(key=lambda stage: stage.start_ms)
+
+        return HybridSearchOutcome(
+            results=results,
+            legs=legs,
+            stats=stats,
+            fusion_ms=(end - fusion_start) * 1000,
+            total_ms=(end - start) * 1000,
+            timeline=timeline,
+        )
+
+    @staticmethod
+    def _timed(name: str, func: Callable, *args) -> Tuple[List, float, float]:
+        """执行检索并计时（记录为名为 name 的 span），返回 (结果, 启动时刻, 耗时毫秒)"""
+        start = time.perf_counter()
+        with span(name):
+            results = func(*args)
+        return results, start, (time.perf_counter() - start) * 1000
+
+    def _submit_legs(self, tasks: Dict[str, Tuple]) -> Optional[Dict[str, Future]]:
+        """提交各路检索到线程池（串行模式下返回 None）"""
+        if not config.parallel_retrieval:
+            return None
+
+        futures = {}
+        for name, (func, query, k, _) in tasks.items():
+            # 复制当前上下文，检索线程中的 span 挂到同一条 trace 上
+            executor = self.local_executor if name in LOCAL_LEGS else self.executor
+            futures[name] = executor.submit(
+                contextvars.copy_context().run, self._timed, name, func, query, k
+            )
+            futures[name].submitted_at = time.perf_counter()
+        return futures
 
-    def _rrf_fusion(
+    def _run_expansion(
+        self, expand_fn: Callable[[str], List[str]], query: str, start: float
+    ) -> RetrievalLeg:
+        """
+        与检索并行执行查询扩展，最多等待到 expansion_deadline_ms
+        串行模式（parallel_retrieval=False）下直接调用 expand_fn，无法中途放弃，截止时间不生效
+        """
+        tasks = {
+            "expansion": (
+                lambda q, _: expand_fn(q),
+                query,
+                None,
+                config.expansion_deadline_ms,
+            )
+        }
+        return self._collect_legs(tasks, self._submit_legs(tasks), start)["expansion"]
+
+    def _collect_legs(
+        self,
+        tasks: Dict[str, Tuple],
+        futures: Optional[Dict[str, Future]],
+        start: float,
+    ) -> Dict[str, RetrievalLeg]:
+        """
+        收集各路检索结果，每路的超时从该路提交时计算
+        （扩展查询的检索路在查询扩展返回后才提交，同样有完整的 expansion_budget_ms）
+        """
+        legs = {}
+        for name, (func, query, k, timeout_ms) in tasks.items():
+            future = futures[name] if futures is not None else None
+            submitted = future.submitted_at if future is not None else time.perf_counter()
+            try:
+                if future is None:
+                    results, started, latency_ms = self._timed(name, func, query, k)
+                else:
+                    remaining = submitted + timeout_ms / 1000 - time.perf_counter()
+                    results, started, latency_ms = future.result(timeout=max(0, remaining))
+                legs[name] = RetrievalLeg(
+                    name, results, latency_ms, start_ms=(started - start) * 1000
+                )
+            except FutureTimeoutError:
+                future.cancel()
+                legs[name] = RetrievalLeg(
+                    name,
+                    latency_ms=(time.perf_counter() - submitted) * 1000,
+                    timed_out=True,
+                    start_ms=(submitted - start) * 1000,
+                )
+            except Exception as e:
+                legs[name] = RetrievalLeg(
+                    name,
+                    latency_ms=(time.perf_counter() - submitted) * 1000,
+                    error=str(e),
+                    start_ms=(submitted - start) * 1000,
+                )
+
+        return legs
+
+    def _fuse(
         self,
         bm25_results: List[BM25Result],
         vector_results: List[VectorResult],
-    ) -> List[HybridResult]:
+        expansion_lists: List[List] = None,
+        extra_results: Dict[str, List] = None,
+        top_k: int = None,
+    ) -> FusedCandidates:
         """
-        Reciprocal Rank Fusion (RRF) 算法
-        score = sum(1 / (k + rank)) for each result list
+        加权融合各路结果（默认 RRF: score = sum(weight / (k + rank))）
+        原始查询两路的权重为 bm25_weight、vector_weight，扩展查询的结果列表权重为 expansion_weight
         """
-        # 使用 chunk_id 作为唯一标识
-        doc_scores: Dict[str, Dict] = {}
-
-        # 处理 BM25 结果
-        for result in bm25_results:
-            chunk_id = result.document.metadata.get("chunk_id", id(result.document))
-            if chunk_id not in doc_scores:
-                doc_scores[chunk_id] = {
-                    "document": result.document,
-                    "rrf_score": 0,
-                    "bm25_rank": 0,
-                    "vector_rank": 0,
-                }
-            doc_scores[chunk_id]["bm25_rank"] = result.rank
-            doc_scores[chunk_id]["rrf_score"] += 1 / (self.rrf_k + result.rank)
-
-        # 处理向量结果
-        for result in vector_results:
-            chunk_id = result.document.metadata.get("chunk_id", id(result.document))
-            if chunk_id not in doc_scores:
-                doc_scores[chunk_id] = {
-                    "document": result.document,
-                    "rrf_score": 0,
-                    "bm25_rank": 0,
-                    "vector_rank": 0,
-                }
-            doc_scores[chunk_id]["vector_rank"] = result.rank
-            doc_scores[chunk_id]["rrf_score"] += 1 / (self.rrf_k + result.rank)
-
-        # 转换为结果列表并排序
-        hybrid_results = [
+        sources = [
+            FusionSource("bm25", bm25_results, config.bm25_weight),
+            FusionSource("vector", vector_results, config.vector_weight),
+        ]
+        sources.extend(
+            FusionSource(f"expansion_{i}", results, config.expansion_weight)
+            for i, results in enumerate(expansion_lists or [])
+        )
+        sources.extend(
+            FusionSource(name, results, self.extra[name].weight)
+            for name, results in (extra_results or {}).items()
+        )
+        return self.fusion.fuse(sources, top_k)
+
+    def _to_results(self, fused: FusedCandidates) -> List[HybridResult]:
+        """只为截断后的候选构建结果对象"""
+        names = fused.source_names
+        ranks = fused.ranks.tolist()
+
+        def ranks_of(name: str) -> List[int]:
+            return ranks[names.index(name)] if name in names else [0] * len(fused)
+
+        bm25_ranks, vector_ranks = ranks_of("bm25"), ranks_of("vector")
+        expansion_rows = [row for name, row in zip(names, ranks) if name.startswith("expansion_")]
+        extra_rows = {name: ranks_of(name) for name in self.extra if name in names}
+
+        return [
             HybridResult(
-                document=data["document"],
-                rrf_score=data["rrf_score"],
-                bm25_rank=data["bm25_rank"],
-                vector_rank=data["vector_rank"],
+                document=document,
+                rrf_score=score,
+                bm25_rank=bm25_ranks[i],
+                vector_rank=vector_ranks[i],
+                expansion_hits=sum(1 for row in expansion_rows if row[i]),
+                extra_ranks={name: row[i] for name, row in extra_rows.items() if row[i]},
             )
-            for data in doc_scores.values()
+            for i, (document, score) in enumerate(zip(fused.documents, fused.scores.tolist()))
         ]
 
-        hybrid_results.sort(key=lambda x: x.rrf_score, reverse=True)
-        return hybrid_results
-
     def get_search_stats(
         self,
         bm25_results: List[BM25Result],
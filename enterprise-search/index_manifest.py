@@ -0,0 +1,130 @@
+"""
+索引清单模块
+记录已索引文件和文档块的内容哈希，用于增量索引
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from langchain_core.documents import Document
+
+from config import config
+from document_processor import ProcessedDocument
+
+
+@dataclass
+class IndexDelta:
+    """与上次索引相比的变化"""
+
+    added_chunks: List[Document] = field(default_factory=list)
+    removed_chunk_ids: List[str] = field(default_factory=list)
+    new_files: List[str] = field(default_factory=list)
+    changed_files: List[str] = field(default_factory=list)
+    deleted_files: List[str] = field(default_factory=list)
+    unchanged_files: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.added_chunks and not self.removed_chunk_ids
+
+
+class IndexManifest:
+    """索引清单"""
+
+    VERSION = 1
+
+    def __init__(self, path: str = None):
+        self.path = path or config.manifest_path
+        # filename -> {"hash": 文件内容哈希, "chunk_ids": [...]}
+        self.files: Dict[str, Dict] = {}
+        self.exists = False
+        self.load()
+
+    def load(self):
+        """加载清单，文件不存在或版本不匹配时视为空清单"""
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") != self.VERSION:
+            return
+
+        self.files = data.get("files", {})
+        self.exists = True
+
+    def save(self):
+        """保存清单（先写临时文件再原子替换）"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": self.VERSION, "files": self.files},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+        self.exists = True
+
+    def diff(
+        self, documents: List[ProcessedDocument], failed: Iterable[str] = ()
+    ) -> IndexDelta:
+        """计算当前文档与清单之间的差异（failed 为本次解析失败的文件名）"""
+        delta = IndexDelta()
+        for doc in documents:
+            delta.added_chunks.extend(self.diff_document(doc, delta))
+        self.diff_deleted([doc.filename for doc in documents], delta, failed)
+        return delta
+
+    def diff_document(self, doc: ProcessedDocument, delta: IndexDelta) -> List[Document]:
+        """
+        计算单个文档的差异并记入 delta，返回需要新增的文档块
+        （流式导入时逐个文件调用，新增文档块不累积在 delta.added_chunks 中）
+        """
+        entry = self.files.get(doc.filename)
+
+        if entry is None:
+            delta.new_files.append(doc.filename)
+            return doc.chunks
+
+        # 文件内容不变但分块参数（chunk_size、chunk_overlap 等）变化时，文档块 ID 也会变化
+        if entry["hash"] == doc.content_hash and entry["chunk_ids"] == list(doc.chunk_ids):
+            delta.unchanged_files += 1
+            return []
+
+        # 文件或分块有变化：只处理内容变化的文档块
+        delta.changed_files.append(doc.filename)
+        old_ids = set(entry["chunk_ids"])
+        new_ids = set(doc.chunk_ids)
+        delta.removed_chunk_ids.extend(
+            chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in new_ids
+        )
+        return [chunk for chunk in doc.chunks if chunk.metadata["chunk_id"] not in old_ids]
+
+    def diff_deleted(
+        self, filenames: Iterable[str], delta: IndexDelta, failed: Iterable[str] = ()
+    ):
+        """
+        记录清单中已不存在的文件
+        解析失败的文件（failed）仍在目录中，保留其已索引的文档块，不视为删除
+        """
+        current = set(filenames) | set(failed)
+        for filename, entry in self.files.items():
+            if filename not in current:
+                delta.deleted_files.append(filename)
+                delta.removed_chunk_ids.extend(entry["chunk_ids"])
+
+    def update(self, documents: List[ProcessedDocument], failed: Iterable[str] = ()):
+        """用当前文档替换清单内容（解析失败的文件保留原有记录）"""
+        files = {filename: self.files[filename] for filename in failed if filename in self.files}
+        files.update(
+            (doc.filename, {"hash": doc.content_hash, "chunk_ids": list(doc.chunk_ids)})
+            for doc in documents
+        )
+        self.files = files
@@ -0,0 +1,324 @@
+"""
+倒排索引模块
+基于 NumPy 数组的 BM25 倒排索引，查询时只访问查询词的倒排链
+"""
+
+import json
+import os
+import struct
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+INDEX_MAGIC = b"ESBM25IX"
+INDEX_VERSION = 1
+# 文件头: magic(8) + version(uint32) + header 长度(uint32)
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 64
+
+# 需要持久化的数组字段
+_ARRAY_FIELDS = ("offsets", "postings", "impacts", "idf", "doc_len")
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _pack_strings(strings: Sequence[str]) -> np.ndarray:
+    """字符串列表打包为 \0 分隔的 UTF-8 字节数组"""
+    return np.frombuffer("\0".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(blob: np.ndarray, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return blob.tobytes().decode("utf-8").split("\0")
+
+
+class InvertedIndex:
+    """BM25 倒排索引（与 rank_bm25.BM25Okapi 打分一致）"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        self.vocab: Dict[str, int] = {}
+        self.n_docs: int = 0
+        self.avgdl: float = 0.0
+
+        # CSR 结构: 词 t 的倒排链为 [offsets[t], offsets[t + 1])
+        self.offsets: np.ndarray = np.zeros(1, dtype=np.int64)
+        self.postings: np.ndarray = np.zeros(0, dtype=np.int32)
+        # 预计算的 idf * tf 归一化权重，打分时只需累加
+        self.impacts: np.ndarray = np.zeros(0, dtype=np.float32)
+        self.idf: np.ndarray = np.zeros(0, dtype=np.float64)
+        self.doc_len: np.ndarray = np.zeros(0, dtype=np.int32)
+
+    @classmethod
+    def build(
+        cls,
+        tokenized_docs: Iterable[List[str]],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> "InvertedIndex":
+        """从分词后的文档构建索引"""
+        builder = InvertedIndexBuilder(k1=k1, b=b, epsilon=epsilon)
+        for tokens in tokenized_docs:
+            builder.add(tokens)
+        return builder.finish()
+
+    def _finalize(
+        self,
+        term_ids: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+    ):
+        """按词排序倒排链，并预计算 IDF 和文档长度归一化"""
+        self.n_docs = len(doc_len)
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.sum()) / self.n_docs if self.n_docs else 0.0
+
+        # 稳定排序保证同一倒排链内按文档号递增
+        order = np.argsort(term_ids, kind="stable")
+        term_ids = term_ids[order]
+        self.postings = doc_ids[order]
+        tfs = tfs[order]
+
+        df = np.bincount(term_ids, minlength=len(self.vocab))
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.offsets[1:])
+
+        # IDF 下限为 epsilon * 平均 IDF（与 BM25Okapi 相同）
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            idf[idf < 0] = self.epsilon * idf.mean()
+        self.idf = idf
+
+        if self.avgdl > 0:
+            norm = self.k1 * (1 - self.b + self.b * doc_len / self.avgdl)
+        else:
+            norm = np.full(self.n_docs, self.k1 * (1 - self.b))
+        self.impacts = (
+            idf[term_ids] * tfs * (self.k1 + 1) / (tfs + norm[self.postings])
+        ).astype(np.float32)
+
+    def _query_terms(self, tokens: List[str]) -> List[Tuple[int, int]]:
+        """查询词转为 (词 ID, 出现次数)，忽略未登录词"""
+        counts = Counter(self.vocab[t] for t in tokens if t in self.vocab)
+        return list(counts.items())
+
+    def score(
+        self, tokens: List[str], candidates: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算命中文档的分数，返回 (文档号, 分数)
+        candidates 为升序文档号时只对其中的文档打分
+        """
+        terms = self._query_terms(tokens)
+        if not terms or (candidates is not None and not len(candidates)):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float64)
+
+        docs_parts = []
+        weight_parts = []
+        candidate_mask = None
+        for term_id, count in terms:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            positions = slice(start, end)
+            if candidates is not None:
+                if len(candidates) < end - start:
+                    # 候选较少：在倒排链中二分查找候选，只读取命中的倒排项
+                    found = start + np.searchsorted(self.postings[start:end], candidates)
+                    in_range = found < end
+                    found = found[in_range]
+                    positions = found[self.postings[found] == candidates[in_range]]
+                else:
+                    if candidate_mask is None:
+                        candidate_mask = np.zeros(self.n_docs, dtype=bool)
+                        candidate_mask[candidates] = True
+                    postings = self.postings[start:end]
+                    positions = start + np.flatnonzero(candidate_mask[postings])
+            docs_parts.append(self.postings[positions])
+            weights = self.impacts[positions].astype(np.float64)
+            weight_parts.append(weights * count if count > 1 else weights)
+
+        if len(terms) == 1:
+            return docs_parts[0], weight_parts[0]
+
+        docs = np.concatenate(docs_parts)
+        weights = np.concatenate(weight_parts)
+        doc_ids, inverse = np.unique(docs, return_inverse=True)
+        return doc_ids, np.bincount(inverse, weights=weights)
+
+    def get_scores(self, tokens: List[str]) -> np.ndarray:
+        """计算全部文档的分数（用于校验，与 BM25Okapi.get_scores 对应）"""
+        scores = np.zeros(self.n_docs)
+        doc_ids, doc_scores = self.score(tokens)
+        scores[doc_ids] = doc_scores
+        return scores
+
+    def top_k(
+        self, tokens: List[str], k: int, candidates: np.ndarray = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """返回分数最高的 k 个文档 (文档号, 分数)，按分数降序；candidates 含义同 score"""
+        doc_ids, scores = self.score(tokens, candidates)
+        if k <= 0 or not len(doc_ids):
+            return doc_ids[:0], scores[:0]
+
+        if len(doc_ids) > k:
+            selected = np.argpartition(-scores, k - 1)[:k]
+            doc_ids, scores = doc_ids[selected], scores[selected]
+
+        # 分数相同时按文档号排序，与原先的稳定排序一致
+        order = np.lexsort((doc_ids, -scores))
+        return doc_ids[order], scores[order]
+
+    def save(self, path: str, chunk_ids: Sequence[str], fingerprint: str = ""):
+        """保存为带版本号的二进制文件（先写临时文件再原子替换）"""
+        terms = [""] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+
+        arrays = {name: getattr(self, name) for name in _ARRAY_FIELDS}
+        arrays["vocab"] = _pack_strings(terms)
+        arrays["chunk_ids"] = _pack_strings(chunk_ids)
+
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            layout[name] = [array.dtype.str, list(array.shape), offset]
+            offset = _align(offset + array.nbytes)
+
+        header = json.dumps(
+            {
+                "fingerprint": fingerprint,
+                "n_docs": self.n_docs,
+                "n_chunk_ids": len(chunk_ids),
+                "avgdl": self.avgdl,
+                "k1": self.k1,
+                "b": self.b,
+                "epsilon": self.epsilon,
+                "arrays": layout,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        data_start = _align(_PREAMBLE.size + len(header))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(INDEX_MAGIC, INDEX_VERSION, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + layout[name][2])
+                f.write(np.ascontiguousarray(array).tobytes())
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read_header(path: str) -> Optional[Dict[str, Any]]:
+        """读取文件头，格式或版本不匹配时返回 None"""
+        try:
+            with open(path, "rb") as f:
+                magic, version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+                if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                    return None
+                header = json.loads(f.read(header_len).decode("utf-8"))
+        except (OSError, struct.error, ValueError):
+            return None
+
+        header["data_start"] = _align(_PREAMBLE.size + header_len)
+        return header
+
+    @classmethod
+    def load(
+        cls, path: str, header: Dict[str, Any] = None
+    ) -> Tuple["InvertedIndex", List[str]]:
+        """以内存映射方式加载索引，返回 (索引, chunk_id 列表)"""
+        header = header or cls.read_header(path)
+        if header is None:
+            raise ValueError(f"无效的索引文件: {path}")
+
+        arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(
+                    path,
+                    dtype=dtype,
+                    mode="r",
+                    offset=header["data_start"] + offset,
+                    shape=tuple(shape),
+                )
+
+        index = cls(k1=header["k1"], b=header["b"], epsilon=header["epsilon"])
+        index.n_docs = header["n_docs"]
+        index.avgdl = header["avgdl"]
+        for name in _ARRAY_FIELDS:
+            setattr(index, name, arrays[name])
+
+        terms = _unpack_strings(arrays["vocab"], len(index.offsets) - 1)
+        index.vocab = dict(zip(terms, range(len(terms))))
+
+        chunk_ids = _unpack_strings(arrays["chunk_ids"], header["n_chunk_ids"])
+        return index, chunk_ids
+
+
+class InvertedIndexBuilder:
+    """增量构建倒排索引：逐个文档添加，不需要同时持有全部文档"""
+
+    # 缓冲的倒排项达到该数量时转为紧凑的 NumPy 数组
+    FLUSH_SIZE = 1 << 16
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.index = InvertedIndex(k1=k1, b=b, epsilon=epsilon)
+        self._term_ids: List[int] = []
+        self._doc_ids: List[int] = []
+        self._tfs: List[int] = []
+        self._doc_len: List[int] = []
+        self._parts: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, tokens: List[str]) -> int:
+        """添加一个文档，返回文档号"""
+        vocab = self.index.vocab
+        doc_id = len(self._doc_len)
+        self._doc_len.append(len(tokens))
+
+        for term, tf in Counter(tokens).items():
+            self._term_ids.append(vocab.setdefault(term, len(vocab)))
+            self._doc_ids.append(doc_id)
+            self._tfs.append(tf)
+
+        if len(self._term_ids) >= self.FLUSH_SIZE:
+            self._flush()
+        return doc_id
+
+    def _flush(self):
+        """Python 列表每项约 28 字节，转为数组后每个倒排项只占 16 字节"""
+        self._parts.append(
+            (
+                np.asarray(self._term_ids, dtype=np.int64),
+                np.asarray(self._doc_ids, dtype=np.int32),
+                np.asarray(self._tfs, dtype=np.int32),
+            )
+        )
+        self._term_ids, self._doc_ids, self._tfs = [], [], []
+
+    def finish(self) -> InvertedIndex:
+        """完成构建"""
+        self._flush()
+        term_ids, doc_ids, tfs = (np.concatenate(columns) for columns in zip(*self._parts))
+        self._parts = []
+
+        index = self.index
+        index._finalize(
+            term_ids,
+            doc_ids,
+            tfs.astype(np.float64),
+            np.asarray(self._doc_len, dtype=np.int32),
+        )
+        return index
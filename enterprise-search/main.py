@@ -5,21 +5,28 @@
 支持混合检索、查询扩展、语义重排序的企业级搜索引擎
 """
 
-import time
+import os
+from typing import List
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
 from rich import print as rprint
 
 from config import config
-from document_processor import DocumentProcessor
+from chunk_store import ChunkStore
+from document_processor import DocumentProcessor, ProcessedDocument
 from bm25_retriever import BM25Retriever
 from vector_retriever import VectorRetriever
-from hybrid_search import HybridSearcher
+from hybrid_search import HybridSearcher, HybridSearchOutcome
+from search_filter import SearchFilter
+from index_manifest import IndexDelta, IndexManifest
+from embedding_pipeline import EmbeddingPipelineError
 from query_processor import QueryProcessor
 from reranker import Reranker
 from highlighter import Highlighter
+from tokenizer import get_tokenizer
 from analytics import SearchAnalytics
+from tracing import Tracer, span
 
 
 console = Console()
@@ -30,13 +37,22 @@ class EnterpriseSearchEngine:
 
     def __init__(self):
         self.doc_processor = DocumentProcessor()
-        self.bm25 = BM25Retriever()
-        self.vector = VectorRetriever()
+        self.chunk_store = ChunkStore()
+        # BM25 和高亮共用的分词服务
+        self.tokenizer = get_tokenizer()
+        self.bm25 = BM25Retriever(self.chunk_store, self.tokenizer)
+        self.vector = VectorRetriever(self.chunk_store)
         self.hybrid = HybridSearcher(self.bm25, self.vector)
         self.query_processor = QueryProcessor()
         self.reranker = Reranker()
-        self.highlighter = Highlighter()
+        self.highlighter = Highlighter(tokenizer=self.tokenizer)
         self.analytics = SearchAnalytics()
+        self.tracer = Tracer(config.trace_export, config.trace_path)
+        self.analytics.register_cache("query", self.query_processor.cache)
+        self.analytics.register_cache("embedding", self.vector.embeddings.cache)
+        self.analytics.register_cache("rerank", self.reranker.cache)
+        self.analytics.register_cache("tokenizer", self.tokenizer.cache)
+        self.manifest = IndexManifest()
 
     def initialize(self) -> bool:
         """初始化搜索引擎"""
@@ -45,95 +61,219 @@ class EnterpriseSearchEngine:
         if not config.validate():
             return False
 
-        # 处理文档
+        # 预加载分词词典，避免首次查询等待词典构建
+        seconds = self.tokenizer.warm_up()
+        console.print(f"[dim]分词词典加载耗时 {seconds:.1f}s[/dim]")
+
+        # 流式导入：逐个文件解析、分词、向量化，文档块文本只写入存储，不在内存中累积
         console.print("索引文档中...", style="dim")
-        processed = self.doc_processor.process_directory()
+        processed = self._ingest(self.doc_processor.get_fingerprint())
+
+        ingest = self.doc_processor.last_ingest_stats
+        if ingest.files:
+            console.print(
+                f"[dim]解析 {ingest.files} 个文件，{ingest.chunks} 个片段，"
+                f"耗时 {ingest.seconds:.1f}s "
+                f"({ingest.files_per_s:.1f} 文件/s, {ingest.chunks_per_s:.0f} 片段/s)[/dim]"
+            )
+        for error in self.doc_processor.errors:
+            console.print(f"  [yellow]⚠️  处理失败 {error.filename}: {error.error}[/yellow]")
 
         if not processed:
             console.print("[yellow]⚠️  docs/ 目录为空，请添加文档[/yellow]")
             return True
 
-        # 获取所有文档块
-        chunks = self.doc_processor.get_all_chunks()
-
-        # 构建索引
-        self.bm25.build_index(chunks)
-        self.vector.build_index(chunks)
-
         stats = self.doc_processor.get_stats()
         console.print(
             f"[green]✅ 已索引 {stats['total_documents']} 个文档，"
             f"{stats['total_chunks']} 个片段[/green]\n"
         )
 
+        # 预热热门查询的扩展结果
+        top_queries = self.analytics.get_top_queries(config.query_cache_warm_top_n)
+        self.query_processor.warm_up([query for query, _ in top_queries])
+
         return True
 
+    def _ingest(self, fingerprint: str) -> List[ProcessedDocument]:
+        """
+        一次遍历完成导入：写入文档块存储、构建 BM25 索引（未过期时直接从磁盘加载）、
+        增量同步向量索引（只嵌入新增或变化的文档块，删除已移除的文档块）
+        """
+        self.chunk_store.reset()
+        bm25_loaded = self.bm25.load(fingerprint=fingerprint)
+        if not bm25_loaded:
+            self.bm25.begin_build()
+
+        # 没有清单的旧索引无法判断内容，整体重建一次（有断点说明是上次中断的构建，保留）
+        if (
+            not self.manifest.exists
+            and not os.path.exists(config.embed_checkpoint_path)
+            and self.vector.get_doc_count() > 0
+        ):
+            self.vector.clear()
+        # 清单存在但索引为空（如切换了向量索引后端），全部重新嵌入
+        if self.manifest.files and self.vector.get_doc_count() == 0:
+            self.manifest.files = {}
+
+        processed: List[ProcessedDocument] = []
+        delta = IndexDelta()
+
+        def added_chunks():
+            for doc in self.doc_processor.iter_directory():
+                self.chunk_store.add(doc.chunks)
+                if not bm25_loaded:
+                    self.bm25.add_documents(doc.chunks)
+                added = self.manifest.diff_document(doc, delta)
+                processed.append(doc.release())
+                yield from added
+
+        embed_error = None
+        try:
+            embed_stats = self.vector.build_index(added_chunks())
+        except EmbeddingPipelineError as e:
+            embed_stats, embed_error = e.stats, e
+
+        # 解析失败的文件仍在目录中，保留其向量和清单记录
+        failed = [error.filename for error in self.doc_processor.errors]
+        self.manifest.diff_deleted([doc.filename for doc in processed], delta, failed)
+        self.vector.delete(delta.removed_chunk_ids)
+        self.vector.save()
+
+        if embed_stats.items or delta.removed_chunk_ids:
+            console.print(
+                f"[dim]向量索引更新: 新增 {embed_stats.items} 个片段，"
+                f"删除 {len(delta.removed_chunk_ids)} 个片段 "
+                f"(新文件 {len(delta.new_files)}，变更 {len(delta.changed_files)}，"
+                f"删除 {len(delta.deleted_files)}，未变 {delta.unchanged_files})，"
+                f"{embed_stats.batches} 批，重试 {embed_stats.retries} 次，"
+                f"跳过 {embed_stats.skipped} 个，{embed_stats.items_per_s:.1f} 片段/s[/dim]"
+            )
+
+        # BM25：指纹相同但文档块不一致时（如分块规则变化），从文档块存储重建
+        chunk_ids = [chunk_id for doc in processed for chunk_id in doc.chunk_ids]
+        if bm25_loaded and self.bm25.chunk_ids != chunk_ids:
+            self.bm25.begin_build()
+            self.bm25.add_documents(self.chunk_store.iter_chunks(chunk_ids))
+            bm25_loaded = False
+        if not bm25_loaded:
+            self.bm25.finish_build()
+            self.bm25.save(fingerprint=fingerprint)
+
+        if embed_error:
+            # 不更新清单，下次启动时从断点继续
+            console.print(
+                f"[red]❌ 向量索引未完成: {embed_error}，下次启动时将从断点继续[/red]"
+            )
+        else:
+            self.manifest.update(processed, failed)
+            self.manifest.save()
+
+        return processed
+
     def search(
         self,
         query: str,
         expand_query: bool = True,
         rerank: bool = True,
+        search_filter: SearchFilter = None,
     ):
-        """执行搜索"""
-        start_time = time.time()
-
-        # 1. 查询处理
-        query_result = self.query_processor.process(query, expand=expand_query)
-        expanded_terms = query_result["expanded_terms"]
-
-        # 2. 混合检索
-        hybrid_results = self.hybrid.search(query)
-
-        # 获取原始统计
-        bm25_count = len(self.bm25.search(query))
-        vector_count = len(self.vector.search(query))
-
-        # 3. 重排序
-        if rerank and hybrid_results:
-            reranked = self.reranker.rerank(query, hybrid_results)
-        else:
-            reranked = []
-
-        latency_ms = (time.time() - start_time) * 1000
+        """
+        执行搜索（search_filter 限定文档、文件类型或页码范围）
+        整个请求记录为一条 trace，各阶段耗时写入搜索分析
+        """
+        with self.tracer.start("search", query=query) as trace:
+            if expand_query and config.multi_query and config.pipelined_search:
+                # 1+2. 流水线：查询扩展与原始查询检索同时进行，按时返回的扩展结果参与融合
+                with span("hybrid"):
+                    outcome = self.hybrid.search(
+                        query, expand_fn=self._expand_query, search_filter=search_filter
+                    )
+                expanded_terms = outcome.expanded_terms
+            else:
+                # 1. 查询处理
+                query_result = self.query_processor.process(query, expand=expand_query)
+                expanded_terms = query_result["expanded_terms"]
+
+                # 2. 混合检索（扩展查询参与多查询融合）
+                expansions = (
+                    self._limit_expansions(expanded_terms) if config.multi_query else []
+                )
+                with span("hybrid"):
+                    outcome = self.hybrid.search(
+                        query, expansions=expansions, search_filter=search_filter
+                    )
+            hybrid_results = outcome.results
+
+            # 3. 重排序
+            if rerank and hybrid_results:
+                reranked = self.reranker.rerank(query, hybrid_results)
+            else:
+                reranked = []
+
+            # 显示的检索耗时不含高亮和输出；搜索分析记录的是包含高亮在内的整个请求耗时
+            search_ms = trace.duration_ms
+            trace.root.set_attribute("results", len(reranked) if reranked else len(hybrid_results))
+
+            # 显示结果（高亮也计入 trace）
+            self._display_results(
+                query=query,
+                results=reranked,
+                outcome=outcome,
+                expanded_terms=expanded_terms,
+                latency_ms=search_ms,
+            )
 
         # 记录分析
         self.analytics.log_search(
             query=query,
             result_count=len(reranked) if reranked else len(hybrid_results),
-            latency_ms=latency_ms,
+            latency_ms=trace.duration_ms,
             expanded_terms=expanded_terms,
+            stage_latencies=trace.stage_latencies(),
         )
 
-        # 显示结果
-        self._display_results(
-            query=query,
-            results=reranked,
-            bm25_count=bm25_count,
-            vector_count=vector_count,
-            hybrid_count=len(hybrid_results),
-            expanded_terms=expanded_terms,
-            latency_ms=latency_ms,
-        )
+    def _expand_query(self, query: str) -> list:
+        """查询扩展（流水线模式下在检索线程池中执行）"""
+        return self._limit_expansions(self.query_processor.expand_query(query))
+
+    @staticmethod
+    def _limit_expansions(expanded_terms: list) -> list:
+        return expanded_terms[: config.max_expansions]
 
     def _display_results(
         self,
         query: str,
         results,
-        bm25_count: int,
-        vector_count: int,
-        hybrid_count: int,
+        outcome: HybridSearchOutcome,
         expanded_terms: list,
         latency_ms: float,
     ):
         """显示搜索结果"""
+        stats = outcome.stats
+
         # 检索统计
         console.print("\n[dim][检索统计][/dim]")
         console.print(
-            f"  BM25: {bm25_count} 条 | "
-            f"向量: {vector_count} 条 | "
-            f"融合: {hybrid_count} 条 | "
+            f"  BM25: {stats['bm25_count']} 条 | "
+            f"向量: {stats['vector_count']} 条 | "
+            f"融合: {stats['hybrid_count']} 条 | "
             f"重排后: {len(results)} 条"
         )
+        if stats.get("filter"):
+            console.print(f"  过滤: {stats['filter']}")
+        if outcome.degraded:
+            failed = [name for name, leg in outcome.legs.items() if not leg.ok]
+            console.print(f"  [yellow]⚠️  {', '.join(failed)} 检索超时或失败，结果已降级[/yellow]")
+        console.print(
+            "  [dim]阶段: "
+            + " | ".join(
+                f"{stage.name} {stage.start_ms:.0f}→{stage.end_ms:.0f}ms"
+                + ("" if stage.status == "ok" else f" ({stage.status})")
+                for stage in outcome.timeline
+            )
+            + "[/dim]"
+        )
         console.print("━" * 50)
 
         if not results:
@@ -141,7 +281,12 @@ class EnterpriseSearchEngine:
             return
 
         # 显示结果
-        for result in results:
+        # 高亮内容（全部结果一次批量处理）
+        snippets = self.highlighter.highlight_batch(
+            [result.document.page_content for result in results], query, 150
+        )
+
+        for result, highlighted in zip(results, snippets):
             doc = result.document
             score = result.relevance_score
 
@@ -150,9 +295,6 @@ class EnterpriseSearchEngine:
             page = doc.metadata.get("page", None)
             page_info = f" (第 {page + 1} 页)" if page is not None else ""
 
-            # 高亮内容
-            highlighted = self.highlighter.highlight(doc.page_content, query, 150)
-
             console.print(
                 f"\n[bold]{result.new_rank}. [{score:.1f}%] {filename}{page_info}[/bold]"
             )
@@ -161,7 +303,7 @@ class EnterpriseSearchEngine:
         # 底部信息
         console.print("\n" + "━" * 50)
         console.print(
-            f"[dim]耗时: {latency_ms:.0f}ms",
+            f"[dim]检索耗时: {latency_ms:.0f}ms",
             end="",
         )
         if expanded_terms:
@@ -184,6 +326,8 @@ class EnterpriseSearchEngine:
 [bold]搜索:[/bold]
   直接输入关键词进行搜索
   支持中英文混合搜索
+  过滤: [cyan]doc:[/cyan]文档 [cyan]file:[/cyan]文件名 [cyan]type:[/cyan]pdf [cyan]page:[/cyan]3-10
+  例如: 缓存策略 type:pdf page:3-10
         """
         console.print(Panel(help_text, title="帮助", border_style="blue"))
 
@@ -215,7 +359,11 @@ class EnterpriseSearchEngine:
                     else:
                         console.print(f"[yellow]未知命令: {cmd}[/yellow]")
                 else:
-                    self.search(user_input)
+                    query, search_filter = SearchFilter.parse_query(user_input)
+                    if not query:
+                        console.print("[yellow]请输入搜索关键词[/yellow]")
+                        continue
+                    self.search(query, search_filter=search_filter)
 
             except KeyboardInterrupt:
                 console.print("\n\n[dim]再见！👋[/dim]\n")
@@ -223,6 +371,9 @@ class EnterpriseSearchEngine:
             except Exception as e:
                 console.print(f"[red]错误: {e}[/red]")
 
+        self.analytics.close()
+        self.tokenizer.close()
+
 
 def main():
     """主函数"""
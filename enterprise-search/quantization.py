@@ -0,0 +1,214 @@
+"""
+向量量化模块
+int8 标量量化和乘积量化（PQ），查询向量保持 float32，与编码直接计算内积（非对称距离计算）
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict
+
+import numpy as np
+
+
+# 训练量化器时最多使用的样本数
+TRAIN_SAMPLE_SIZE = 65536
+
+
+def sample_rows(vectors: np.ndarray, size: int, rng: np.random.Generator) -> np.ndarray:
+    """随机抽取若干行（行号排序后读取，对内存映射更友好）"""
+    if len(vectors) <= size:
+        return np.asarray(vectors, dtype=np.float32)
+    return np.asarray(vectors[np.sort(rng.choice(len(vectors), size, replace=False))])
+
+
+def kmeans(
+    data: np.ndarray,
+    k: int,
+    iterations: int,
+    rng: np.random.Generator,
+    spherical: bool = False,
+) -> np.ndarray:
+    """
+    Lloyd k-means，返回聚类中心
+    spherical=True 时按内积分配并把中心归一化（用于单位向量）
+    """
+    k = max(1, min(k, len(data)))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        if spherical:
+            assign = np.argmax(data @ centroids.T, axis=1)
+        else:
+            assign = nearest(data, centroids)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        # 空簇重新随机取一个样本作为中心
+        empty = counts == 0
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+        counts[empty] = 1
+
+        if spherical:
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+        else:
+            centroids = sums / counts[:, None]
+
+    return centroids.astype(np.float32)
+
+
+def nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """按欧氏距离找最近的中心: argmin |x - c|^2 = argmax (2 x·c - |c|^2)"""
+    return np.argmax(2 * data @ centroids.T - (centroids**2).sum(axis=1), axis=1)
+
+
+class Quantizer(ABC):
+    """向量量化器"""
+
+    name: str = ""
+
+    @classmethod
+    @abstractmethod
+    def train(cls, vectors: np.ndarray, **kwargs) -> "Quantizer":
+        """在样本上训练"""
+
+    @abstractmethod
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """编码为 uint8 数组，形状 (n, bytes_per_vector)"""
+
+    @abstractmethod
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """float32 查询与编码的近似内积，形状 (查询数, 编码数)"""
+
+    @property
+    @abstractmethod
+    def bytes_per_vector(self) -> int:
+        pass
+
+    @abstractmethod
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """导出参数（用于持久化）"""
+
+    @classmethod
+    @abstractmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "Quantizer":
+        pass
+
+
+class ScalarQuantizer(Quantizer):
+    """
+    int8 标量量化：每个维度按最小值、最大值线性映射到 0-255
+    x ≈ low + code * scale，因此 q·x ≈ code·(q * scale) + q·low
+    """
+
+    name = "int8"
+
+    def __init__(self, low: np.ndarray, scale: np.ndarray):
+        self.low = low
+        self.scale = scale
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, seed: int = 0) -> "ScalarQuantizer":
+        sample = sample_rows(vectors, TRAIN_SAMPLE_SIZE, np.random.default_rng(seed))
+        low = sample.min(axis=0)
+        scale = np.maximum(sample.max(axis=0) - low, 1e-12) / 255
+        return cls(low.astype(np.float32), scale.astype(np.float32))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        return (queries * self.scale) @ codes.T.astype(np.float32) + (queries @ self.low)[:, None]
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return len(self.low)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"low": self.low, "scale": self.scale}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ScalarQuantizer":
+        return cls(arrays["low"], arrays["scale"])
+
+
+class ProductQuantizer(Quantizer):
+    """
+    乘积量化：向量切成 m 段，每段用 256 个中心之一的编号表示（每个向量 m 字节）
+    检索时先算查询每段与各中心的内积表，编码的分数为 m 次查表之和
+    """
+
+    name = "pq"
+    CENTROIDS = 256
+
+    def __init__(self, codebooks: np.ndarray):
+        # 形状 (m, 256, 每段维度)
+        self.codebooks = codebooks
+
+    @staticmethod
+    def default_subspaces(dim: int) -> int:
+        """默认每段 8 维；维度不能整除时取不超过 dim / 8 的最大因数"""
+        for m in range(max(1, dim // 8), 0, -1):
+            if dim % m == 0:
+                return m
+        return 1
+
+    @classmethod
+    def train(
+        cls, vectors: np.ndarray, m: int = 0, iterations: int = 15, seed: int = 0
+    ) -> "ProductQuantizer":
+        rng = np.random.default_rng(seed)
+        sample = sample_rows(vectors, TRAIN_SAMPLE_SIZE, rng)
+        dim = sample.shape[1]
+        m = m or cls.default_subspaces(dim)
+        if dim % m:
+            raise ValueError(f"向量维度 {dim} 不能被 PQ 分段数 {m} 整除")
+
+        sub_dim = dim // m
+        codebooks = np.zeros((m, cls.CENTROIDS, sub_dim), dtype=np.float32)
+        for j in range(m):
+            subspace = sample[:, j * sub_dim : (j + 1) * sub_dim]
+            centroids = kmeans(subspace, cls.CENTROIDS, iterations, rng)
+            # 样本少于 256 个时重复填充
+            codebooks[j] = centroids[np.arange(cls.CENTROIDS) % len(centroids)]
+        return cls(codebooks)
+
+    @property
+    def m(self) -> int:
+        return len(self.codebooks)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dim) -> (m, n, 每段维度)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors.reshape(len(vectors), self.m, -1).transpose(1, 0, 2)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors)
+        codes = np.empty((parts.shape[1], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest(parts[j], self.codebooks[j])
+        return codes
+
+    def score(self, codes: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        # 内积表: (查询数, m, 256)
+        tables = np.einsum("jqd,jcd->qjc", self._split(queries), self.codebooks)
+        columns = np.arange(self.m)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for i, table in enumerate(tables):
+            scores[i] = table[columns, codes].sum(axis=1)
+        return scores
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.m
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ProductQuantizer":
+        return cls(arrays["codebooks"])
+
+
+QUANTIZERS = {cls.name: cls for cls in (ScalarQuantizer, ProductQuantizer)}
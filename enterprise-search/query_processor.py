@@ -3,10 +3,14 @@
 查询扩展和改写
 """
 
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 import google.generativeai as genai
 
 from config import config
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_query
+from tracing import span
 
 
 class QueryProcessor:
@@ -35,47 +39,125 @@ class QueryProcessor:
 
 改写后的查询:"""
 
-    def __init__(self):
+    def __init__(self, cache: TieredCache = None):
         genai.configure(api_key=config.google_api_key)
         self.model = genai.GenerativeModel(config.llm_model)
+        self.cache = cache or self._create_cache()
+
+    @staticmethod
+    def _create_cache() -> TieredCache:
+        """创建扩展/改写结果缓存"""
+        disk = None
+        if config.query_cache_persist:
+            disk = SQLiteCache(
+                config.query_cache_path,
+                table="query_results",
+                ttl_seconds=config.query_cache_ttl,
+                max_entries=config.query_cache_disk_size,
+            )
+        return TieredCache(
+            LRUCache(max_size=config.query_cache_size, ttl_seconds=config.query_cache_ttl),
+            disk,
+        )
+
+    def _cache_key(self, kind: str, query: str) -> str:
+        """缓存键：类型 + 提示词版本 + 归一化查询（提示词或模型变化时自动失效）"""
+        prompt = self.EXPANSION_PROMPT if kind == "expand" else self.REWRITE_PROMPT
+        version = hashlib.sha1(f"{config.llm_model}\x00{prompt}".encode("utf-8")).hexdigest()
+        return f"{kind}\x00{version[:12]}\x00{normalize_query(query)}"
 
     def expand_query(self, query: str) -> List[str]:
         """查询扩展"""
-        try:
-            response = self.model.generate_content(
-                self.EXPANSION_PROMPT.format(query=query),
-                generation_config=genai.GenerationConfig(
-                    temperature=0.3,
-                    max_output_tokens=100,
-                ),
-            )
-
-            expanded = response.text.strip()
-            # 解析扩展词
-            terms = [t.strip() for t in expanded.split(",") if t.strip()]
+        with span("query.expand") as expand_span:
+            return self._expand_query(query, expand_span)
+
+    def _expand_query(self, query: str, expand_span) -> List[str]:
+        key = self._cache_key("expand", query)
+        terms = self.cache.get(key)
+        expand_span.set_attribute("cache_hit", terms is not None)
+        if terms is not None:
             return terms
 
+        try:
+            with span("query.llm"):
+                terms = self._generate_expansion(query)
         except Exception as e:
+            expand_span.set_error(str(e))
             print(f"查询扩展失败: {e}")
             return []
 
+        # 只缓存成功的结果
+        self.cache.set(key, terms)
+        return terms
+
+    def _generate_expansion(self, query: str) -> List[str]:
+        """调用 LLM 生成扩展词"""
+        response = self.model.generate_content(
+            self.EXPANSION_PROMPT.format(query=query),
+            generation_config=genai.GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=100,
+            ),
+        )
+
+        expanded = response.text.strip()
+        # 解析扩展词
+        return [t.strip() for t in expanded.split(",") if t.strip()]
+
     def rewrite_query(self, query: str) -> str:
         """查询改写"""
-        try:
-            response = self.model.generate_content(
-                self.REWRITE_PROMPT.format(query=query),
-                generation_config=genai.GenerationConfig(
-                    temperature=0.1,
-                    max_output_tokens=50,
-                ),
-            )
+        key = self._cache_key("rewrite", query)
+        rewritten = self.cache.get(key)
+        if rewritten is not None:
+            return rewritten
 
-            return response.text.strip()
+        try:
+            with span("query.rewrite"):
+                response = self.model.generate_content(
+                    self.REWRITE_PROMPT.format(query=query),
+                    generation_config=genai.GenerationConfig(
+                        temperature=0.1,
+                        max_output_tokens=50,
+                    ),
+                )
+            rewritten = response.text.strip()
 
         except Exception as e:
             print(f"查询改写失败: {e}")
             return query
 
+        self.cache.set(key, rewritten)
+        return rewritten
+
+    def warm_up(self, queries: List[str], compute_missing: bool = True):
+        """
+        预热热门查询的扩展结果：磁盘缓存中已有的载入内存，
+        没有的在后台线程中生成（不阻塞启动）
+        只预热扩展词：搜索流程不做查询改写，改写结果仍在首次调用时生成；
+        预热时的缓存读写不计入命中统计，不影响搜索分析中的命中率
+        """
+        missing = [
+            query
+            for query in queries
+            if self.cache.get(self._cache_key("expand", query), record_stats=False) is None
+        ]
+        if not missing or not compute_missing:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-warmup")
+        for query in missing:
+            executor.submit(self._warm_expansion, query)
+        executor.shutdown(wait=False)
+
+    def _warm_expansion(self, query: str):
+        """后台生成并缓存扩展词（失败时不缓存）"""
+        try:
+            terms = self._generate_expansion(query)
+        except Exception as e:
+            print(f"预热查询扩展失败: {e}")
+            return
+        self.cache.set(self._cache_key("expand", query), terms)
+
     def process(self, query: str, expand: bool = True, rewrite: bool = False) -> dict:
         """处理查询"""
         result = {
@@ -0,0 +1,232 @@
+"""
+重排序后端模块
+提供 LLM 和本地 Cross-Encoder 两种相关度评分实现
+"""
+
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import google.generativeai as genai
+
+from config import config
+
+
+class RerankBackend(ABC):
+    """重排序后端基类"""
+
+    name: str = ""
+
+    @abstractmethod
+    def score(self, query: str, contents: List[str]) -> List[Optional[float]]:
+        """为每个文档给出 0-100 的相关度分数，顺序与输入一致；评分失败的文档为 None"""
+        pass
+
+
+class LLMRerankBackend(RerankBackend):
+    """使用 LLM 评分"""
+
+    name = "llm"
+
+    RERANK_PROMPT = """请评估以下文档与查询的相关性，给出 0-100 的相关度分数。
+
+查询: {query}
+
+文档内容:
+{content}
+
+请只返回一个数字（0-100），表示相关度分数。分数越高表示越相关。
+
+相关度分数:"""
+
+    LISTWISE_PROMPT = """请评估以下每个文档与查询的相关性，分别给出 0-100 的相关度分数。
+
+查询: {query}
+
+{documents}
+
+请只返回一个 JSON 数组，按文档编号顺序包含 {count} 个数字，例如 [85, 20, 60]。分数越高表示越相关。
+
+相关度分数:"""
+
+    # 单个文档参与评分的最大长度
+    MAX_CONTENT_LENGTH = 500
+
+    def __init__(self):
+        genai.configure(api_key=config.google_api_key)
+        self.model = genai.GenerativeModel(config.llm_model)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.rerank_concurrency,
+            thread_name_prefix="reranker",
+        )
+
+    def score(self, query: str, contents: List[str]) -> List[Optional[float]]:
+        """为一组候选文档评分"""
+        if config.rerank_mode == "listwise":
+            # 一次请求为全部候选评分，解析失败时退回逐个评分
+            scores = self._score_listwise(query, contents)
+            if scores is not None:
+                return scores
+
+        return self._score_pointwise(query, contents)
+
+    def _score_pointwise(self, query: str, contents: List[str]) -> List[Optional[float]]:
+        """逐个文档评分，在并发上限内同时发送请求"""
+        if len(contents) <= 1 or config.rerank_concurrency <= 1:
+            return [self._score_document(query, content) for content in contents]
+
+        return list(
+            self.executor.map(lambda content: self._score_document(query, content), contents)
+        )
+
+    def _score_listwise(self, query: str, contents: List[str]) -> Optional[List[float]]:
+        """单次请求为所有文档评分，失败时返回 None"""
+        documents = "\n\n".join(
+            f"[{i}] {self._truncate(content)}" for i, content in enumerate(contents, 1)
+        )
+
+        try:
+            response = self.model.generate_content(
+                self.LISTWISE_PROMPT.format(
+                    query=query, documents=documents, count=len(contents)
+                ),
+                generation_config=genai.GenerationConfig(
+                    temperature=0,
+                    max_output_tokens=20 + 8 * len(contents),
+                ),
+            )
+            return self._parse_scores(response.text, len(contents))
+
+        except Exception as e:
+            print(f"批量评分失败: {e}")
+            return None
+
+    @staticmethod
+    def _parse_scores(text: str, count: int) -> Optional[List[float]]:
+        """解析 JSON 分数数组，数量不符或格式错误时返回 None"""
+        match = re.search(r"\[.*?\]", text, re.DOTALL)
+        if not match:
+            return None
+
+        try:
+            values = json.loads(match.group())
+        except ValueError:
+            return None
+
+        if len(values) != count:
+            return None
+
+        try:
+            return [min(100, max(0, float(value))) for value in values]
+        except (TypeError, ValueError):
+            return None
+
+    def _truncate(self, content: str) -> str:
+        """截断内容"""
+        if len(content) > self.MAX_CONTENT_LENGTH:
+            return content[: self.MAX_CONTENT_LENGTH] + "..."
+        return content
+
+    def _score_document(self, query: str, content: str) -> Optional[float]:
+        """使用 LLM 评分，失败时返回 None"""
+        try:
+            # 截断内容
+            content = self._truncate(content)
+
+            response = self.model.generate_content(
+                self.RERANK_PROMPT.format(query=query, content=content),
+                generation_config=genai.GenerationConfig(
+                    temperature=0,
+                    max_output_tokens=10,
+                ),
+            )
+
+            score_text = response.text.strip()
+            # 提取数字
+            score = float("".join(c for c in score_text if c.isdigit() or c == "."))
+            return min(100, max(0, score))
+
+        except Exception as e:
+            print(f"评分失败: {e}")
+            return None
+
+
+class CrossEncoderBackend(RerankBackend):
+    """本地 CPU Cross-Encoder 评分，无需网络请求"""
+
+    name = "cross-encoder"
+
+    def __init__(
+        self,
+        model_dir: str,
+        batch_size: int = None,
+        num_threads: int = None,
+        max_length: int = None,
+    ):
+        # 可选依赖，只在使用本地模型时导入
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        self.torch = torch
+        self.batch_size = batch_size or config.reranker_batch_size
+        self.max_length = max_length or config.reranker_max_length
+
+        # 推理线程数与 CPU 核数匹配
+        torch.set_num_threads(num_threads or config.reranker_threads)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        self.model.eval()
+
+    def score(self, query: str, contents: List[str]) -> List[float]:
+        """按固定批大小分批推理"""
+        if not contents:
+            return []
+
+        # 按长度排序，减少同一批内的填充
+        order = sorted(range(len(contents)), key=lambda i: len(contents[i]))
+        scores = [0.0] * len(contents)
+
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            inputs = self.tokenizer(
+                [query] * len(batch),
+                [contents[i] for i in batch],
+                padding=True,
+                truncation="only_second",
+                max_length=self.max_length,
+                return_tensors="pt",
+            )
+
+            with self.torch.inference_mode():
+                logits = self.model(**inputs).logits
+
+            for i, value in zip(batch, self._to_scores(logits)):
+                scores[i] = value
+
+        return scores
+
+    def _to_scores(self, logits) -> List[float]:
+        """logits 转为 0-100 分数"""
+        if logits.shape[-1] == 1:
+            probs = self.torch.sigmoid(logits[:, 0])
+        else:
+            probs = self.torch.softmax(logits, dim=-1)[:, -1]
+        return [float(p) * 100 for p in probs]
+
+
+def create_backend() -> RerankBackend:
+    """根据配置选择重排序后端：RERANKER_MODEL 指向模型目录时使用本地 Cross-Encoder"""
+    model_dir = config.reranker_model
+    if model_dir and os.path.isdir(model_dir):
+        try:
+            return CrossEncoderBackend(model_dir)
+        except ImportError as e:
+            print(f"本地重排序模型不可用（{e}），改用 LLM 评分")
+        except Exception as e:
+            print(f"加载重排序模型失败: {e}，改用 LLM 评分")
+
+    return LLMRerankBackend()
@@ -3,14 +3,17 @@
 使用 LLM 或 Cross-Encoder 进行语义重排序
 """
 
+import hashlib
 from typing import List
 from dataclasses import dataclass
 
-import google.generativeai as genai
 from langchain_core.documents import Document
 
 from config import config
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_query
 from hybrid_search import HybridResult
+from rerank_backends import RerankBackend, create_backend
+from tracing import span
 
 
 @dataclass
@@ -26,20 +29,28 @@ class RerankedResult:
 class Reranker:
     """重排序器"""
 
-    RERANK_PROMPT = """请评估以下文档与查询的相关性，给出 0-100 的相关度分数。
-
-查询: {query}
-
-文档内容:
-{content}
-
-请只返回一个数字（0-100），表示相关度分数。分数越高表示越相关。
-
-相关度分数:"""
-
-    def __init__(self):
-        genai.configure(api_key=config.google_api_key)
-        self.model = genai.GenerativeModel(config.llm_model)
+    # 后端评分失败的候选使用的中性分数（不写入缓存，下次查询重新评分）
+    FALLBACK_SCORE = 50.0
+
+    def __init__(self, backend: RerankBackend = None, cache: TieredCache = None):
+        self.backend = backend or create_backend()
+        self.cache = cache or self._create_cache()
+
+    @staticmethod
+    def _create_cache() -> TieredCache:
+        """创建相关度分数缓存"""
+        disk = None
+        if config.rerank_cache_persist:
+            disk = SQLiteCache(
+                config.rerank_cache_path,
+                table="rerank_scores",
+                ttl_seconds=config.rerank_cache_ttl,
+                max_entries=config.rerank_cache_disk_size,
+            )
+        return TieredCache(
+            LRUCache(max_size=config.rerank_cache_size, ttl_seconds=config.rerank_cache_ttl),
+            disk,
+        )
 
     def rerank(
         self,
@@ -56,9 +67,11 @@ class Reranker:
         # 限制重排序的数量（避免 API 调用过多）
         candidates = results[: min(len(results), top_n * 2)]
 
+        with span("rerank", candidates=len(candidates), backend=self.backend.name):
+            scores = self._score_candidates(query, candidates)
+
         scored_results = []
-        for i, result in enumerate(candidates):
-            score = self._score_document(query, result.document.page_content)
+        for i, (result, score) in enumerate(zip(candidates, scores)):
             scored_results.append(
                 {
                     "document": result.document,
@@ -84,27 +97,29 @@ class Reranker:
 
         return reranked
 
-    def _score_document(self, query: str, content: str) -> float:
-        """使用 LLM 评分"""
-        try:
-            # 截断内容
-            max_len = 500
-            if len(content) > max_len:
-                content = content[:max_len] + "..."
-
-            response = self.model.generate_content(
-                self.RERANK_PROMPT.format(query=query, content=content),
-                generation_config=genai.GenerationConfig(
-                    temperature=0,
-                    max_output_tokens=10,
-                ),
-            )
+    def _score_candidates(self, query: str, candidates: List[HybridResult]) -> List[float]:
+        """评分（优先使用缓存，只对未命中的候选调用后端，只缓存评分成功的结果）"""
+        keys = [self._cache_key(query, result.document) for result in candidates]
+        scores = [self.cache.get(key) for key in keys]
 
-            score_text = response.text.strip()
-            # 提取数字
-            score = float("".join(c for c in score_text if c.isdigit() or c == "."))
-            return min(100, max(0, score))
-
-        except Exception as e:
-            print(f"评分失败: {e}")
-            return 50.0  # 默认分数
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            with span("rerank.backend", documents=len(missing)):
+                new_scores = self.backend.score(
+                    query, [candidates[i].document.page_content for i in missing]
+                )
+            for i, score in zip(missing, new_scores):
+                if score is None:
+                    scores[i] = self.FALLBACK_SCORE
+                    continue
+                scores[i] = score
+                self.cache.set(keys[i], score)
+
+        return scores
+
+    def _cache_key(self, query: str, document: Document) -> str:
+        """缓存键：后端名 + 归一化查询 + 文档块内容哈希"""
+        chunk_hash = document.metadata.get("chunk_hash") or hashlib.sha1(
+            document.page_content.encode("utf-8")
+        ).hexdigest()
+        return f"{self.backend.name}\x00{normalize_query(query)}\x00{chunk_hash}"
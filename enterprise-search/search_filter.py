@@ -0,0 +1,110 @@
+"""
+检索过滤模块
+按文档元数据（doc_id、文件名、文件类型、页码范围）限定检索范围
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class SearchFilter:
+    """
+    元数据过滤条件
+    同一字段的多个取值为“或”，不同字段之间为“且”；
+    page_min / page_max 与 metadata["page"] 一致从 0 开始，没有页码的文档块不满足页码条件
+    """
+
+    doc_ids: List[str] = field(default_factory=list)
+    filenames: List[str] = field(default_factory=list)
+    file_types: List[str] = field(default_factory=list)
+    page_min: Optional[int] = None
+    page_max: Optional[int] = None
+
+    # 查询中的过滤语法: 字段名 -> 属性名
+    KEYS = {
+        "doc": "doc_ids",
+        "file": "filenames",
+        "type": "file_types",
+        "page": "pages",
+    }
+
+    # 过滤条件: 字段名:取值，取值含空格时加双引号，如 file:"产品 手册.pdf"
+    FILTER_PATTERN = re.compile(
+        r'(?<!\S)(?P<key>' + "|".join(KEYS) + r'):(?P<value>"[^"]*"|\S+)', re.IGNORECASE
+    )
+
+    def __post_init__(self):
+        # 文件类型统一为大写扩展名（与 ProcessedDocument.file_type 一致）
+        self.file_types = [value.lstrip(".").upper() for value in self.file_types]
+
+    @property
+    def has_page_range(self) -> bool:
+        return self.page_min is not None or self.page_max is not None
+
+    def is_empty(self) -> bool:
+        return not (self.doc_ids or self.filenames or self.file_types or self.has_page_range)
+
+    def __bool__(self) -> bool:
+        return not self.is_empty()
+
+    @classmethod
+    def parse_query(cls, text: str) -> Tuple[str, Optional["SearchFilter"]]:
+        """
+        从查询中拆出过滤条件，返回 (查询, 过滤条件)，没有过滤条件时为 None
+        语法: doc:<doc_id> file:<文件名> type:<pdf|md|txt> page:<页码或起止页码>
+        页码按显示的页码（从 1 开始），如 "缓存策略 type:pdf page:3-10"；
+        同一字段可重复或用逗号分隔多个取值（页码只能有一个范围）；页码格式错误时抛出 ValueError
+        """
+        values = {name: [] for name in cls.KEYS.values()}
+        terms, position = [], 0
+        for match in cls.FILTER_PATTERN.finditer(text):
+            terms.append(text[position : match.start()])
+            position = match.end()
+            value = match["value"].strip('"')
+            values[cls.KEYS[match["key"].lower()]].extend(v for v in value.split(",") if v)
+        terms.append(text[position:])
+        # 过滤条件以外的部分保持输入原样（不处理引号和反斜杠，如 C:\Users）
+        query = " ".join(term.strip() for term in terms if term.strip())
+
+        pages = values.pop("pages")
+        if len(pages) > 1:
+            raise ValueError(
+                f"页码条件只能指定一个范围，收到 {len(pages)} 个: {', '.join(pages)}"
+            )
+        search_filter = cls(**values)
+        if pages:
+            start, end = cls._parse_pages(pages[0])
+            # 显示页码从 1 开始，转为 metadata 中的页码
+            if start is not None:
+                search_filter.page_min = start - 1
+            if end is not None:
+                search_filter.page_max = end - 1
+
+        return query, (search_filter if search_filter else None)
+
+    @staticmethod
+    def _parse_pages(page: str) -> Tuple[Optional[int], Optional[int]]:
+        """解析 "3"、"3-10"、"3-"、"-10" 形式的页码条件，返回 (起始页, 结束页)"""
+        start, dash, end = page.partition("-")
+        parts = [part for part in (start, end) if part]
+        if not parts or not all(part.isdecimal() and int(part) > 0 for part in parts):
+            raise ValueError(
+                f"无效的页码条件 page:{page}，页码从 1 开始，如 page:3、page:3-10、page:3-"
+            )
+        start = int(start) if start else None
+        end = int(end) if end else (None if dash else start)
+        return start, end
+
+    def describe(self) -> str:
+        """用于展示的过滤条件描述"""
+        parts = []
+        for key, name in self.KEYS.items():
+            if name != "pages" and getattr(self, name):
+                parts.append(f"{key}:{','.join(getattr(self, name))}")
+        if self.has_page_range:
+            start = "" if self.page_min is None else self.page_min + 1
+            end = "" if self.page_max is None else self.page_max + 1
+            parts.append(f"page:{start}-{end}" if start != end else f"page:{start}")
+        return " ".join(parts)
@@ -0,0 +1,158 @@
+"""
+测试搜索分析
+"""
+
+import pytest
+import os
+import sys
+import json
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import SearchAnalytics
+from sketches import HyperLogLog, LatencyHistogram, TopK
+
+
+def make_analytics(path="", **kwargs):
+    kwargs.setdefault("recent_size", 100)
+    kwargs.setdefault("top_queries_size", 20)
+    kwargs.setdefault("flush_every", 10)
+    kwargs.setdefault("flush_interval", 3600)
+    kwargs.setdefault("compact_every", 1000)
+    return SearchAnalytics(path=path, **kwargs)
+
+
+class TestSketches:
+    """流式统计结构测试"""
+
+    def test_histogram_percentiles(self):
+        """测试分位数相对误差在 2% 以内"""
+        rng = np.random.default_rng(0)
+        values = rng.lognormal(mean=4, sigma=1, size=20000)
+        histogram = LatencyHistogram()
+        for value in values:
+            histogram.record(value)
+
+        for p in (50, 95, 99):
+            expected = np.percentile(values, p)
+            assert abs(histogram.percentile(p) - expected) / expected < 0.02
+
+    def test_histogram_sparse_roundtrip(self):
+        """测试稀疏表示可以合并回直方图"""
+        histogram = LatencyHistogram()
+        for value in (0, 1.5, 20, 20, 3000):
+            histogram.record(value)
+        restored = LatencyHistogram()
+        restored.merge_sparse(json.loads(json.dumps(histogram.to_sparse())))
+        assert restored.total == 5
+        assert np.array_equal(restored.counts, histogram.counts)
+
+    def test_top_k_finds_heavy_hitters(self):
+        """测试长尾查询中找出高频查询"""
+        rng = np.random.default_rng(1)
+        top = TopK(capacity=10, width=512)
+        stream = [f"hot{i}" for i in range(5) for _ in range(200 - 30 * i)]
+        stream += [f"tail{i}" for i in rng.integers(0, 5000, 3000)]
+        for i in rng.permutation(len(stream)):
+            top.add(stream[i])
+
+        ranked = [query for query, _ in top.most_common(5)]
+        assert ranked == [f"hot{i}" for i in range(5)]
+        assert len(top.candidates) == 10
+
+    def test_hyperloglog(self):
+        """测试基数估计误差"""
+        hll = HyperLogLog()
+        for i in range(20000):
+            hll.add(f"query {i % 5000}")
+        assert abs(hll.count() - 5000) / 5000 < 0.05
+
+
+class TestSearchAnalytics:
+    """搜索分析器测试"""
+
+    def test_memory_bounded(self):
+        """测试记录大量搜索后最近日志和候选集保持固定大小"""
+        analytics = make_analytics()
+        for i in range(1000):
+            analytics.log_search(f"q{i}", result_count=i % 3, latency_ms=float(i))
+
+        assert len(analytics.logs) == 100
+        assert len(analytics.zero_result_queries) == 100
+        assert len(analytics.top_queries.candidates) == 20
+        assert analytics.get_recent_searches(1)[0].query == "q999"
+
+        stats = analytics.get_stats()
+        assert stats["total_searches"] == 1000
+        assert stats["avg_latency_ms"] == pytest.approx(499.5)
+        assert stats["zero_result_rate"] == pytest.approx(334 / 1000)
+
+    def test_stage_percentiles(self):
+        """测试按阶段统计延迟分位数"""
+        analytics = make_analytics()
+        for i in range(1, 101):
+            analytics.log_search(
+                "q",
+                result_count=1,
+                latency_ms=i * 10.0,
+                stage_latencies={"bm25": float(i), "vector": i * 5.0},
+            )
+
+        stats = analytics.get_stats()
+        assert set(stats["latency"]) == {"total", "bm25", "vector"}
+        assert stats["latency"]["bm25"]["p50"] == pytest.approx(50, rel=0.02)
+        assert stats["latency"]["vector"]["p99"] == pytest.approx(495, rel=0.02)
+        assert stats["latency"]["total"]["count"] == 100
+        assert "p95" in analytics.format_stats()
+
+    def test_persistence(self, tmp_path):
+        """测试统计定期追加写入，重启后恢复"""
+        path = str(tmp_path / "analytics.jsonl")
+        analytics = make_analytics(path)
+        for i in range(25):
+            analytics.log_search("常见问题" if i % 2 else f"q{i}", 0 if i == 4 else 2, 10.0 + i)
+
+        # 每 10 次写入一次，最后 5 条尚未写入
+        with open(path, encoding="utf-8") as f:
+            assert len(f.readlines()) == 2
+        analytics.close()
+
+        restored = make_analytics(path)
+        assert restored.get_stats()["latency"] == analytics.get_stats()["latency"]
+        assert restored.total_searches == 25
+        assert restored.get_top_queries(1) == [("常见问题", 12)]
+        assert restored.get_zero_result_queries() == ["q4"]
+        assert restored.get_recent_searches(1)[0].query == "q24"
+
+    def test_compaction(self, tmp_path):
+        """测试增量记录过多时压缩为快照，快照之后的记录继续累加"""
+        path = str(tmp_path / "analytics.jsonl")
+        analytics = make_analytics(path, flush_every=1, compact_every=4)
+        for i in range(10):
+            analytics.log_search(f"q{i % 3}", 1, 5.0, stage_latencies={"bm25": 1.0})
+
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+        assert len(lines) < 4
+        assert "snapshot" in json.loads(lines[0])
+
+        restored = make_analytics(path, flush_every=1, compact_every=4)
+        assert restored.get_stats() == analytics.get_stats()
+        assert restored.get_top_queries(3) == analytics.get_top_queries(3)
+
+    def test_truncated_last_line(self, tmp_path):
+        """测试进程中断留下的半行记录被忽略"""
+        path = str(tmp_path / "analytics.jsonl")
+        analytics = make_analytics(path, flush_every=1)
+        analytics.log_search("q", 1, 5.0)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"logs": [["q", 1')
+
+        assert make_analytics(path).total_searches == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
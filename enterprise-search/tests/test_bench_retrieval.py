@@ -0,0 +1,76 @@
+"""
+测试检索基准（评估指标与离线运行）
+"""
+
+import pytest
+import os
+import sys
+
+# 添加项目根目录和基准测试目录到路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from tokenizer import Tokenizer
+from bench_retrieval import build_parser, ndcg_at_k, recall_at_k, run_benchmark
+from synthetic import FakeEmbeddings, build_corpus
+
+
+class TestMetrics:
+    """评估指标测试"""
+
+    def test_recall(self):
+        """测试召回率的分母为 min(k, 相关文档数)"""
+        relevance = {"a": 2, "b": 1, "c": 1}
+        assert recall_at_k(["a", "x", "b"], relevance, 3) == pytest.approx(2 / 3)
+        assert recall_at_k(["a", "b"], relevance, 2) == 1.0
+        assert recall_at_k(["a"], {}, 5) == 0.0
+
+    def test_ndcg(self):
+        """测试理想排序为 1，高相关文档排后时下降"""
+        relevance = {"a": 2, "b": 1}
+        assert ndcg_at_k(["a", "b", "x"], relevance, 3) == pytest.approx(1.0)
+        assert ndcg_at_k(["b", "a"], relevance, 3) < 1.0
+        assert ndcg_at_k(["x", "y"], relevance, 3) == 0.0
+
+
+class TestSyntheticCorpus:
+    """合成语料测试"""
+
+    def test_deterministic(self):
+        """测试相同参数生成相同的语料和标注"""
+        first = build_corpus(n_docs=200, n_queries=10, seed=3)
+        second = build_corpus(n_docs=200, n_queries=10, seed=3)
+        assert [d.page_content for d in first.documents] == [
+            d.page_content for d in second.documents
+        ]
+        assert [q.relevance for q in first.queries] == [q.relevance for q in second.queries]
+        assert all(q.relevance for q in first.queries)
+
+    def test_fake_embeddings_cross_language(self):
+        """测试中英文同义词的替身向量相同"""
+        corpus = build_corpus(n_docs=10, n_queries=1)
+        embeddings = FakeEmbeddings(corpus.concepts, dim=64, tokenizer=Tokenizer(workers=1))
+        zh, en = embeddings.embed_documents(["缓存", "cache"])
+        assert zh == pytest.approx(en)
+
+
+class TestBenchmark:
+    """端到端运行测试"""
+
+    def test_offline_run(self):
+        """测试小规模语料离线跑完全部组件，报告包含吞吐、延迟和质量指标"""
+        args = build_parser().parse_args(["--docs", "300", "--queries", "15", "--k", "5"])
+        report = run_benchmark(args, tokenizer=Tokenizer(workers=1))
+
+        assert set(report["components"]) == {"bm25", "vector", "hybrid", "rerank"}
+        for metrics in report["components"].values():
+            assert metrics["qps"] > 0
+            assert metrics["p50_ms"] <= metrics["p95_ms"] <= metrics["p99_ms"]
+            assert 0 < metrics["recall@5"] <= 1
+            assert 0 < metrics["ndcg@5"] <= 1
+        assert report["params"]["docs"] == 300
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
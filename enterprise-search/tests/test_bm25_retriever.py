@@ -0,0 +1,228 @@
+"""
+测试 BM25 检索器
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+from langchain_core.documents import Document
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_retriever import BM25Retriever
+from inverted_index import InvertedIndex, InvertedIndexBuilder
+from tokenizer import Tokenizer
+
+
+CORPUS = [
+    "缓存是提升系统性能的关键手段，合理使用缓存可以减少数据库查询",
+    "数据库性能优化需要从索引、查询、架构等方面入手",
+    "Redis cache best practices: set TTL and avoid cache stampede",
+    "系统性能优化指南：使用缓存、优化 SQL 语句、异步处理",
+    "Python performance tips: profile first, then optimize hot paths",
+    "索引设计是数据库优化的基础，联合索引要注意最左前缀",
+    "性能 性能 性能 监控 告警",
+]
+
+QUERIES = [
+    "如何提高系统性能",
+    "数据库索引优化",
+    "cache TTL",
+    "性能 性能",
+    "不存在的词汇组合",
+]
+
+
+def make_documents():
+    return [
+        Document(page_content=text, metadata={"chunk_id": f"doc_{i}"})
+        for i, text in enumerate(CORPUS)
+    ]
+
+
+def chunk_ids(documents):
+    return [doc.metadata["chunk_id"] for doc in documents]
+
+
+class TestInvertedIndex:
+    """倒排索引测试"""
+
+    def test_scores_match_bm25okapi(self):
+        """测试分数与 BM25Okapi 一致"""
+        retriever = BM25Retriever()
+        tokenized = [retriever._tokenize(text) for text in CORPUS]
+
+        index = InvertedIndex.build(tokenized)
+        reference = BM25Okapi(tokenized)
+
+        for query in QUERIES:
+            tokens = retriever._tokenize(query)
+            np.testing.assert_allclose(
+                index.get_scores(tokens),
+                reference.get_scores(tokens),
+                rtol=1e-5,
+                atol=1e-6,
+            )
+
+    def test_top_k_order(self):
+        """测试 top_k 按分数降序"""
+        retriever = BM25Retriever()
+        tokenized = [retriever._tokenize(text) for text in CORPUS]
+        index = InvertedIndex.build(tokenized)
+
+        tokens = retriever._tokenize("数据库性能优化")
+        doc_ids, scores = index.top_k(tokens, 2)
+
+        full = index.get_scores(tokens)
+        assert len(doc_ids) == 2
+        assert list(doc_ids) == list(np.argsort(-full, kind="stable")[:2])
+        assert scores[0] >= scores[1]
+
+    def test_incremental_builder(self):
+        """测试增量构建（多次转存数组）与一次性构建结果一致"""
+        retriever = BM25Retriever()
+        tokenized = [retriever._tokenize(text) for text in CORPUS]
+
+        builder = InvertedIndexBuilder()
+        builder.FLUSH_SIZE = 5
+        for tokens in tokenized:
+            builder.add(tokens)
+        incremental = builder.finish()
+        index = InvertedIndex.build(tokenized)
+
+        for query in QUERIES:
+            tokens = retriever._tokenize(query)
+            np.testing.assert_allclose(incremental.get_scores(tokens), index.get_scores(tokens))
+
+
+class TestBM25Retriever:
+    """BM25 检索器测试"""
+
+    def test_search_returns_ranked_results(self):
+        """测试检索结果与 BM25Okapi 排序一致"""
+        retriever = BM25Retriever()
+        retriever.build_index(make_documents())
+
+        results = retriever.search("数据库索引优化", top_k=3)
+
+        tokenized = [retriever._tokenize(text) for text in CORPUS]
+        reference = BM25Okapi(tokenized).get_scores(
+            retriever._tokenize("数据库索引优化")
+        )
+        expected = [i for i in np.argsort(-reference, kind="stable")[:3]]
+
+        assert [r.rank for r in results] == list(range(1, len(results) + 1))
+        assert [r.document.metadata["chunk_id"] for r in results] == [
+            f"doc_{i}" for i in expected if reference[i] > 0
+        ]
+        for result in results:
+            i = int(result.document.metadata["chunk_id"].split("_")[1])
+            assert result.score == pytest.approx(reference[i], rel=1e-5)
+
+    def test_search_no_match(self):
+        """测试无匹配时返回空列表"""
+        retriever = BM25Retriever()
+        retriever.build_index(make_documents())
+
+        assert retriever.search("zzzz qqqq") == []
+
+    def test_search_empty_index(self):
+        """测试空索引"""
+        retriever = BM25Retriever()
+        retriever.build_index([])
+
+        assert retriever.search("性能") == []
+        assert retriever.get_doc_count() == 0
+
+
+class TestBM25Persistence:
+    """BM25 索引持久化测试"""
+
+    def test_save_and_load(self):
+        """测试保存后加载结果一致"""
+        documents = make_documents()
+        retriever = BM25Retriever()
+        retriever.build_index(documents)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bm25_index.bin")
+            retriever.save(path, fingerprint="v1")
+
+            loaded = BM25Retriever(store=retriever.store)
+            assert loaded.load(chunk_ids(documents), path, fingerprint="v1")
+            assert isinstance(loaded.index.postings, np.memmap)
+
+            for query in QUERIES:
+                expected = retriever.search(query)
+                actual = loaded.search(query)
+                assert [r.document.metadata["chunk_id"] for r in actual] == [
+                    r.document.metadata["chunk_id"] for r in expected
+                ]
+                assert [r.score for r in actual] == pytest.approx(
+                    [r.score for r in expected]
+                )
+
+    def test_stale_fingerprint(self):
+        """测试指纹不一致时拒绝加载"""
+        documents = make_documents()
+        retriever = BM25Retriever()
+        retriever.build_index(documents)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bm25_index.bin")
+            retriever.save(path, fingerprint="v1")
+
+            loaded = BM25Retriever(store=retriever.store)
+            assert not loaded.load(chunk_ids(documents), path, fingerprint="v2")
+            assert not loaded.load(chunk_ids(documents[:-1]), path, fingerprint="v1")
+            assert loaded.index is None
+
+    def test_tokenizer_change(self):
+        """测试停用词文件变化后拒绝加载（需要用新的分词规则重建）"""
+        documents = make_documents()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bm25_index.bin")
+            stop_words_path = os.path.join(tmp_dir, "stop_words.txt")
+            with open(stop_words_path, "w", encoding="utf-8") as f:
+                f.write("监控\n")
+
+            retriever = BM25Retriever(tokenizer=Tokenizer(stop_words_path=stop_words_path))
+            retriever.build_index(documents)
+            retriever.save(path, fingerprint="v1")
+
+            same = BM25Retriever(
+                store=retriever.store, tokenizer=Tokenizer(stop_words_path=stop_words_path)
+            )
+            assert same.load(chunk_ids(documents), path, fingerprint="v1")
+
+            with open(stop_words_path, "w", encoding="utf-8") as f:
+                f.write("监控\n告警\n")
+            changed = BM25Retriever(
+                store=retriever.store, tokenizer=Tokenizer(stop_words_path=stop_words_path)
+            )
+            assert not changed.load(chunk_ids(documents), path, fingerprint="v1")
+            # 默认分词配置与建索引时不同，同样拒绝加载
+            assert not BM25Retriever(store=retriever.store).load(
+                chunk_ids(documents), path, fingerprint="v1"
+            )
+
+    def test_invalid_file(self):
+        """测试损坏或不存在的索引文件"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "bm25_index.bin")
+            retriever = BM25Retriever()
+            assert not retriever.load(chunk_ids(make_documents()), path)
+
+            with open(path, "wb") as f:
+                f.write(b"not an index")
+            assert not retriever.load(chunk_ids(make_documents()), path)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
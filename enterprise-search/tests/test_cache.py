@@ -0,0 +1,86 @@
+"""
+测试缓存模块
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LRUCache, SQLiteCache, TieredCache, normalize_query
+
+
+class TestLRUCache:
+    """内存缓存测试"""
+
+    def test_lru_eviction(self):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_ttl_expiry(self):
+        """测试过期条目视为未命中"""
+        cache = LRUCache(max_size=10, ttl_seconds=0.05)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        time.sleep(0.1)
+        assert cache.get("a") is None
+        assert cache.stats()["hit_rate"] == 0.5
+
+    def test_normalize_query(self):
+        """测试查询归一化"""
+        assert normalize_query("  Redis   Cache\n") == "redis cache"
+
+
+class TestTieredCache:
+    """两级缓存测试"""
+
+    def test_disk_tier_survives_restart(self):
+        """测试磁盘层在重启后仍可命中"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "cache.sqlite3")
+
+            cache = TieredCache(LRUCache(), SQLiteCache(path))
+            cache.set("k", 87.5)
+            cache.disk.close()
+
+            restarted = TieredCache(LRUCache(), SQLiteCache(path))
+            assert restarted.get("k") == 87.5
+            assert restarted.get("k") == 87.5
+            assert restarted.get("missing") is None
+
+            stats = restarted.stats()
+            assert stats["disk_hits"] == 1
+            assert stats["hits"] == 2
+            assert stats["misses"] == 1
+            restarted.disk.close()
+
+    def test_disk_size_bound(self):
+        """测试磁盘层容量上限"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            disk = SQLiteCache(os.path.join(tmp_dir, "cache.sqlite3"), max_entries=5)
+            disk.PRUNE_INTERVAL = 1
+
+            for i in range(20):
+                disk.set(f"k{i}", b"v", created_at=1000 + i)
+
+            assert len(disk) == 5
+            assert disk.get("k19") == b"v"
+            assert disk.get("k0") is None
+            disk.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
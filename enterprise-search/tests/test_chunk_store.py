@@ -0,0 +1,106 @@
+"""
+测试文档块存储
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from chunk_store import ChunkStore
+
+
+def make_chunks(doc_id: str, texts, page=None):
+    return [
+        Document(
+            page_content=text,
+            metadata={
+                "source": f"/docs/{doc_id}.pdf",
+                "doc_id": doc_id,
+                "filename": f"{doc_id}.pdf",
+                "chunk_id": f"{doc_id}_{i}",
+                "chunk_index": i,
+                **({"page": page} if page is not None else {}),
+            },
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+class TestChunkStore:
+    """文档块存储测试"""
+
+    def test_roundtrip_file(self):
+        """测试文本和元数据写入后可按 chunk_id 读回"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = ChunkStore(os.path.join(tmp_dir, "chunks.bin"))
+            first = make_chunks("guide", ["缓存可以提升性能。", "", "Index speeds up queries"], page=3)
+            store.add(first)
+            # 读取后继续追加，新文本同样可读
+            assert store.get("guide_0").page_content == "缓存可以提升性能。"
+            second = make_chunks("faq", ["常见问题：如何配置索引？"])
+            store.add(second)
+
+            for chunk in first + second:
+                lazy = store.get(chunk.metadata["chunk_id"])
+                assert lazy.page_content == chunk.page_content
+                for key, value in chunk.metadata.items():
+                    assert lazy.metadata[key] == value
+                assert len(lazy.metadata["chunk_hash"]) == 40
+
+            assert "page" not in store.get("faq_0").metadata
+            assert len(store) == 4
+            store.close()
+
+    def test_loader_metadata_kept(self):
+        """测试列以外的加载器元数据原样保留，同一文档的相同元数据只存一份"""
+        store = ChunkStore(":memory:")
+        chunks = make_chunks("report", ["第一段", "第二段"], page=0)
+        for chunk in chunks:
+            chunk.metadata.update({"total_pages": 12, "author": "张三", "page_label": "i"})
+        store.add(chunks)
+        store.add(make_chunks("plain", ["无额外元数据"]))
+
+        for chunk in chunks:
+            metadata = store.get(chunk.metadata["chunk_id"]).metadata
+            assert metadata.pop("chunk_hash")
+            assert metadata == chunk.metadata
+        assert set(store.get("plain_0").metadata) == set(ChunkStore.COLUMN_FIELDS) - {"page"}
+        assert len(store._extras) == 1
+
+    def test_lazy_text(self):
+        """测试只有访问 page_content 时才读取文本"""
+        store = ChunkStore(":memory:")
+        store.add(make_chunks("guide", ["第一段", "第二段"]))
+
+        docs = store.get_many(["guide_1", "guide_0"])
+        assert [doc.metadata["chunk_id"] for doc in docs] == ["guide_1", "guide_0"]
+        assert all(doc._text is None for doc in docs)
+
+        document = docs[0].to_document()
+        assert isinstance(document, Document)
+        assert document.page_content == "第二段"
+
+        with pytest.raises(KeyError):
+            store.get_many(["missing"])
+
+    def test_reset(self):
+        """测试重置后清空内容，重复的 chunk_id 被拒绝"""
+        store = ChunkStore(":memory:")
+        store.add(make_chunks("guide", ["第一段"]))
+        with pytest.raises(ValueError):
+            store.add(make_chunks("guide", ["第一段"]))
+
+        store.reset()
+        assert len(store) == 0
+        store.add(make_chunks("guide", ["新内容"]))
+        assert store.get("guide_0").page_content == "新内容"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,127 @@
+"""
+测试文档处理器
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_retriever import BM25Retriever
+from chunk_store import ChunkStore
+from document_processor import DocumentProcessor
+
+
+def write_corpus(dir_path: str, count: int = 6):
+    for i in range(count):
+        with open(os.path.join(dir_path, f"doc{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"第 {i} 篇文档。" + "缓存与索引的性能优化。" * (20 + i) + "\n\n结尾段落。")
+
+
+class TestParallelIngestion:
+    """多进程文档处理测试"""
+
+    def test_parallel_matches_serial(self):
+        """测试多进程与单进程结果一致"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_corpus(tmp_dir)
+
+            serial = DocumentProcessor().process_directory(tmp_dir, workers=1)
+            parallel = DocumentProcessor().process_directory(tmp_dir, workers=3)
+
+            assert [d.filename for d in parallel] == [d.filename for d in serial]
+            for a, b in zip(serial, parallel):
+                assert a.content_hash == b.content_hash
+                assert [c.page_content for c in a.chunks] == [c.page_content for c in b.chunks]
+                assert [c.metadata for c in a.chunks] == [c.metadata for c in b.chunks]
+
+    def test_errors_collected(self):
+        """测试单个文件错误被收集而不中断处理"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_corpus(tmp_dir, count=2)
+            with open(os.path.join(tmp_dir, "broken.txt"), "wb") as f:
+                f.write(b"\xff\xfe\xfa invalid utf-8")
+
+            processor = DocumentProcessor()
+            processed = processor.process_directory(tmp_dir, workers=2)
+
+            assert len(processed) == 2
+            assert [e.filename for e in processor.errors] == ["broken.txt"]
+
+    def test_progress_and_throughput(self):
+        """测试进度回调和吞吐量统计"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_corpus(tmp_dir, count=3)
+            progress = []
+
+            processor = DocumentProcessor()
+            processor.process_directory(
+                tmp_dir,
+                workers=2,
+                progress_callback=lambda done, total, stats: progress.append((done, total)),
+            )
+
+            stats = processor.last_ingest_stats
+            assert progress[-1] == (3, 3)
+            assert stats.files == 3
+            assert stats.chunks == processor.get_stats()["total_chunks"]
+            assert stats.files_per_s > 0
+            assert stats.chunks_per_s > 0
+
+
+class TestStreamingIngestion:
+    """流式导入测试"""
+
+    def test_stream_releases_chunks(self):
+        """测试流式处理按文件顺序产出，登记的文档不保留文本"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_corpus(tmp_dir, count=5)
+
+            processor = DocumentProcessor()
+            expected = [d.filename for d in DocumentProcessor().process_directory(tmp_dir, workers=1)]
+            streamed = []
+            for doc in processor.iter_directory(tmp_dir, workers=2):
+                assert doc.chunks
+                streamed.append(doc.filename)
+
+            assert streamed == expected
+            assert all(not doc.chunks and doc.chunk_ids for doc in processor.documents.values())
+            assert processor.get_stats()["total_chunks"] == processor.last_ingest_stats.chunks
+
+    def test_bm25_from_stream(self):
+        """测试边导入边构建的 BM25 与一次性构建结果一致，结果文本从存储读取"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_corpus(tmp_dir, count=4)
+
+            store = ChunkStore(":memory:")
+            streamed = BM25Retriever(store)
+            streamed.begin_build()
+            for doc in DocumentProcessor().iter_directory(tmp_dir, workers=1):
+                store.add(doc.chunks)
+                streamed.add_documents(doc.chunks)
+            streamed.finish_build()
+
+            chunks = [
+                chunk
+                for doc in DocumentProcessor().process_directory(tmp_dir, workers=1)
+                for chunk in doc.chunks
+            ]
+            reference = BM25Retriever()
+            reference.build_index(chunks)
+
+            assert len(store) == len(chunks)
+            actual = streamed.search("缓存性能")
+            expected = reference.search("缓存性能")
+            assert [r.document.metadata["chunk_id"] for r in actual] == [
+                r.document.metadata["chunk_id"] for r in expected
+            ]
+            assert [r.document.page_content for r in actual] == [
+                r.document.page_content for r in expected
+            ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,119 @@
+"""
+测试查询向量缓存
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LRUCache, SQLiteCache, TieredCache
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """计数的向量模型替身"""
+
+    def __init__(self):
+        self.query_calls = 0
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        return [float(len(text)), 1.0, 0.5]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def memory_cache(**kwargs) -> TieredCache:
+    return TieredCache(
+        LRUCache(sizeof=lambda vector: vector.nbytes, **kwargs),
+        encode=lambda vector: vector.tobytes(),
+        decode=lambda data: np.frombuffer(data, dtype=np.float32),
+    )
+
+
+class TestCachedEmbeddings:
+    """查询向量缓存测试"""
+
+    def test_trivial_variants_hit_cache(self):
+        """测试空白和大小写差异的查询命中缓存"""
+        base = CountingEmbeddings()
+        embeddings = CachedEmbeddings(base, cache=memory_cache(), namespace="test")
+
+        first = embeddings.embed_query("Redis Cache")
+        second = embeddings.embed_query("  redis   CACHE ")
+
+        assert base.query_calls == 1
+        assert first == second
+        assert embeddings.embed_query_array("redis cache").dtype == np.float32
+
+    def test_custom_normalization(self):
+        """测试可配置的归一化规则"""
+        base = CountingEmbeddings()
+        embeddings = CachedEmbeddings(
+            base, cache=memory_cache(), normalization=("strip",), namespace="test"
+        )
+
+        embeddings.embed_query("Redis")
+        embeddings.embed_query("redis")
+
+        assert base.query_calls == 2
+
+    def test_embed_queries_single_batch(self):
+        """测试多个查询变体合并为一次批量请求"""
+        batches = []
+
+        def embed_batch(texts):
+            batches.append(list(texts))
+            return [[float(len(text)), 0.0, 0.0] for text in texts]
+
+        base = CountingEmbeddings()
+        embeddings = CachedEmbeddings(
+            base, cache=memory_cache(), namespace="test", embed_queries_fn=embed_batch
+        )
+        embeddings.embed_query("缓存")
+
+        vectors = embeddings.embed_queries(["缓存", "性能优化", "Index", "index "])
+
+        assert batches == [["性能优化", "Index"]]
+        assert [float(v[0]) for v in vectors] == [2.0, 4.0, 5.0, 5.0]
+
+    def test_memory_bound(self):
+        """测试内存层按字节数淘汰"""
+        cache = memory_cache(max_size=1000, max_bytes=3 * 4 * 2)
+        embeddings = CachedEmbeddings(CountingEmbeddings(), cache=cache, namespace="test")
+
+        for query in ["a", "bb", "ccc", "dddd"]:
+            embeddings.embed_query(query)
+
+        assert len(cache.memory) == 2
+        assert cache.memory.nbytes == 24
+
+    def test_disk_tier(self):
+        """测试磁盘层跨进程复用"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "embeddings.sqlite3")
+
+            def make(base):
+                cache = memory_cache()
+                cache.disk = SQLiteCache(path, table="query_embeddings")
+                return CachedEmbeddings(base, cache=cache, namespace="test")
+
+            make(CountingEmbeddings()).embed_query("缓存")
+
+            base = CountingEmbeddings()
+            vector = make(base).embed_query("缓存")
+
+            assert base.query_calls == 0
+            assert vector == [2.0, 1.0, 0.5]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,157 @@
+"""
+测试向量化流水线
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import config
+
+from embedding_pipeline import (
+    EmbeddingCheckpoint,
+    EmbeddingPipeline,
+    EmbeddingPipelineError,
+    TokenBucket,
+)
+from vector_index import NumpyVectorIndex
+from vector_retriever import VectorRetriever
+
+
+class FixedEmbeddings:
+    """固定向量的嵌入替身"""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0, 0.0, 0.0] for _ in texts]
+
+
+def make_docs(count: int):
+    return [
+        Document(page_content=f"片段 {i}", metadata={"chunk_id": f"c{i}"})
+        for i in range(count)
+    ]
+
+
+class RecordingHandler:
+    """记录写入的批次，可指定前若干次调用失败"""
+
+    def __init__(self, fail_times: int = 0, fail_ids=()):
+        self.fail_times = fail_times
+        self.fail_ids = set(fail_ids)
+        self.calls = 0
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, batch, ids):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.fail_times or self.fail_ids & set(ids):
+                raise RuntimeError("429 Resource exhausted")
+            self.batches.append(list(ids))
+
+
+def make_pipeline(handler, **kwargs):
+    kwargs.setdefault("batch_size", 3)
+    kwargs.setdefault("max_workers", 2)
+    kwargs.setdefault("base_delay", 0.001)
+    return EmbeddingPipeline(handler=handler, id_fn=lambda doc: doc.metadata["chunk_id"], **kwargs)
+
+
+class TestEmbeddingPipeline:
+    """流水线测试"""
+
+    def test_batches_all_documents(self):
+        """测试按批大小切分并写入全部文档"""
+        handler = RecordingHandler()
+        stats = make_pipeline(handler).run(make_docs(7))
+
+        assert sorted(len(batch) for batch in handler.batches) == [1, 3, 3]
+        assert sorted(id_ for batch in handler.batches for id_ in batch) == sorted(
+            f"c{i}" for i in range(7)
+        )
+        assert stats.items == 7
+        assert stats.batches == 3
+
+    def test_retries_transient_errors(self):
+        """测试临时错误重试后成功"""
+        handler = RecordingHandler(fail_times=2)
+        stats = make_pipeline(handler, batch_size=10, max_workers=1).run(make_docs(4))
+
+        assert stats.retries == 2
+        assert stats.items == 4
+
+    def test_checkpoint_resume(self):
+        """测试失败时保留断点，重新运行只写入剩余文档"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "checkpoint.txt")
+            docs = make_docs(6)
+
+            failing = RecordingHandler(fail_ids={"c4"})
+            with pytest.raises(EmbeddingPipelineError) as exc_info:
+                make_pipeline(failing, max_retries=1, checkpoint_path=path).run(docs)
+            assert sorted(exc_info.value.stats.failed_ids) == ["c3", "c4", "c5"]
+            assert EmbeddingCheckpoint(path).done == {"c0", "c1", "c2"}
+
+            handler = RecordingHandler()
+            stats = make_pipeline(handler, checkpoint_path=path).run(docs)
+
+            assert handler.batches == [["c3", "c4", "c5"]]
+            assert stats.skipped == 3
+            # 全部完成后删除断点
+            assert not os.path.exists(path)
+
+    def test_checkpoint_reconciled_with_index(self, monkeypatch):
+        """测试中断前只暂存在 NumPy 索引中、未保存的向量在重新构建时重新嵌入"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "checkpoint.txt")
+            monkeypatch.setattr(config, "embed_checkpoint_path", path)
+            monkeypatch.setattr(config, "embed_batch_size", 2)
+            docs = make_docs(6)
+
+            index = NumpyVectorIndex(os.path.join(tmp_dir, "index"), ivf_threshold=0)
+            index.add(["c0", "c1"], np.ones((2, 4), dtype=np.float32))
+            index.save()
+            # 模拟中断：c2、c3 已记入断点但没有保存到索引
+            EmbeddingCheckpoint(path).add(["c0", "c1", "c2", "c3"])
+
+            reloaded = NumpyVectorIndex(os.path.join(tmp_dir, "index"), ivf_threshold=0)
+            retriever = VectorRetriever(index=reloaded, embeddings=FixedEmbeddings())
+            stats = retriever.build_index(docs)
+
+            assert stats.skipped == 2
+            assert stats.items == 4
+            assert reloaded.contains([f"c{i}" for i in range(6)]) == {f"c{i}" for i in range(6)}
+
+
+class TestTokenBucket:
+    """令牌桶测试"""
+
+    def test_rate_limit(self):
+        """测试超出突发容量后按速率放行"""
+        bucket = TokenBucket(rate_per_second=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # 首个令牌立即可用，其余 5 个约需 0.1 秒
+        assert time.monotonic() - start >= 0.08
+
+    def test_unlimited(self):
+        """测试速率为 0 时不限速"""
+        bucket = TokenBucket(rate_per_second=0)
+        start = time.monotonic()
+        for _ in range(1000):
+            bucket.acquire()
+        assert time.monotonic() - start < 0.5
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,150 @@
+"""
+测试结果融合
+"""
+
+import pytest
+import os
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.documents import Document
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunk_store import ChunkStore
+from fusion import FusionEngine, FusionSource, chunk_keys
+from hybrid_search import ExtraRetriever, HybridSearcher
+
+
+@dataclass
+class Hit:
+    document: Document
+    score: float
+    rank: int
+
+
+def make_hits(chunk_ids, scores=None):
+    scores = scores or [1.0 / (i + 1) for i in range(len(chunk_ids))]
+    return [
+        Hit(Document(page_content=chunk_id, metadata={"chunk_id": chunk_id}), score, rank)
+        for rank, (chunk_id, score) in enumerate(zip(chunk_ids, scores), 1)
+    ]
+
+
+def reference_fusion(sources, method, rrf_k=60):
+    """逐条累加的对照实现"""
+    fused, order = {}, []
+    hits = {}
+    for source in sources:
+        scores = [hit.score for hit in source.results]
+        low, high = (min(scores), max(scores)) if scores else (0, 0)
+        for hit in source.results:
+            chunk_id = hit.document.metadata["chunk_id"]
+            if chunk_id not in fused:
+                fused[chunk_id] = 0.0
+                hits[chunk_id] = 0
+                order.append(chunk_id)
+            if method == "rrf":
+                fused[chunk_id] += source.weight / (rrf_k + hit.rank)
+            else:
+                normalized = (hit.score - low) / (high - low) if high > low else 1.0
+                fused[chunk_id] += source.weight * normalized
+            hits[chunk_id] += 1
+    if method == "combmnz":
+        fused = {chunk_id: score * hits[chunk_id] for chunk_id, score in fused.items()}
+    return sorted(order, key=lambda chunk_id: -fused[chunk_id]), fused
+
+
+def random_sources(seed: int):
+    rng = np.random.default_rng(seed)
+    sources = []
+    for name, weight in [("bm25", 1.0), ("vector", 0.8), ("expansion_0", 0.5)]:
+        chunk_ids = [f"c{i}" for i in rng.choice(60, 20, replace=False)]
+        scores = sorted(rng.random(20) * 10, reverse=True)
+        sources.append(FusionSource(name, make_hits(chunk_ids, scores), weight))
+    return sources
+
+
+class TestFusionEngine:
+    """融合引擎测试"""
+
+    @pytest.mark.parametrize("method", ["rrf", "combsum", "combmnz"])
+    def test_matches_reference(self, method):
+        """测试与逐条累加的结果一致，截断不改变前 k 个的顺序"""
+        for seed in range(5):
+            sources = random_sources(seed)
+            expected_order, expected_scores = reference_fusion(sources, method)
+
+            engine = FusionEngine(method)
+            full = engine.fuse(sources)
+            ids = [doc.metadata["chunk_id"] for doc in full.documents]
+            assert ids == expected_order
+            np.testing.assert_allclose(full.scores, [expected_scores[i] for i in ids])
+            assert full.total == len(expected_order)
+
+            top = engine.fuse(sources, top_k=5)
+            assert [doc.metadata["chunk_id"] for doc in top.documents] == ids[:5]
+            assert top.total == full.total
+
+    def test_source_ranks(self):
+        """测试各来源名次只为保留的候选填充"""
+        sources = [
+            FusionSource("bm25", make_hits(["a", "b", "c"])),
+            FusionSource("vector", make_hits(["c", "d"])),
+            FusionSource("title", make_hits(["x"]), weight=0),
+        ]
+        fused = FusionEngine("rrf").fuse(sources, top_k=2)
+
+        assert [doc.metadata["chunk_id"] for doc in fused.documents] == ["c", "a"]
+        assert fused.source_names == ["bm25", "vector"]
+        assert list(fused.source_ranks("bm25")) == [3, 1]
+        assert list(fused.source_ranks("vector")) == [1, 0]
+
+    def test_store_rows_as_keys(self):
+        """测试同一存储的文档块直接使用行号作为编号"""
+        store = ChunkStore(":memory:")
+        store.add([hit.document for hit in make_hits(["a", "b", "c"])])
+        docs = store.get_many(["c", "a", "c"])
+        assert list(chunk_keys(docs)) == [2, 0, 2]
+
+        mixed = docs + [Document(page_content="", metadata={"chunk_id": "a"})]
+        assert list(chunk_keys(mixed)) == [0, 1, 0, 1]
+
+    def test_invalid_method(self):
+        """测试不支持的融合方法"""
+        with pytest.raises(ValueError):
+            FusionEngine("borda")
+
+
+class TestExtraRetriever:
+    """额外检索路测试"""
+
+    def test_title_leg_fused(self):
+        """测试额外检索路与两路主检索一起参与融合"""
+
+        class Fake:
+            def __init__(self, chunk_ids):
+                self.chunk_ids = chunk_ids
+
+            def search(self, query, top_k=None):
+                return make_hits(self.chunk_ids)
+
+        searcher = HybridSearcher(
+            Fake(["a", "b"]),
+            Fake(["b", "c"]),
+            extra_retrievers={"title": ExtraRetriever(Fake(["c", "d"]), weight=2.0)},
+        )
+        outcome = searcher.search("查询", top_k=3)
+
+        ids = [r.document.metadata["chunk_id"] for r in outcome.results]
+        assert ids == ["c", "b", "d"]
+        assert outcome.results[0].sources == ["Vector", "title"]
+        assert outcome.results[0].extra_ranks == {"title": 1}
+        assert outcome.stats["hybrid_count"] == 4
+        assert "title" in outcome.legs
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,70 @@
+"""
+测试结果高亮
+"""
+
+import pytest
+import os
+import re
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from highlighter import Highlighter, KeywordAutomaton
+from tokenizer import get_tokenizer
+
+
+@pytest.fixture(scope="module")
+def highlighter():
+    return Highlighter(tokenizer=get_tokenizer())
+
+
+class TestKeywordAutomaton:
+    """Aho–Corasick 自动机测试"""
+
+    def test_overlapping_matches(self):
+        """测试一次扫描找出全部（含重叠）匹配，与逐个关键词查找一致"""
+        keywords = ["he", "she", "his", "hers", "缓存", "缓存策略"]
+        text = "ushers said HIS 缓存策略 and she 缓存"
+        automaton = KeywordAutomaton(keywords)
+
+        found = {(m.start, m.end, automaton.keywords[m.keyword]) for m in automaton.find_all(text)}
+        expected = {
+            (m.start(), m.start() + len(kw), kw)
+            for kw in keywords
+            for m in re.finditer(f"(?={re.escape(kw)})", text.lower())
+        }
+        assert found == expected
+
+
+class TestHighlighter:
+    """高亮器测试"""
+
+    def test_highlight_preserves_case(self, highlighter):
+        """测试不区分大小写匹配，保留原文大小写"""
+        assert highlighter.highlight("Redis CACHE ttl", "redis cache") == (
+            "<mark>Redis</mark> <mark>CACHE</mark> ttl"
+        )
+
+    def test_densest_window(self, highlighter):
+        """测试选取关键词最密集的片段，而不是第一次出现的位置"""
+        text = (
+            "缓存" + "无关内容。" * 40
+            + "数据库索引优化与缓存配合使用可以提升性能。"
+            + "结尾。" * 40
+        )
+        snippet = highlighter.highlight(text, "数据库缓存性能", 60)
+
+        assert snippet.startswith("...") and snippet.endswith("...")
+        assert "<mark>数据库</mark>" in snippet
+        assert "<mark>性能</mark>" in snippet
+        assert len(snippet.replace("<mark>", "").replace("</mark>", "")) == 66
+
+    def test_batch(self, highlighter):
+        """测试批量高亮，未命中时截断开头"""
+        snippets = highlighter.highlight_batch(["没有匹配的文本" * 30, "缓存策略"], "缓存", 20)
+        assert snippets == [("没有匹配的文本" * 3)[:20] + "...", "<mark>缓存</mark>策略"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
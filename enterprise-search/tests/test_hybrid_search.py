@@ -0,0 +1,298 @@
+"""
+测试混合检索
+"""
+
+import pytest
+import os
+import sys
+import time
+
+from langchain_core.documents import Document
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from bm25_retriever import BM25Result
+from vector_retriever import VectorResult
+from hybrid_search import HybridSearcher
+
+
+def make_doc(chunk_id: str) -> Document:
+    return Document(page_content=f"内容 {chunk_id}", metadata={"chunk_id": chunk_id})
+
+
+class FakeBM25:
+    """BM25 检索器替身"""
+
+    def __init__(self, chunk_ids, delay: float = 0, expanded=None, batch_delay: float = 0):
+        self.chunk_ids = chunk_ids
+        self.delay = delay
+        self.expanded = expanded or {}
+        self.batch_delay = batch_delay
+        self.calls = 0
+        self.batch_calls = 0
+
+    def search(self, query, top_k=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self._results(self.chunk_ids)
+
+    def search_batch(self, queries, top_k=None):
+        self.batch_calls += 1
+        time.sleep(self.batch_delay)
+        return [self._results(self.expanded.get(q, [])) for q in queries]
+
+    @staticmethod
+    def _results(chunk_ids):
+        return [
+            BM25Result(document=make_doc(c), score=10.0 - i, rank=i + 1)
+            for i, c in enumerate(chunk_ids)
+        ]
+
+
+class FakeVector:
+    """向量检索器替身"""
+
+    def __init__(self, chunk_ids, delay: float = 0, error: Exception = None):
+        self.chunk_ids = chunk_ids
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.batch_calls = 0
+
+    def search(self, query, top_k=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self._results(self.chunk_ids)
+
+    def search_batch(self, queries, top_k=None):
+        self.batch_calls += 1
+        return [self._results([]) for _ in queries]
+
+    @staticmethod
+    def _results(chunk_ids):
+        return [
+            VectorResult(document=make_doc(c), score=0.9 - i * 0.1, rank=i + 1)
+            for i, c in enumerate(chunk_ids)
+        ]
+
+
+class TestHybridSearcher:
+    """混合检索器测试"""
+
+    def test_rrf_fusion(self):
+        """测试 RRF 融合排序"""
+        searcher = HybridSearcher(FakeBM25(["a", "b", "c"]), FakeVector(["b", "d"]))
+
+        outcome = searcher.search("查询")
+
+        ids = [r.document.metadata["chunk_id"] for r in outcome.results]
+        assert ids[0] == "b"
+        assert set(ids) == {"a", "b", "c", "d"}
+        assert outcome.results[0].sources == ["BM25", "Vector"]
+        assert not outcome.degraded
+
+    def test_outcome_stats_without_rerun(self):
+        """测试统计信息来自同一次检索，不重复调用检索器"""
+        bm25 = FakeBM25(["a", "b", "c"])
+        vector = FakeVector(["b", "c", "d"])
+        searcher = HybridSearcher(bm25, vector)
+
+        outcome = searcher.search("查询")
+
+        assert outcome.stats == {
+            "bm25_count": 3,
+            "vector_count": 3,
+            "hybrid_count": 4,
+            "overlap": 2,
+            "expansion_lists": 0,
+        }
+        assert len(outcome.bm25_results) == 3
+        assert len(outcome.vector_results) == 3
+        assert set(outcome.timings) == {"bm25", "vector", "fusion", "total"}
+        assert bm25.calls == 1
+        assert vector.calls == 1
+
+    def test_legs_run_concurrently(self):
+        """测试两路检索并行执行"""
+        searcher = HybridSearcher(
+            FakeBM25(["a"], delay=0.2), FakeVector(["b"], delay=0.2)
+        )
+
+        start = time.perf_counter()
+        outcome = searcher.search("查询")
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.35
+        assert outcome.legs["bm25"].latency_ms >= 200
+        assert outcome.legs["vector"].latency_ms >= 200
+
+    def test_vector_timeout_degrades(self, monkeypatch):
+        """测试向量检索超时降级为仅 BM25"""
+        monkeypatch.setattr(config, "vector_timeout_ms", 50)
+        searcher = HybridSearcher(FakeBM25(["a", "b"]), FakeVector(["c"], delay=0.5))
+
+        start = time.perf_counter()
+        outcome = searcher.search("查询")
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert outcome.degraded
+        assert outcome.legs["vector"].timed_out
+        assert [r.document.metadata["chunk_id"] for r in outcome.results] == ["a", "b"]
+
+    def test_hung_vector_does_not_starve_bm25(self, monkeypatch):
+        """测试超时的向量检索占满线程池后，后续查询的 BM25 仍能按时返回"""
+        monkeypatch.setattr(config, "retrieval_workers", 1)
+        monkeypatch.setattr(config, "vector_timeout_ms", 50)
+        monkeypatch.setattr(config, "bm25_timeout_ms", 100)
+        searcher = HybridSearcher(FakeBM25(["a"]), FakeVector(["b"], delay=0.5))
+
+        searcher.search("查询")
+        outcome = searcher.search("查询")
+
+        assert outcome.legs["bm25"].ok
+        assert outcome.legs["vector"].timed_out
+        assert [r.document.metadata["chunk_id"] for r in outcome.results] == ["a"]
+
+    def test_vector_error_degrades(self):
+        """测试向量检索异常时降级"""
+        searcher = HybridSearcher(
+            FakeBM25(["a"]), FakeVector(["b"], error=RuntimeError("API 错误"))
+        )
+
+        outcome = searcher.search("查询")
+
+        assert outcome.degraded
+        assert outcome.legs["vector"].error == "API 错误"
+        assert [r.document.metadata["chunk_id"] for r in outcome.results] == ["a"]
+
+
+class TestMultiQuery:
+    """多查询融合测试"""
+
+    def test_expansions_fused(self):
+        """测试扩展查询结果以较低权重参与融合"""
+        bm25 = FakeBM25(["a"], expanded={"同义词1": ["b", "a"], "同义词2": ["b"]})
+        vector = FakeVector(["a"])
+        searcher = HybridSearcher(bm25, vector)
+
+        outcome = searcher.search("查询", expansions=["同义词1", "同义词2"])
+
+        ids = [r.document.metadata["chunk_id"] for r in outcome.results]
+        assert ids == ["a", "b"]
+        assert outcome.results[1].sources == ["Expansion"]
+        assert outcome.results[1].expansion_hits == 2
+        assert outcome.stats["expansion_lists"] == 4
+        # 每个检索器只批量调用一次
+        assert bm25.batch_calls == 1
+        assert vector.batch_calls == 1
+
+        expected = 2 * config.expansion_weight / (config.rrf_k + 1)
+        assert outcome.results[1].rrf_score == pytest.approx(expected)
+
+    def test_slow_expansions_dropped(self, monkeypatch):
+        """测试超出延迟预算的扩展查询被丢弃"""
+        monkeypatch.setattr(config, "expansion_budget_ms", 50)
+        bm25 = FakeBM25(["a"], expanded={"扩展": ["b"]}, batch_delay=0.5)
+        searcher = HybridSearcher(bm25, FakeVector(["a"]))
+
+        start = time.perf_counter()
+        outcome = searcher.search("查询", expansions=["扩展"])
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert outcome.legs["bm25_expanded"].timed_out
+        assert not outcome.degraded
+        assert [r.document.metadata["chunk_id"] for r in outcome.results] == ["a"]
+
+
+class TestPipelinedSearch:
+    """流水线检索测试"""
+
+    def test_expansion_overlaps_retrieval(self):
+        """测试查询扩展与原始查询检索同时进行"""
+        bm25 = FakeBM25(["a"], delay=0.2, expanded={"扩展": ["b"]})
+        vector = FakeVector(["a"], delay=0.2)
+        searcher = HybridSearcher(bm25, vector)
+
+        def expand(query):
+            time.sleep(0.2)
+            return ["扩展"]
+
+        start = time.perf_counter()
+        outcome = searcher.search("查询", expand_fn=expand)
+        elapsed = time.perf_counter() - start
+
+        # 串行执行需要 0.4s 以上
+        assert elapsed < 0.35
+        assert outcome.expanded_terms == ["扩展"]
+        assert [r.document.metadata["chunk_id"] for r in outcome.results] == ["a", "b"]
+
+        stages = {stage.name: stage for stage in outcome.timeline}
+        assert set(stages) == {
+            "bm25",
+            "vector",
+            "expansion",
+            "bm25_expanded",
+            "vector_expanded",
+            "fusion",
+        }
+        assert stages["expansion"].start_ms < stages["bm25"].end_ms
+        assert stages["bm25_expanded"].start_ms >= stages["expansion"].end_ms
+
+    def test_expansion_legs_get_full_budget(self, monkeypatch):
+        """测试扩展查询检索路的超时从提交时计算，不扣除等待查询扩展的时间"""
+        monkeypatch.setattr(config, "expansion_deadline_ms", 500)
+        monkeypatch.setattr(config, "expansion_budget_ms", 150)
+        bm25 = FakeBM25(["a"], expanded={"扩展": ["b"]}, batch_delay=0.05)
+        searcher = HybridSearcher(bm25, FakeVector(["a"]))
+
+        def expand(query):
+            time.sleep(0.2)
+            return ["扩展"]
+
+        outcome = searcher.search("查询", expand_fn=expand)
+
+        assert outcome.legs["bm25_expanded"].ok
+        assert outcome.expanded_terms == ["扩展"]
+        assert "b" in [r.document.metadata["chunk_id"] for r in outcome.results]
+
+    def test_late_expansion_skipped(self, monkeypatch):
+        """测试超过截止时间的扩展结果不参与检索"""
+        monkeypatch.setattr(config, "expansion_deadline_ms", 50)
+        bm25 = FakeBM25(["a"], expanded={"扩展": ["b"]})
+        searcher = HybridSearcher(bm25, FakeVector(["a"]))
+
+        def expand(query):
+            time.sleep(0.5)
+            return ["扩展"]
+
+        start = time.perf_counter()
+        outcome = searcher.search("查询", expand_fn=expand)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert outcome.legs["expansion"].timed_out
+        assert outcome.expanded_terms == []
+        assert bm25.batch_calls == 0
+        assert not outcome.degraded
+        assert [s.status for s in outcome.timeline if s.name == "expansion"] == ["timeout"]
+
+    def test_sequential_mode(self, monkeypatch):
+        """测试关闭并行时按顺序执行"""
+        monkeypatch.setattr(config, "parallel_retrieval", False)
+        bm25 = FakeBM25(["a"], expanded={"扩展": ["b"]})
+        searcher = HybridSearcher(bm25, FakeVector(["c"]))
+
+        outcome = searcher.search("查询", expand_fn=lambda q: ["扩展"])
+
+        assert outcome.expanded_terms == ["扩展"]
+        assert {r.document.metadata["chunk_id"] for r in outcome.results} == {"a", "b", "c"}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
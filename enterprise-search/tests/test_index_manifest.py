@@ -0,0 +1,153 @@
+"""
+测试增量索引清单
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from document_processor import DocumentProcessor
+from index_manifest import IndexManifest
+
+
+def write_file(dir_path: str, name: str, content: str) -> str:
+    path = os.path.join(dir_path, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+class TestChunkIds:
+    """文档块 ID 测试"""
+
+    def test_chunk_ids_stable(self):
+        """测试相同内容生成相同的 chunk_id"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = write_file(tmp_dir, "guide.txt", "缓存可以提升性能。\n\n索引可以加速查询。")
+
+            first = DocumentProcessor().process_file(path)
+            second = DocumentProcessor().process_file(path)
+
+            ids = [chunk.metadata["chunk_id"] for chunk in first.chunks]
+            assert ids == [chunk.metadata["chunk_id"] for chunk in second.chunks]
+            assert all(chunk_id.startswith("guide_") for chunk_id in ids)
+            assert first.content_hash == second.content_hash
+
+    def test_duplicate_chunks_unique_ids(self):
+        """测试同一文件中重复内容的块 ID 不冲突"""
+        processor = DocumentProcessor()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paragraph = "重复的段落内容。" * 40
+            path = write_file(tmp_dir, "dup.txt", f"{paragraph}\n\n{paragraph}")
+
+            processed = processor.process_file(path)
+
+            ids = [chunk.metadata["chunk_id"] for chunk in processed.chunks]
+            assert len(ids) == len(set(ids))
+
+
+class TestIndexManifest:
+    """索引清单测试"""
+
+    def test_diff_tracks_changes(self):
+        """测试新增、变更、删除和未变文件"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            docs_dir = os.path.join(tmp_dir, "docs")
+            os.makedirs(docs_dir)
+            manifest_path = os.path.join(tmp_dir, "manifest.json")
+
+            write_file(docs_dir, "a.txt", "文档 A 的内容。")
+            write_file(docs_dir, "b.txt", "文档 B 第一段。\n\n文档 B 第二段。")
+            write_file(docs_dir, "c.txt", "文档 C 的内容。")
+
+            processed = DocumentProcessor().process_directory(docs_dir)
+            manifest = IndexManifest(manifest_path)
+            assert not manifest.exists
+
+            delta = manifest.diff(processed)
+            assert sorted(delta.new_files) == ["a.txt", "b.txt", "c.txt"]
+            manifest.update(processed)
+            manifest.save()
+
+            # 修改 b，删除 c，新增 d
+            old_b_ids = set(manifest.files["b.txt"]["chunk_ids"])
+            write_file(docs_dir, "b.txt", "全新的 B 内容。")
+            os.remove(os.path.join(docs_dir, "c.txt"))
+            write_file(docs_dir, "d.txt", "文档 D 的内容。")
+
+            processed = DocumentProcessor().process_directory(docs_dir)
+            manifest = IndexManifest(manifest_path)
+            assert manifest.exists
+
+            delta = manifest.diff(processed)
+            assert delta.new_files == ["d.txt"]
+            assert delta.changed_files == ["b.txt"]
+            assert delta.deleted_files == ["c.txt"]
+            assert delta.unchanged_files == 1
+
+            added = {chunk.metadata["filename"] for chunk in delta.added_chunks}
+            assert added == {"b.txt", "d.txt"}
+            assert old_b_ids <= set(delta.removed_chunk_ids)
+
+    def test_no_changes(self):
+        """测试文件未变化时无需更新"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_file(tmp_dir, "a.txt", "文档 A 的内容。")
+            manifest = IndexManifest(os.path.join(tmp_dir, "manifest.json"))
+
+            processed = DocumentProcessor().process_directory(tmp_dir)
+            manifest.update(processed)
+
+            assert manifest.diff(DocumentProcessor().process_directory(tmp_dir)).is_empty
+
+    def test_failed_file_kept(self):
+        """测试解析失败的文件不视为删除，清单保留其原有记录"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_file(tmp_dir, "a.txt", "文档 A 的内容。")
+            write_file(tmp_dir, "b.txt", "文档 B 的内容。")
+            manifest = IndexManifest(os.path.join(tmp_dir, "manifest.json"))
+            manifest.update(DocumentProcessor().process_directory(tmp_dir))
+            b_entry = manifest.files["b.txt"]
+
+            # 模拟 b.txt 本次解析失败
+            processed = [
+                doc
+                for doc in DocumentProcessor().process_directory(tmp_dir)
+                if doc.filename != "b.txt"
+            ]
+            delta = manifest.diff(processed, failed=["b.txt"])
+            assert delta.is_empty
+            assert delta.deleted_files == []
+
+            manifest.update(processed, failed=["b.txt"])
+            assert manifest.files["b.txt"] == b_entry
+            assert sorted(manifest.files) == ["a.txt", "b.txt"]
+
+    def test_chunking_change(self, monkeypatch):
+        """测试文件未变但 chunk_size 变化时重新索引文档块"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            write_file(tmp_dir, "a.txt", "。".join(f"第 {i} 句关于缓存的内容" for i in range(60)))
+            manifest = IndexManifest(os.path.join(tmp_dir, "manifest.json"))
+            manifest.update(DocumentProcessor().process_directory(tmp_dir))
+            old_ids = manifest.files["a.txt"]["chunk_ids"]
+
+            monkeypatch.setattr(config, "chunk_size", 200)
+            monkeypatch.setattr(config, "chunk_overlap", 20)
+            processed = DocumentProcessor().process_directory(tmp_dir)
+            delta = manifest.diff(processed)
+
+            assert delta.unchanged_files == 0
+            assert delta.changed_files == ["a.txt"]
+            new_ids = {chunk.metadata["chunk_id"] for chunk in delta.added_chunks}
+            assert new_ids == set(processed[0].chunk_ids) - set(old_ids)
+            assert new_ids
+            assert set(delta.removed_chunk_ids) == set(old_ids) - set(processed[0].chunk_ids)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
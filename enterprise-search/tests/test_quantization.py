@@ -0,0 +1,127 @@
+"""
+测试向量量化
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantization import ProductQuantizer, ScalarQuantizer
+from vector_index import NumpyVectorIndex, normalize
+
+
+def make_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    """生成带聚类结构的单位向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dim))
+    return normalize(centers[rng.integers(0, 16, n)] + 0.5 * rng.normal(size=(n, dim)))
+
+
+def recall(index: NumpyVectorIndex, vectors: np.ndarray, queries: np.ndarray, k: int) -> float:
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :k]
+    hits = index.search(queries, k)
+    found = sum(
+        len({int(id_) for id_, _ in query_hits} & set(expected))
+        for query_hits, expected in zip(hits, truth)
+    )
+    return found / (k * len(queries))
+
+
+class TestQuantizers:
+    """量化器测试"""
+
+    def test_scalar_score_close(self):
+        """测试 int8 近似内积误差很小"""
+        vectors = make_vectors(1000)
+        queries = make_vectors(5, seed=1)
+        quantizer = ScalarQuantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+
+        assert codes.dtype == np.uint8
+        assert codes.shape == (1000, 32)
+        error = np.abs(quantizer.score(codes, queries) - queries @ vectors.T)
+        assert error.max() < 0.02
+
+    def test_pq_score_close(self):
+        """测试 PQ 的查表分数与解码后向量的内积一致"""
+        vectors = make_vectors(1000)
+        queries = make_vectors(5, seed=1)
+        quantizer = ProductQuantizer.train(vectors, m=8, iterations=5)
+        codes = quantizer.encode(vectors)
+        assert codes.shape == (1000, 8)
+        assert quantizer.bytes_per_vector == 8
+
+        decoded = np.concatenate(
+            [quantizer.codebooks[j][codes[:, j]] for j in range(quantizer.m)], axis=1
+        )
+        np.testing.assert_allclose(
+            quantizer.score(codes, queries), queries @ decoded.T, rtol=1e-4, atol=1e-4
+        )
+
+    def test_pq_subspaces(self):
+        """测试默认分段数及不能整除时报错"""
+        assert ProductQuantizer.default_subspaces(768) == 96
+        assert ProductQuantizer.default_subspaces(100) == 10
+        with pytest.raises(ValueError):
+            ProductQuantizer.train(make_vectors(300), m=5)
+
+
+class TestQuantizedIndex:
+    """量化存储的向量索引测试"""
+
+    @pytest.mark.parametrize("quantization", ["int8", "pq"])
+    def test_rerank_recall(self, quantization):
+        """测试 float32 重排后召回率接近全精度"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(2000)
+            queries = make_vectors(20, seed=2)
+            index = NumpyVectorIndex(
+                tmp_dir, ivf_threshold=0, quantization=quantization, rerank_factor=8
+            )
+            index.add([str(i) for i in range(2000)], vectors)
+
+            assert recall(index, vectors, queries, 10) >= 0.95
+            # 重排后的分数为精确内积
+            id_, score = index.search(queries[:1], 1)[0][0]
+            assert score == pytest.approx(float(queries[0] @ vectors[int(id_)]), abs=1e-5)
+
+    def test_save_and_load(self):
+        """测试保存后常驻内存只有编码，重新加载结果一致"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(1500)
+            queries = make_vectors(5, seed=3)
+            index = NumpyVectorIndex(
+                tmp_dir, ivf_threshold=1000, nlist=10, nprobe=3, quantization="pq"
+            )
+            index.add([str(i) for i in range(1500)], vectors)
+            index.save()
+
+            assert isinstance(index.vectors, np.memmap)
+            assert index.resident_bytes() < vectors.nbytes / 4
+
+            loaded = NumpyVectorIndex(
+                tmp_dir, ivf_threshold=1000, nlist=10, nprobe=3, quantization="pq"
+            )
+            assert loaded.quantizer is not None
+            assert loaded.search(queries, 5) == index.search(queries, 5)
+
+            # 新增向量沿用已训练的量化器
+            loaded.add(["new"], queries[:1])
+            assert loaded.search(queries[:1], 1)[0][0][0] == "new"
+
+            # 量化方式改变时重新训练
+            plain = NumpyVectorIndex(tmp_dir, ivf_threshold=1000, quantization="int8")
+            assert plain.quantizer is None
+            assert plain.count() == 1500
+            plain.search(queries, 5)
+            assert plain.quantizer.name == "int8"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,112 @@
+"""
+测试查询处理器
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import LRUCache, SQLiteCache, TieredCache
+from query_processor import QueryProcessor
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """LLM 替身"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("API 错误")
+        if "扩展查询词" in prompt:
+            return FakeResponse("性能优化, 系统调优, performance")
+        return FakeResponse("系统 性能")
+
+
+def make_processor(cache: TieredCache = None) -> QueryProcessor:
+    processor = QueryProcessor(cache=cache or TieredCache(LRUCache()))
+    processor.model = FakeModel()
+    return processor
+
+
+class TestQueryCache:
+    """扩展/改写缓存测试"""
+
+    def test_expansion_cached(self):
+        """测试重复查询不再调用 LLM"""
+        processor = make_processor()
+
+        first = processor.expand_query("如何提高系统性能")
+        second = processor.expand_query("  如何提高系统性能 ")
+
+        assert first == ["性能优化", "系统调优", "performance"]
+        assert second == first
+        assert processor.model.calls == 1
+
+    def test_rewrite_cached_separately(self):
+        """测试改写与扩展分别缓存"""
+        processor = make_processor()
+
+        processor.expand_query("系统性能")
+        assert processor.rewrite_query("系统性能") == "系统 性能"
+        assert processor.rewrite_query("系统性能") == "系统 性能"
+        assert processor.model.calls == 2
+
+    def test_failures_not_cached(self):
+        """测试失败结果不缓存"""
+        processor = make_processor()
+        processor.model.fail = True
+        assert processor.expand_query("系统性能") == []
+
+        processor.model.fail = False
+        assert processor.expand_query("系统性能") == ["性能优化", "系统调优", "performance"]
+
+    def test_prompt_version_in_key(self):
+        """测试提示词变化后缓存失效"""
+        processor = make_processor()
+        processor.expand_query("系统性能")
+
+        processor.EXPANSION_PROMPT = processor.EXPANSION_PROMPT + "\n"
+        processor.expand_query("系统性能")
+
+        assert processor.model.calls == 2
+
+    def test_warm_up(self):
+        """测试预热：磁盘已有的载入内存，缺失的后台生成"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "query_cache.sqlite3")
+            make_processor(TieredCache(LRUCache(), SQLiteCache(path))).expand_query("热门")
+
+            processor = make_processor(TieredCache(LRUCache(), SQLiteCache(path)))
+            processor.warm_up(["热门", "新查询"])
+
+            for _ in range(50):
+                if len(processor.cache.memory) == 2:
+                    break
+                time.sleep(0.02)
+
+            assert processor.model.calls == 1
+            assert len(processor.cache.memory) == 2
+            # 预热不计入命中统计
+            stats = processor.cache.stats()
+            assert (stats["hits"], stats["misses"]) == (0, 0)
+            processor.expand_query("热门")
+            processor.expand_query("新查询")
+            assert processor.model.calls == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,199 @@
+"""
+测试重排序器
+"""
+
+import pytest
+import os
+import sys
+import threading
+import time
+
+from langchain_core.documents import Document
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from hybrid_search import HybridResult
+from reranker import Reranker
+from rerank_backends import LLMRerankBackend, RerankBackend, create_backend
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """LLM 替身：批量请求返回固定文本，单个请求按内容中的数字评分"""
+
+    def __init__(self, listwise_text: str = None, delay: float = 0):
+        self.listwise_text = listwise_text
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if "JSON 数组" in prompt:
+                return FakeResponse(self.listwise_text)
+            content = prompt.split("文档内容:")[1]
+            return FakeResponse(content.split("分数")[1].split()[0])
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def make_results(scores):
+    return [
+        HybridResult(
+            document=Document(
+                page_content=f"文档{i} 分数 {score}",
+                metadata={"chunk_id": f"c{i}"},
+            ),
+            rrf_score=1.0 / (i + 1),
+            bm25_rank=i + 1,
+        )
+        for i, score in enumerate(scores)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def memory_only_cache(monkeypatch):
+    """测试中不写入磁盘缓存"""
+    monkeypatch.setattr(config, "rerank_cache_persist", False)
+
+
+class TestReranker:
+    """重排序器测试"""
+
+    def test_listwise_single_call(self, monkeypatch):
+        """测试批量模式只调用一次 LLM"""
+        monkeypatch.setattr(config, "rerank_mode", "listwise")
+        backend = LLMRerankBackend()
+        backend.model = FakeModel(listwise_text="```json\n[10, 90, 50, 70]\n```")
+        reranker = Reranker(backend)
+
+        reranked = reranker.rerank("查询", make_results([0, 0, 0, 0]), top_n=2)
+
+        assert backend.model.calls == 1
+        assert [r.document.metadata["chunk_id"] for r in reranked] == ["c1", "c3"]
+        assert [r.relevance_score for r in reranked] == [90, 70]
+        assert [r.original_rank for r in reranked] == [2, 4]
+
+    def test_listwise_fallback_to_pointwise(self, monkeypatch):
+        """测试批量结果无法解析时退回逐个评分"""
+        monkeypatch.setattr(config, "rerank_mode", "listwise")
+        backend = LLMRerankBackend()
+        backend.model = FakeModel(listwise_text="[10, 90]")  # 数量不符
+        reranker = Reranker(backend)
+
+        reranked = reranker.rerank("查询", make_results([30, 80, 60]), top_n=3)
+
+        assert backend.model.calls == 1 + 3
+        assert [r.relevance_score for r in reranked] == [80, 60, 30]
+
+    def test_pointwise_concurrent(self, monkeypatch):
+        """测试逐个评分模式在并发上限内并行请求"""
+        monkeypatch.setattr(config, "rerank_mode", "pointwise")
+        monkeypatch.setattr(config, "rerank_concurrency", 3)
+        backend = LLMRerankBackend()
+        backend.model = FakeModel(delay=0.1)
+        reranker = Reranker(backend)
+
+        start = time.perf_counter()
+        reranked = reranker.rerank("查询", make_results([10, 20, 30, 40, 50, 60]), top_n=3)
+        elapsed = time.perf_counter() - start
+
+        assert [r.relevance_score for r in reranked] == [60, 50, 40]
+        assert backend.model.max_active <= 3
+        assert elapsed < 0.5
+
+    def test_parse_scores(self):
+        """测试分数解析"""
+        parse = LLMRerankBackend._parse_scores
+        assert parse("[1, 2.5, 200]", 3) == [1, 2.5, 100]
+        assert parse("分数: [1, 2]", 3) is None
+        assert parse("无法评分", 1) is None
+        assert parse('["高", "低"]', 2) is None
+
+    def test_custom_backend(self):
+        """测试可插拔的评分后端"""
+
+        class LengthBackend(RerankBackend):
+            name = "length"
+
+            def score(self, query, contents):
+                return [float(len(content)) for content in contents]
+
+        results = make_results([1, 22222, 333])
+        reranked = Reranker(LengthBackend()).rerank("查询", results, top_n=2)
+
+        assert [r.document.metadata["chunk_id"] for r in reranked] == ["c1", "c2"]
+
+    def test_backend_selection(self, monkeypatch):
+        """测试未配置模型目录时使用 LLM 后端"""
+        monkeypatch.setattr(config, "reranker_model", "/nonexistent/model")
+        assert isinstance(create_backend(), LLMRerankBackend)
+
+
+class TestRerankCache:
+    """重排序分数缓存测试"""
+
+    def test_repeated_query_hits_cache(self, monkeypatch):
+        """测试重复查询不再调用 LLM"""
+        monkeypatch.setattr(config, "rerank_mode", "pointwise")
+        backend = LLMRerankBackend()
+        backend.model = FakeModel()
+        reranker = Reranker(backend)
+        results = make_results([30, 80, 60])
+
+        first = reranker.rerank("缓存 查询", results, top_n=3)
+        calls = backend.model.calls
+        second = reranker.rerank("  缓存   查询 ", results, top_n=3)
+
+        assert backend.model.calls == calls
+        assert [r.relevance_score for r in second] == [r.relevance_score for r in first]
+        assert reranker.cache.stats()["hits"] == 3
+
+    def test_only_missing_candidates_scored(self, monkeypatch):
+        """测试只对未命中的候选评分"""
+        monkeypatch.setattr(config, "rerank_mode", "pointwise")
+        backend = LLMRerankBackend()
+        backend.model = FakeModel()
+        reranker = Reranker(backend)
+
+        reranker.rerank("查询", make_results([30, 80]), top_n=2)
+        backend.model.calls = 0
+        reranker.rerank("查询", make_results([30, 80, 60]), top_n=3)
+
+        assert backend.model.calls == 1
+
+    def test_failed_scores_not_cached(self, monkeypatch):
+        """测试评分失败的候选使用中性分数且不写入缓存，下次查询重新评分"""
+        monkeypatch.setattr(config, "rerank_mode", "listwise")
+        backend = LLMRerankBackend()
+        # 批量评分返回无法解析的文本，退回逐个评分；"无" 无法解析为分数
+        backend.model = FakeModel(listwise_text="无法评分")
+        reranker = Reranker(backend)
+        results = make_results([80, "无"])
+
+        reranked = reranker.rerank("查询", results, top_n=2)
+        assert [r.relevance_score for r in reranked] == [80, Reranker.FALLBACK_SCORE]
+        assert len(reranker.cache.memory) == 1
+
+        backend.model.calls = 0
+        reranker.rerank("查询", results, top_n=2)
+        # 批量评分 1 次 + 失败候选逐个评分 1 次
+        assert backend.model.calls == 2
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,209 @@
+"""
+测试元数据过滤检索
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_retriever import BM25Retriever
+from chunk_store import ChunkStore
+from inverted_index import InvertedIndex
+from search_filter import SearchFilter
+from vector_index import NumpyVectorIndex
+
+
+TEXTS = [
+    "缓存是提升系统性能的关键手段",
+    "数据库性能优化需要从索引入手",
+    "Redis cache best practices for performance",
+    "系统性能优化指南：使用缓存和异步处理",
+    "索引设计是数据库优化的基础",
+    "性能监控与告警配置",
+]
+
+
+def make_documents():
+    """三个文件：guide.pdf（带页码）、faq.md、notes.txt"""
+    files = [("guide", "guide.pdf"), ("faq", "faq.md"), ("notes", "notes.txt")]
+    documents = []
+    for i, text in enumerate(TEXTS * 3):
+        doc_id, filename = files[i % 3]
+        metadata = {
+            "doc_id": doc_id,
+            "filename": filename,
+            "chunk_id": f"{doc_id}_{i}",
+            "chunk_index": i,
+        }
+        if filename.endswith(".pdf"):
+            metadata["page"] = i // 3
+        documents.append(Document(page_content=text, metadata=metadata))
+    return documents
+
+
+def matches(doc, search_filter: SearchFilter) -> bool:
+    """逐个文档块判断是否满足过滤条件（作为对照）"""
+    metadata = doc.metadata
+    if search_filter.doc_ids and metadata["doc_id"] not in search_filter.doc_ids:
+        return False
+    if search_filter.filenames and metadata["filename"] not in search_filter.filenames:
+        return False
+    file_type = metadata["filename"].rsplit(".", 1)[1].upper()
+    if search_filter.file_types and file_type not in search_filter.file_types:
+        return False
+    if search_filter.has_page_range:
+        page = metadata.get("page")
+        if page is None:
+            return False
+        if search_filter.page_min is not None and page < search_filter.page_min:
+            return False
+        if search_filter.page_max is not None and page > search_filter.page_max:
+            return False
+    return True
+
+
+FILTERS = [
+    SearchFilter(doc_ids=["faq"]),
+    SearchFilter(file_types=["pdf", "txt"]),
+    SearchFilter(filenames=["guide.pdf"], page_min=2, page_max=4),
+    SearchFilter(page_min=3),
+    SearchFilter(doc_ids=["faq"], page_max=3),
+    SearchFilter(doc_ids=["missing"]),
+]
+
+
+class TestSearchFilter:
+    """过滤条件解析测试"""
+
+    def test_parse_query(self):
+        """测试从查询中拆出过滤条件"""
+        query, search_filter = SearchFilter.parse_query("缓存策略 type:PDF,.md page:3-10 doc:guide")
+        assert query == "缓存策略"
+        assert search_filter.file_types == ["PDF", "MD"]
+        assert search_filter.doc_ids == ["guide"]
+        assert (search_filter.page_min, search_filter.page_max) == (2, 9)
+        assert search_filter.describe() == "doc:guide type:PDF,MD page:3-10"
+
+        _, search_filter = SearchFilter.parse_query('"redis cache" page:5')
+        assert (search_filter.page_min, search_filter.page_max) == (4, 4)
+        _, search_filter = SearchFilter.parse_query("索引 page:5-")
+        assert (search_filter.page_min, search_filter.page_max) == (4, None)
+
+        assert SearchFilter.parse_query("http://example.com 缓存") == ("http://example.com 缓存", None)
+
+    def test_parse_query_keeps_text(self):
+        """测试过滤条件以外的查询保持原样（引号、反斜杠不被解析）"""
+        assert SearchFilter.parse_query(r"C:\Users 配置") == (r"C:\Users 配置", None)
+        query, search_filter = SearchFilter.parse_query('"redis cache" file:"产品 手册.pdf" 缓存')
+        assert query == '"redis cache" 缓存'
+        assert search_filter.filenames == ["产品 手册.pdf"]
+
+    def test_parse_query_invalid_page(self):
+        """测试无效页码给出明确的错误信息"""
+        for page in ("abc", "0", "-", "3-x"):
+            with pytest.raises(ValueError, match=f"无效的页码条件 page:{page}"):
+                SearchFilter.parse_query(f"缓存 page:{page}")
+
+        # 多个页码范围不会静默只保留最后一个
+        for text in ("缓存 page:3,5", "缓存 page:3 page:7-9"):
+            with pytest.raises(ValueError, match="只能指定一个范围"):
+                SearchFilter.parse_query(text)
+
+    def test_store_bitmaps(self):
+        """测试位图索引的结果与逐条判断一致，存储变化后重建"""
+        store = ChunkStore(":memory:")
+        documents = make_documents()
+        store.add(documents[:9])
+
+        for search_filter in FILTERS:
+            expected = [i for i, doc in enumerate(documents[:9]) if matches(doc, search_filter)]
+            assert list(store.filter_rows(search_filter)) == expected
+
+        store.add(documents[9:])
+        rows = store.filter_rows(SearchFilter(doc_ids=["guide"]))
+        assert list(rows) == [i for i in range(18) if i % 3 == 0]
+
+
+class TestFilteredRetrieval:
+    """检索器内的过滤测试"""
+
+    def test_bm25_filter_matches_post_filter(self):
+        """测试过滤检索与先全量检索再过滤的结果一致"""
+        documents = make_documents()
+        retriever = BM25Retriever()
+        retriever.build_index(documents)
+
+        for search_filter in FILTERS:
+            for query in ["系统性能", "数据库索引优化", "cache"]:
+                filtered = retriever.search(query, 20, search_filter=search_filter)
+                expected = [
+                    (result.document.metadata["chunk_id"], result.score)
+                    for result in retriever.search(query, 20)
+                    if matches(result.document, search_filter)
+                ]
+                actual = [(r.document.metadata["chunk_id"], r.score) for r in filtered]
+                assert actual == expected
+
+    def test_bm25_shared_store_order(self):
+        """测试存储中行的顺序与索引不同时过滤仍然正确"""
+        documents = make_documents()
+        store = ChunkStore(":memory:")
+        store.add(list(reversed(documents)))
+        retriever = BM25Retriever(store)
+        retriever.begin_build()
+        retriever.add_documents(documents)
+        retriever.finish_build()
+
+        results = retriever.search("性能", 20, search_filter=SearchFilter(doc_ids=["notes"]))
+        assert results
+        assert {r.document.metadata["doc_id"] for r in results} == {"notes"}
+
+    def test_inverted_index_candidates(self):
+        """测试稀疏候选（二分查找）和稠密候选（位图）两种路径"""
+        rng = np.random.default_rng(0)
+        vocab = [f"w{i}" for i in range(30)]
+        docs = [list(rng.choice(vocab, 12)) for _ in range(400)]
+        index = InvertedIndex.build(docs)
+
+        for size in (5, 300):
+            candidates = np.sort(rng.choice(400, size, replace=False))
+            doc_ids, scores = index.score(["w1", "w2", "w3"], candidates)
+            full = index.get_scores(["w1", "w2", "w3"])
+            expected = candidates[full[candidates] > 0]
+            assert list(doc_ids) == list(expected)
+            np.testing.assert_allclose(scores, full[expected])
+
+    def test_vector_index_ids(self):
+        """测试向量索引只在给定 ID 中检索（精确扫描和 IVF 两种路径）"""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(600, 16)).astype(np.float32)
+        ids = [f"c{i}" for i in range(600)]
+        allowed = ids[::3]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for ivf_threshold in (0, 100):
+                index = NumpyVectorIndex(
+                    os.path.join(tmp_dir, str(ivf_threshold)),
+                    ivf_threshold=ivf_threshold,
+                    nlist=4,
+                    nprobe=4,
+                )
+                index.add(ids, vectors)
+                hits = index.search(vectors[:3], 5, ids=allowed + ["missing"])
+                for query_hits in hits:
+                    assert len(query_hits) == 5
+                    assert all(int(id_[1:]) % 3 == 0 for id_, _ in query_hits)
+                # 查询向量自身（c0）排在第一
+                assert hits[0][0][0] == "c0"
+                assert index.search(vectors[:1], 5, ids=[]) == [[]]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,84 @@
+"""
+测试分词服务
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bm25_retriever import BM25Retriever
+from highlighter import Highlighter
+from tokenizer import Tokenizer
+
+
+class TestTokenizer:
+    """分词服务测试"""
+
+    def test_filters_short_and_stop_words(self):
+        """测试转小写并过滤单字词和停用词"""
+        tokenizer = Tokenizer(workers=1)
+        tokens = tokenizer.tokenize("如何提高 Redis 缓存的性能")
+
+        assert "如何" not in tokens
+        assert "的" not in tokens
+        assert "redis" in tokens
+        assert "缓存" in tokens
+
+    def test_query_cache_shared(self):
+        """测试 BM25 检索和高亮共用同一份查询分词结果"""
+        tokenizer = Tokenizer(workers=1)
+        retriever = BM25Retriever(tokenizer=tokenizer)
+        retriever.build_index([])
+        highlighter = Highlighter(tokenizer=tokenizer)
+
+        tokens = tokenizer.tokenize_query("数据库索引优化")
+        assert tokenizer.tokenize_query("数据库索引优化") is tokens
+        assert retriever._tokenize_query("数据库索引优化") == list(tokens)
+        highlighter.highlight("数据库索引优化需要注意最左前缀", "数据库索引优化")
+
+        stats = tokenizer.stats()
+        assert stats["misses"] == 1
+        assert stats["hits"] == 3
+
+    def test_user_dict_and_stop_words(self):
+        """测试用户词典和停用词表"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            user_dict = os.path.join(tmp_dir, "user_dict.txt")
+            with open(user_dict, "w", encoding="utf-8") as f:
+                f.write("混合检索 100 n\n")
+            stop_words = os.path.join(tmp_dir, "stop_words.txt")
+            with open(stop_words, "w", encoding="utf-8") as f:
+                f.write("# 注释\n系统\n")
+
+            default = Tokenizer(user_dict_path="", stop_words_path="", workers=1)
+            custom = Tokenizer(user_dict, stop_words, workers=1)
+            text = "混合检索系统"
+
+            assert "混合检索" not in default.tokenize(text)
+            assert custom.tokenize(text) == ["混合检索"]
+
+    def test_parallel_batch_matches_serial(self):
+        """测试进程池批量分词与逐条分词结果一致"""
+        texts = [f"第 {i} 段：缓存策略与数据库索引优化 cache TTL" for i in range(40)]
+        serial = Tokenizer(workers=1)
+        parallel = Tokenizer(workers=2)
+        parallel.PARALLEL_MIN_BATCH = 10
+        try:
+            assert parallel.tokenize_batch(texts) == [serial.tokenize(text) for text in texts]
+            assert parallel._pool is not None
+        finally:
+            parallel.close()
+
+    def test_warm_up_once(self):
+        """测试词典只加载一次"""
+        tokenizer = Tokenizer(workers=1)
+        tokenizer.warm_up()
+        assert tokenizer.warm_up() == 0.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,127 @@
+"""
+测试链路追踪
+"""
+
+import pytest
+import os
+import sys
+import json
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing import NULL_SPAN, Tracer, span, traced
+from hybrid_search import HybridSearcher
+from test_hybrid_search import FakeBM25, FakeVector
+
+
+class TestSpans:
+    """span 测试"""
+
+    def test_no_trace_is_noop(self):
+        """测试没有进行中的 trace 时返回空 span"""
+        assert span("bm25.score") is NULL_SPAN
+
+    def test_nesting_and_stage_latencies(self):
+        """测试 span 嵌套关系和分阶段耗时（同名 span 累加）"""
+        with Tracer().start("search", query="q") as trace:
+            with span("hybrid") as hybrid:
+                with span("bm25.score") as inner:
+                    time.sleep(0.01)
+                with span("bm25.score"):
+                    time.sleep(0.01)
+            assert span("probe").trace is trace
+
+        assert span("probe") is NULL_SPAN
+        assert inner.parent_id == hybrid.span_id
+        assert hybrid.parent_id == trace.root.span_id
+
+        stages = trace.stage_latencies()
+        assert set(stages) == {"hybrid", "bm25.score"}
+        assert stages["bm25.score"] >= 20
+        assert stages["hybrid"] >= stages["bm25.score"]
+        assert trace.duration_ms >= stages["hybrid"]
+
+    def test_error_status(self):
+        """测试异常记录在 span 上并继续抛出"""
+        with Tracer().start("search") as trace:
+            with pytest.raises(RuntimeError):
+                with span("rerank"):
+                    raise RuntimeError("backend down")
+
+        assert trace.spans[0].status == "error"
+        assert "backend down" in trace.spans[0].message
+
+    def test_traced_decorator(self):
+        """测试装饰器记录函数调用"""
+
+        @traced("highlight")
+        def work():
+            return 42
+
+        assert work() == 42
+        with Tracer().start("search") as trace:
+            assert work() == 42
+        assert [s.name for s in trace.spans] == ["highlight"]
+
+    def test_spans_from_retrieval_threads(self):
+        """测试线程池中执行的检索路挂到同一条 trace 上"""
+        searcher = HybridSearcher(FakeBM25(["a", "b"], delay=0.01), FakeVector(["b"]))
+        with Tracer().start("search") as trace:
+            searcher.search("查询")
+
+        stages = trace.stage_latencies()
+        assert {"bm25", "vector", "fusion"} <= set(stages)
+        assert stages["bm25"] >= 10
+        assert all(s.parent_id == trace.root.span_id for s in trace.spans)
+
+
+class TestExport:
+    """trace 导出测试"""
+
+    def test_jsonl(self, tmp_path):
+        """测试每行一条 trace"""
+        path = str(tmp_path / "traces.jsonl")
+        tracer = Tracer("jsonl", path)
+        for query in ("a", "b"):
+            with tracer.start("search", query=query):
+                with span("fusion", candidates=3):
+                    pass
+
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert [r["attributes"]["query"] for r in records] == ["a", "b"]
+        assert records[0]["spans"][0]["name"] == "fusion"
+        assert records[0]["spans"][0]["attributes"] == {"candidates": 3}
+
+    def test_otlp(self, tmp_path):
+        """测试 OTLP/JSON 记录的结构"""
+        path = str(tmp_path / "traces.jsonl")
+        with Tracer("otlp", path).start("search", query="q") as trace:
+            with span("vector.embed", queries=2, cached=False):
+                pass
+
+        with open(path, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        spans = record["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root, child = spans
+        assert root["traceId"] == child["traceId"] == trace.trace_id
+        assert len(root["traceId"]) == 32 and len(root["spanId"]) == 16
+        assert child["parentSpanId"] == root["spanId"]
+        assert "parentSpanId" not in root
+        assert int(root["startTimeUnixNano"]) <= int(child["startTimeUnixNano"])
+        assert int(child["endTimeUnixNano"]) <= int(root["endTimeUnixNano"])
+        assert child["attributes"] == [
+            {"key": "queries", "value": {"intValue": "2"}},
+            {"key": "cached", "value": {"boolValue": False}},
+        ]
+
+    def test_invalid_format(self):
+        """测试不支持的导出格式"""
+        with pytest.raises(ValueError):
+            Tracer("zipkin")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
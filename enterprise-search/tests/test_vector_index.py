@@ -0,0 +1,145 @@
+"""
+测试向量索引
+"""
+
+import pytest
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import ChromaVectorIndex, NumpyVectorIndex, normalize
+
+
+def make_vectors(n: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    """生成带聚类结构的随机向量"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(16, dim))
+    return (centers[rng.integers(0, 16, n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int):
+    scores = normalize(queries) @ normalize(vectors).T
+    return [list(np.argsort(-row, kind="stable")[:k]) for row in scores]
+
+
+class TestNumpyVectorIndex:
+    """NumPy 向量索引测试"""
+
+    def test_exact_matches_brute_force(self):
+        """测试精确检索与暴力计算一致（跨多个分块）"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(500)
+            queries = make_vectors(5, seed=1)
+            index = NumpyVectorIndex(tmp_dir, ivf_threshold=0)
+            index.BLOCK_ROWS = 128
+            # 分多批添加
+            for start in range(0, 500, 200):
+                ids = [f"c{i}" for i in range(start, min(start + 200, 500))]
+                index.add(ids, vectors[start : start + 200])
+
+            hits = index.search(queries, 10)
+            for query_hits, expected in zip(hits, brute_force(vectors, queries, 10)):
+                assert [id_ for id_, _ in query_hits] == [f"c{i}" for i in expected]
+                scores = [score for _, score in query_hits]
+                assert scores == sorted(scores, reverse=True)
+
+    def test_upsert_and_delete(self):
+        """测试覆盖和删除"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(20)
+            index = NumpyVectorIndex(tmp_dir, ivf_threshold=0)
+            index.add([f"c{i}" for i in range(20)], vectors)
+            index.delete(["c3", "c4"])
+            # 覆盖 c5 为 c0 的向量
+            index.add(["c5"], vectors[:1])
+
+            assert index.count() == 18
+            hits = index.search(vectors[:1], 2)[0]
+            assert {id_ for id_, _ in hits} == {"c0", "c5"}
+            assert all("c3" != id_ for id_, _ in index.search(vectors[3:4], 18)[0])
+
+    def test_save_and_load(self):
+        """测试保存后以内存映射方式加载，结果一致"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(300)
+            queries = make_vectors(3, seed=2)
+            index = NumpyVectorIndex(tmp_dir, ivf_threshold=100, nprobe=4)
+            index.add([f"c{i}" for i in range(300)], vectors)
+            index.save()
+
+            loaded = NumpyVectorIndex(tmp_dir, ivf_threshold=100, nprobe=4)
+            assert isinstance(loaded.vectors, np.memmap)
+            assert loaded.ivf is not None
+            assert loaded.count() == 300
+            assert loaded.search(queries, 5) == index.search(queries, 5)
+
+            loaded.clear()
+            assert loaded.count() == 0
+            assert NumpyVectorIndex(tmp_dir).count() == 0
+
+    def test_ivf_recall(self):
+        """测试 IVF 召回率随 nprobe 增大而提高，扫描全部簇时与精确检索一致"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = make_vectors(2000)
+            queries = make_vectors(20, seed=3)
+            expected = brute_force(vectors, queries, 10)
+
+            index = NumpyVectorIndex(tmp_dir, ivf_threshold=1000, nlist=20)
+            index.add([str(i) for i in range(2000)], vectors)
+
+            def recall(nprobe: int) -> float:
+                index.nprobe = nprobe
+                hits = index.search(queries, 10)
+                found = sum(
+                    len({int(id_) for id_, _ in query_hits} & set(truth))
+                    for query_hits, truth in zip(hits, expected)
+                )
+                return found / (10 * len(queries))
+
+            assert recall(1) <= recall(4) <= recall(20)
+            assert index.ivf is not None
+            assert recall(20) == 1.0
+
+
+class TestChromaVectorIndex:
+    """Chroma 向量索引测试"""
+
+    def test_search_and_delete(self):
+        """测试与 NumPy 精确检索的结果一致"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = normalize(make_vectors(50))
+            queries = normalize(make_vectors(3, seed=4))
+            index = ChromaVectorIndex(tmp_dir, collection_name="test")
+            index.add([f"c{i}" for i in range(50)], vectors)
+
+            hits = index.search(queries, 5)
+            for query_hits, expected in zip(hits, brute_force(vectors, queries, 5)):
+                assert [id_ for id_, _ in query_hits] == [f"c{i}" for i in expected]
+
+            index.delete(["c0"])
+            assert index.count() == 49
+            index.clear()
+            assert index.search(queries, 5) == [[], [], []]
+
+    @pytest.mark.parametrize("query_by_ids", [True, False])
+    def test_search_within_ids(self, query_by_ids):
+        """测试限定 ID 检索（不支持 ids 参数的版本改用元数据过滤）"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vectors = normalize(make_vectors(50))
+            index = ChromaVectorIndex(tmp_dir, collection_name="test")
+            index.query_by_ids = query_by_ids
+            index.add([f"c{i}" for i in range(50)], vectors)
+
+            allowed = [f"c{i}" for i in range(0, 50, 5)]
+            hits = index.search(vectors[1:2], 3, ids=allowed)[0]
+            assert len(hits) == 3
+            assert {id_ for id_, _ in hits} <= set(allowed)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
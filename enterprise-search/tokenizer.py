@@ -0,0 +1,182 @@
+"""
+分词模块
+BM25 检索器和高亮器共用的 jieba 分词服务：启动时预加载词典，查询分词结果缓存，
+语料分词可分批交给多进程并行处理
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+import jieba
+
+from config import config
+from cache import LRUCache
+
+
+# 内置停用词（单字词已按长度过滤，这里只列常见的多字虚词和疑问词）
+DEFAULT_STOP_WORDS = frozenset(
+    """
+    如何 怎么 怎样 怎么样 什么 为什么 哪些 哪个 是否 可以 能否 一个 一些 这个 那个 这些 那些
+    我们 你们 他们 以及 或者 因为 所以 但是 而且 并且 如果 然后 关于 对于 进行 通过
+    the and for with what how are was were this that from into
+    """.split()
+)
+
+
+def load_word_list(path: str) -> FrozenSet[str]:
+    """读取词表文件（每行一个词，# 开头为注释）"""
+    with open(path, "r", encoding="utf-8") as f:
+        words = (line.strip() for line in f)
+        return frozenset(word.lower() for word in words if word and not word.startswith("#"))
+
+
+class Tokenizer:
+    """
+    共享分词服务（线程安全）
+    tokenize 用于语料，tokenize_query 用于查询（结果缓存，同一查询只分词一次），
+    tokenize_batch 在批量较大时使用进程池并行分词
+    """
+
+    # 批量分词时每批至少多少条才使用进程池（进程间传输有固定开销）
+    PARALLEL_MIN_BATCH = 256
+
+    def __init__(
+        self,
+        user_dict_path: str = None,
+        stop_words_path: str = None,
+        workers: int = None,
+        cache_size: int = None,
+        min_length: int = 2,
+    ):
+        self.user_dict_path = config.user_dict_path if user_dict_path is None else user_dict_path
+        self.stop_words_path = (
+            config.stop_words_path if stop_words_path is None else stop_words_path
+        )
+        self.workers = config.tokenize_workers if workers is None else workers
+        self.min_length = min_length
+
+        self.stop_words = DEFAULT_STOP_WORDS
+        if self.stop_words_path:
+            self.stop_words = self.stop_words | load_word_list(self.stop_words_path)
+
+        self.cache = LRUCache(
+            max_size=config.token_cache_size if cache_size is None else cache_size
+        )
+        self._jieba = jieba.Tokenizer()
+        self._ready = False
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def warm_up(self) -> float:
+        """加载词典（jieba 默认在首次分词时才构建前缀词典），返回耗时秒数"""
+        with self._lock:
+            if self._ready:
+                return 0.0
+            start = time.perf_counter()
+            self._jieba.initialize()
+            if self.user_dict_path:
+                self._jieba.load_userdict(self.user_dict_path)
+            self._ready = True
+            return time.perf_counter() - start
+
+    def fingerprint(self) -> str:
+        """
+        分词配置的指纹：停用词、最短词长，以及用户词典和停用词文件的路径与修改时间
+        BM25 索引的倒排项依赖分词结果，配置变化后需要重建
+        """
+        hasher = hashlib.sha1()
+        hasher.update(f"{self.min_length}\n".encode())
+        hasher.update("\n".join(sorted(self.stop_words)).encode("utf-8"))
+        for path in (self.user_dict_path, self.stop_words_path):
+            mtime_ns = os.stat(path).st_mtime_ns if path and os.path.exists(path) else 0
+            hasher.update(f"\n{path}:{mtime_ns}".encode("utf-8"))
+        return hasher.hexdigest()
+
+    def add_word(self, word: str, freq: int = None, tag: str = None):
+        """添加自定义词（只影响当前进程，批量分词的工作进程请使用用户词典文件）"""
+        self.warm_up()
+        self._jieba.add_word(word, freq, tag)
+        self.cache.clear()
+
+    def tokenize(self, text: str) -> List[str]:
+        """分词（支持中英文）：转小写，过滤短词和停用词"""
+        if not self._ready:
+            self.warm_up()
+        tokens = (token.strip() for token in self._jieba.cut(text.lower()))
+        return [
+            token
+            for token in tokens
+            if len(token) >= self.min_length and token not in self.stop_words
+        ]
+
+    def tokenize_query(self, query: str) -> Tuple[str, ...]:
+        """查询分词（结果缓存；返回元组，调用方共享同一份结果）"""
+        tokens = self.cache.get(query)
+        if tokens is None:
+            tokens = tuple(self.tokenize(query))
+            self.cache.set(query, tokens)
+        return tokens
+
+    def tokenize_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """批量分词语料，批量较大且 workers > 1 时使用进程池"""
+        texts = list(texts)
+        if self.workers <= 1 or len(texts) < self.PARALLEL_MIN_BATCH:
+            return [self.tokenize(text) for text in texts]
+
+        pool = self._get_pool()
+        chunksize = max(1, len(texts) // (self.workers * 4))
+        return list(pool.map(_tokenize_in_worker, texts, chunksize=chunksize))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.user_dict_path, self.stop_words_path, self.min_length),
+                )
+            return self._pool
+
+    def stats(self):
+        """查询分词缓存的命中统计"""
+        return self.cache.stats()
+
+    def close(self):
+        """关闭分词进程池"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+_shared: Optional[Tokenizer] = None
+_shared_lock = threading.Lock()
+
+
+def get_tokenizer() -> Tokenizer:
+    """进程内共享的分词服务"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = Tokenizer()
+        return _shared
+
+
+# 多进程分词：每个工作进程持有一个 Tokenizer
+_worker_tokenizer: Tokenizer = None
+
+
+def _init_worker(user_dict_path: str, stop_words_path: str, min_length: int):
+    global _worker_tokenizer
+    _worker_tokenizer = Tokenizer(
+        user_dict_path, stop_words_path, workers=1, cache_size=0, min_length=min_length
+    )
+    _worker_tokenizer.warm_up()
+
+
+def _tokenize_in_worker(text: str) -> List[str]:
+    return _worker_tokenizer.tokenize(text)
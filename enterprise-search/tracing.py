@@ -0,0 +1,259 @@
+"""
+链路追踪模块
+基于 perf_counter_ns 的轻量 span：一次搜索为一条 trace，查询扩展、各路检索、融合、重排序、
+高亮等阶段为其中的 span。当前 span 通过 contextvars 传递，没有进行中的 trace 时 span() 几乎无开销
+"""
+
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List
+
+
+@dataclass
+class Span:
+    """一个计时区间（时间为 perf_counter_ns）"""
+
+    name: str
+    trace: "Trace"
+    span_id: str
+    parent_id: str = ""
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    status: str = "ok"  # ok / error
+    message: str = ""
+    _token: Any = field(default=None, repr=False)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status, self.message = "error", message
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc is not None:
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        _current_span.reset(self._token)
+        self.trace._finish(self)
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ms": round((self.start_ns - self.trace.origin_ns) / 1e6, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "message": self.message,
+            "attributes": self.attributes,
+        }
+
+
+class _NullSpan:
+    """没有进行中的 trace 时使用的空 span"""
+
+    name = ""
+    duration_ms = 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    """
+    一次请求的全部 span
+    在线程池中执行的阶段需用 contextvars.copy_context() 提交，span 才能挂到同一条 trace 上；
+    trace 结束后才完成的 span（如已超时放弃的检索）不会出现在导出记录中
+    """
+
+    def __init__(self, name: str, tracer: "Tracer" = None, **attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.tracer = tracer
+        self.origin_ns = time.perf_counter_ns()
+        self.epoch_ns = time.time_ns()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._ended = False
+        self.root = Span(name, self, secrets.token_hex(8), attributes=attributes)
+
+    def __enter__(self) -> "Trace":
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root.__exit__(exc_type, exc, tb)
+        return False
+
+    def span(self, name: str, parent: Span = None, **attributes) -> Span:
+        parent = parent or self.root
+        return Span(name, self, secrets.token_hex(8), parent.span_id, attributes=attributes)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            if self._ended:
+                return
+            if span is not self.root:
+                self.spans.append(span)
+                return
+            self._ended = True
+        if self.tracer is not None:
+            self.tracer.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+    def stage_latencies(self) -> Dict[str, float]:
+        """各阶段耗时（毫秒），同名 span 累加"""
+        stages: Dict[str, float] = {}
+        for span in list(self.spans):
+            if span.end_ns:
+                stages[span.name] = stages.get(span.name, 0.0) + span.duration_ms
+        return stages
+
+    def wall_ns(self, perf_ns: int) -> int:
+        """perf_counter_ns 时刻换算为 Unix 纳秒时间戳"""
+        return self.epoch_ns + (perf_ns - self.origin_ns)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "timestamp": round(self.epoch_ns / 1e9, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.root.attributes,
+            "spans": [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start_ns)],
+        }
+
+    def to_otlp(self, service_name: str = "enterprise-search") -> Dict[str, Any]:
+        """OpenTelemetry OTLP/JSON 格式（resourceSpans），可直接交给 Collector 的 otlpjsonfile 接收器"""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes({"service.name": service_name})},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "enterprise-search.tracing"},
+                            "spans": [
+                                self._otlp_span(span) for span in [self.root, *self.spans]
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        record = {
+            "traceId": self.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.wall_ns(span.start_ns)),
+            "endTimeUnixNano": str(self.wall_ns(span.end_ns or span.start_ns)),
+            "attributes": _otlp_attributes(span.attributes),
+            "status": {"code": 1},  # STATUS_CODE_OK
+        }
+        if span.status == "error":
+            record["status"] = {"code": 2, "message": span.message}  # STATUS_CODE_ERROR
+        if span.parent_id:
+            record["parentSpanId"] = span.parent_id
+        return record
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def span(name: str, **attributes):
+    """在当前 trace 中开启一个子 span（with span("bm25.score"): ...），没有 trace 时返回空 span"""
+    parent = _current_span.get()
+    if parent is None:
+        return NULL_SPAN
+    return parent.trace.span(name, parent, **attributes)
+
+
+def traced(name: str) -> Callable:
+    """装饰器：函数调用记录为一个 span"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class Tracer:
+    """
+    trace 工厂与导出器
+    export 为 none 时不写文件（trace 仍用于分阶段统计），jsonl 每行一条 trace，
+    otlp 每行一条 OTLP/JSON 记录
+    """
+
+    EXPORT_FORMATS = ("none", "jsonl", "otlp")
+
+    def __init__(self, export: str = "none", path: str = ""):
+        if export not in self.EXPORT_FORMATS:
+            raise ValueError(f"不支持的 trace 导出格式: {export}，可选 {self.EXPORT_FORMATS}")
+        self.export_format = export
+        self.path = path
+        self._lock = threading.Lock()
+
+    def start(self, name: str, **attributes) -> Trace:
+        return Trace(name, self, **attributes)
+
+    def export(self, trace: Trace):
+        if self.export_format == "none" or not self.path:
+            return
+        record = trace.to_otlp() if self.export_format == "otlp" else trace.to_dict()
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
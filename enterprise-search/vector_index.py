@@ -0,0 +1,553 @@
+"""
+向量索引模块
+统一的向量索引接口，可选 Chroma 或进程内的 NumPy 索引
+NumPy 索引：向量矩阵保存为 .npy（内存映射加载），小规模精确检索，超过阈值后使用 IVF 近似检索
+"""
+
+import inspect
+import json
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from config import config
+from quantization import QUANTIZERS, ProductQuantizer, Quantizer, kmeans, sample_rows
+
+
+# 每个查询的检索结果: [(id, 相似度分数), ...]，按分数降序
+SearchHits = List[List[Tuple[str, float]]]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行归一化为单位向量（余弦相似度即内积）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """对二维分数矩阵的每一行取分数最高的 k 列，返回 (列号, 分数)，按分数降序"""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    if k < scores.shape[1]:
+        columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    selected = np.take_along_axis(scores, columns, axis=1)
+    order = np.argsort(-selected, axis=1, kind="stable")
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(selected, order, axis=1)
+
+
+class VectorIndex(ABC):
+    """向量索引接口（以 chunk_id 作为向量 ID）"""
+
+    name: str = ""
+
+    @abstractmethod
+    def add(self, ids: List[str], vectors: np.ndarray, documents: List[Document] = None):
+        """添加向量，ID 已存在时覆盖"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """按 ID 删除向量"""
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int, ids: List[str] = None) -> SearchHits:
+        """批量检索，queries 形状为 (查询数, 维度)；ids 不为 None 时只在这些向量中检索"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """向量数量"""
+
+    @abstractmethod
+    def contains(self, ids: Iterable[str]) -> Set[str]:
+        """返回 ids 中已在索引里的 ID"""
+
+    @abstractmethod
+    def clear(self):
+        """清空索引"""
+
+    def save(self):
+        """持久化（自行持久化的后端无需实现）"""
+
+
+class ChromaVectorIndex(VectorIndex):
+    """Chroma 向量索引"""
+
+    name = "chroma"
+
+    # 与 LangChain Chroma 相同的距离到相关度分数的换算
+    RELEVANCE_FNS = {
+        "l2": lambda distance: 1.0 - distance / math.sqrt(2),
+        "cosine": lambda distance: 1.0 - distance,
+        "ip": lambda distance: 1.0 - distance if distance > 0 else -distance,
+    }
+
+    # 单次 get 的 ID 数上限（SQLite 参数个数有限）
+    GET_BATCH = 5000
+
+    def __init__(self, path: str = None, collection_name: str = "enterprise_search"):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path or config.data_dir)
+        self.collection_name = collection_name
+        self._open()
+
+    def _open(self):
+        self.collection = self.client.get_or_create_collection(self.collection_name)
+        space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+        self.relevance_fn = self.RELEVANCE_FNS[space]
+        # 较早的 chromadb 版本 query 不支持 ids 参数，改用 chunk_id 元数据过滤
+        self.query_by_ids = "ids" in inspect.signature(self.collection.query).parameters
+
+    def add(self, ids: List[str], vectors: np.ndarray, documents: List[Document] = None):
+        if not ids:
+            return
+        # 元数据中总是带上 chunk_id，供不支持按 ID 检索的版本过滤
+        kwargs = {"metadatas": [{"chunk_id": id_} for id_ in ids]}
+        if documents is not None:
+            kwargs["documents"] = [doc.page_content for doc in documents]
+            kwargs["metadatas"] = [
+                {**doc.metadata, "chunk_id": id_} for id_, doc in zip(ids, documents)
+            ]
+        self.collection.upsert(ids=list(ids), embeddings=np.asarray(vectors), **kwargs)
+
+    def delete(self, ids: List[str]):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def search(self, queries: np.ndarray, k: int, ids: List[str] = None) -> SearchHits:
+        count = self.collection.count() if ids is None else len(ids)
+        if count == 0:
+            return [[] for _ in range(len(queries))]
+
+        results = self.collection.query(
+            query_embeddings=np.asarray(queries),
+            n_results=min(k, count),
+            include=["distances"],
+            **self._restrict(ids),
+        )
+        return [
+            [(id_, self.relevance_fn(distance)) for id_, distance in zip(hit_ids, distances)]
+            for hit_ids, distances in zip(results["ids"], results["distances"])
+        ]
+
+    def _restrict(self, ids: Optional[List[str]]) -> Dict:
+        """限定检索范围的 query 参数"""
+        if ids is None:
+            return {}
+        if self.query_by_ids:
+            return {"ids": list(ids)}
+        return {"where": {"chunk_id": {"$in": list(ids)}}}
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def contains(self, ids: Iterable[str]) -> Set[str]:
+        ids = list(ids)
+        found: Set[str] = set()
+        for start in range(0, len(ids), self.GET_BATCH):
+            result = self.collection.get(ids=ids[start : start + self.GET_BATCH], include=[])
+            found.update(result["ids"])
+        return found
+
+    def clear(self):
+        self.client.delete_collection(self.collection_name)
+        self._open()
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似索引：k-means 聚类，检索时只扫描最近的 nprobe 个簇"""
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = centroids
+        # 第 c 个簇包含的行号为 rows[offsets[c]:offsets[c + 1]]
+        self.offsets = offsets
+        self.rows = rows
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(
+        cls,
+        vectors: np.ndarray,
+        nlist: int,
+        iterations: int = 10,
+        sample_per_list: int = 256,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """在采样向量上训练球面 k-means，再把全部向量分配到最近的簇"""
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        nlist = max(1, min(nlist, n))
+
+        sample = sample_rows(vectors, nlist * sample_per_list, rng)
+        centroids = kmeans(sample, nlist, iterations, rng, spherical=True)
+
+        block_rows = NumpyVectorIndex.BLOCK_ROWS
+        assign = np.concatenate(
+            [
+                np.argmax(np.asarray(vectors[start : start + block_rows]) @ centroids.T, axis=1)
+                for start in range(0, n, block_rows)
+            ]
+        )
+        rows = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, offsets, rows)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """返回最近的 nprobe 个簇中的全部行号（升序，对内存映射读取更友好）"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidates = np.concatenate(
+            [self.rows[self.offsets[c] : self.offsets[c + 1]] for c in probe]
+        )
+        candidates.sort()
+        return candidates
+
+
+class NumpyVectorIndex(VectorIndex):
+    """
+    进程内 NumPy 向量索引（余弦相似度）
+    启用量化时常驻内存的只有编码，float32 向量留在内存映射文件中，
+    只读取近似分数最高的 k * rerank_factor 个候选做精确重排
+    """
+
+    name = "numpy"
+    VERSION = 2
+
+    # 精确检索时每次参与矩阵乘法的向量行数（限制临时分数矩阵的大小）
+    BLOCK_ROWS = 65536
+
+    def __init__(
+        self,
+        path: str = None,
+        ivf_threshold: int = None,
+        nlist: int = None,
+        nprobe: int = None,
+        quantization: str = None,
+        rerank_factor: int = None,
+        pq_subspaces: int = None,
+    ):
+        """
+        ivf_threshold: 向量数达到该值时使用 IVF 近似检索（0 表示始终精确检索）
+        nlist: IVF 簇数（0 表示按 sqrt(n) 自动确定）
+        nprobe: 每次检索扫描的簇数，越大召回越高、延迟越大
+        quantization: none / int8 / pq
+        rerank_factor: 用 float32 向量重排 k * rerank_factor 个候选（0 表示不重排）
+        pq_subspaces: PQ 分段数（0 表示每段 8 维）
+        """
+        self.path = path or config.vector_index_dir
+        self.ivf_threshold = config.ivf_threshold if ivf_threshold is None else ivf_threshold
+        self.nlist = config.ivf_nlist if nlist is None else nlist
+        self.nprobe = config.ivf_nprobe if nprobe is None else nprobe
+        self.quantization = quantization or config.vector_quantization
+        self.rerank_factor = config.rerank_factor if rerank_factor is None else rerank_factor
+        self.pq_subspaces = config.pq_subspaces if pq_subspaces is None else pq_subspaces
+        if self.quantization != "none" and self.quantization not in QUANTIZERS:
+            raise ValueError(f"不支持的量化方式: {self.quantization}")
+
+        self._lock = threading.Lock()
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.ids: List[str] = []
+        self.vectors: np.ndarray = np.zeros((0, 0), dtype=np.float32)
+        self.ivf: Optional[IVFIndex] = None
+        self.quantizer: Optional[Quantizer] = None
+        self.codes: Optional[np.ndarray] = None
+        self._row_of: Optional[Dict[str, int]] = None
+        # 新增和删除先记录下来，检索或保存前再合并（避免每批都复制整个矩阵）
+        self._pending: Dict[str, np.ndarray] = {}
+        self._deleted: Set[str] = set()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def load(self):
+        """加载索引（向量以内存映射方式打开），文件缺失或不一致时视为空索引"""
+        try:
+            with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != self.VERSION:
+                return
+
+            vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+            with open(self._file("ids.txt"), "r", encoding="utf-8") as f:
+                ids = f.read().split("\n") if meta["count"] else []
+            if len(ids) != meta["count"] or len(vectors) != meta["count"]:
+                return
+
+            ivf = None
+            if meta.get("ivf"):
+                ivf = IVFIndex(
+                    *(
+                        np.load(self._file(f"ivf_{name}.npy"))
+                        for name in ("centroids", "offsets", "rows")
+                    )
+                )
+
+            # 量化方式与配置不同时忽略保存的编码，检索时重新训练
+            quantizer, codes = None, None
+            if meta.get("quantization") == self.quantization != "none":
+                with np.load(self._file("quantizer.npz")) as arrays:
+                    quantizer = QUANTIZERS[self.quantization].from_arrays(dict(arrays))
+                codes = np.load(self._file("codes.npy"))
+        except (OSError, ValueError, KeyError):
+            return
+
+        self.ids, self.vectors, self.ivf = ids, vectors, ivf
+        self._row_of = None
+        self.quantizer, self.codes = quantizer, codes
+
+    def save(self):
+        """
+        保存索引（各文件先写临时文件再原子替换，meta.json 最后写入）
+        保存后 float32 向量改为内存映射，不再占用常驻内存
+        """
+        with self._lock:
+            self._prepare()
+            ids, vectors, ivf = self.ids, self.vectors, self.ivf
+            quantizer, codes = self.quantizer, self.codes
+
+        os.makedirs(self.path, exist_ok=True)
+
+        def write(name: str, writer):
+            tmp_path = self._file(name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                writer(f)
+            os.replace(tmp_path, self._file(name))
+
+        if not isinstance(vectors, np.memmap):
+            write("vectors.npy", lambda f: np.save(f, np.ascontiguousarray(vectors)))
+        write("ids.txt", lambda f: f.write("\n".join(ids).encode("utf-8")))
+        if ivf is not None:
+            for name in ("centroids", "offsets", "rows"):
+                write(f"ivf_{name}.npy", lambda f: np.save(f, getattr(ivf, name)))
+        if quantizer is not None:
+            write("quantizer.npz", lambda f: np.savez(f, **quantizer.to_arrays()))
+            write("codes.npy", lambda f: np.save(f, codes))
+        write(
+            "meta.json",
+            lambda f: f.write(
+                json.dumps(
+                    {
+                        "version": self.VERSION,
+                        "count": len(ids),
+                        "ivf": ivf is not None,
+                        "quantization": quantizer.name if quantizer else "none",
+                    }
+                ).encode("utf-8")
+            ),
+        )
+
+        with self._lock:
+            # 保存期间没有新的修改时，改用内存映射
+            if self.vectors is vectors and len(ids) and not isinstance(vectors, np.memmap):
+                self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+
+    def add(self, ids: List[str], vectors: np.ndarray, documents: List[Document] = None):
+        vectors = normalize(vectors)
+        with self._lock:
+            for id_, vector in zip(ids, vectors):
+                self._pending[id_] = vector
+                self._deleted.discard(id_)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for id_ in ids:
+                self._pending.pop(id_, None)
+                self._deleted.add(id_)
+
+    def _prepare(self):
+        """合并修改，按需训练 IVF 和量化器（调用方持有锁）"""
+        self._consolidate()
+        self._ensure_ivf()
+        self._ensure_quantizer()
+
+    def _consolidate(self):
+        """合并待新增和待删除的向量（调用方持有锁）"""
+        if not self._pending and not self._deleted:
+            return
+
+        # 被覆盖的 ID 先删除旧向量
+        removed = self._deleted | self._pending.keys()
+        keep = np.fromiter((id_ not in removed for id_ in self.ids), dtype=bool, count=len(self.ids))
+        pending = np.stack(list(self._pending.values())) if self._pending else None
+
+        parts = [np.asarray(self.vectors[keep])] if len(self.ids) else []
+        if pending is not None:
+            parts.append(pending)
+
+        # 已训练的量化器继续使用，只编码新增的向量
+        if self.quantizer is not None:
+            code_parts = [self.codes[keep]]
+            if pending is not None:
+                code_parts.append(self.quantizer.encode(pending))
+            self.codes = np.concatenate(code_parts)
+
+        self.ids = [id_ for id_, kept in zip(self.ids, keep) if kept] + list(self._pending)
+        self.vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        self.ivf = None
+        self._row_of = None
+        self._pending, self._deleted = {}, set()
+
+    def _ensure_ivf(self):
+        """向量数达到阈值时训练 IVF 索引（调用方持有锁）"""
+        n = len(self.ids)
+        if self.ivf is not None or not self.ivf_threshold or n < self.ivf_threshold:
+            return
+        nlist = self.nlist or int(math.sqrt(n))
+        self.ivf = IVFIndex.train(self.vectors, nlist)
+
+    def _ensure_quantizer(self):
+        """启用量化时训练量化器并编码全部向量（调用方持有锁）"""
+        if self.quantization == "none" or self.quantizer is not None or not self.ids:
+            return
+
+        quantizer_class = QUANTIZERS[self.quantization]
+        if quantizer_class is ProductQuantizer:
+            self.quantizer = ProductQuantizer.train(self.vectors, m=self.pq_subspaces)
+        else:
+            self.quantizer = quantizer_class.train(self.vectors)
+        self.codes = np.concatenate(
+            [
+                self.quantizer.encode(self.vectors[start : start + self.BLOCK_ROWS])
+                for start in range(0, len(self.ids), self.BLOCK_ROWS)
+            ]
+        )
+
+    def resident_bytes(self) -> int:
+        """常驻内存的向量数据字节数（内存映射的向量不计入）"""
+        total = 0 if isinstance(self.vectors, np.memmap) else self.vectors.nbytes
+        if self.codes is not None:
+            total += self.codes.nbytes
+        if self.ivf is not None:
+            total += self.ivf.centroids.nbytes + self.ivf.rows.nbytes
+        return total
+
+    def _rows(self, ids: List[str]) -> np.ndarray:
+        """ID 对应的行号（升序，忽略不存在的 ID；调用方持有锁）"""
+        if self._row_of is None:
+            self._row_of = {id_: row for row, id_ in enumerate(self.ids)}
+        rows = np.fromiter(
+            (row for row in map(self._row_of.get, ids) if row is not None), dtype=np.int64
+        )
+        rows.sort()
+        return rows
+
+    def search(self, queries: np.ndarray, k: int, ids: List[str] = None) -> SearchHits:
+        with self._lock:
+            self._prepare()
+            all_ids, vectors, ivf = self.ids, self.vectors, self.ivf
+            quantizer, codes = self.quantizer, self.codes
+            rows = None if ids is None else self._rows(ids)
+
+        if not all_ids or k <= 0 or (rows is not None and not len(rows)):
+            return [[] for _ in range(len(queries))]
+
+        queries = normalize(queries)
+
+        def score(rows, batch: np.ndarray) -> np.ndarray:
+            """rows 为切片或行号数组；启用量化时计算近似分数"""
+            if quantizer is not None:
+                return quantizer.score(codes[rows], batch)
+            return batch @ np.asarray(vectors[rows]).T
+
+        # 启用量化时先按近似分数取较多候选，再用 float32 向量重排
+        rerank = quantizer is not None and self.rerank_factor > 0
+        n_candidates = k * self.rerank_factor if rerank else k
+
+        # 过滤后的候选较少时直接精确扫描，否则在 IVF 探测到的行中再按过滤条件筛选
+        if ivf is not None and (rows is None or len(rows) >= self.ivf_threshold):
+            hits = []
+            for query in queries:
+                probed = ivf.probe(query, self.nprobe)
+                if rows is not None:
+                    probed = np.intersect1d(probed, rows, assume_unique=True)
+                columns, scores = top_k_rows(score(probed, query[None, :]), n_candidates)
+                hits.append((probed[columns[0]], scores[0]))
+        else:
+            hits = self._search_blocks(score, len(all_ids), queries, n_candidates, rows)
+
+        if rerank:
+            hits = [
+                self._rerank(vectors, query, candidates, k)
+                for query, (candidates, _) in zip(queries, hits)
+            ]
+
+        return [
+            [(all_ids[row], float(score)) for row, score in zip(hit_rows, scores)]
+            for hit_rows, scores in hits
+        ]
+
+    def _search_blocks(
+        self, score, n: int, queries: np.ndarray, k: int, rows: np.ndarray = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """分块计算分数：每块取 top-k，再合并各块的候选；rows 不为 None 时只扫描这些行"""
+        candidate_rows, candidate_scores = [], []
+        for start in range(0, n if rows is None else len(rows), self.BLOCK_ROWS):
+            if rows is None:
+                block = slice(start, start + self.BLOCK_ROWS)
+                block_rows = np.arange(start, min(start + self.BLOCK_ROWS, n))
+            else:
+                block = block_rows = rows[start : start + self.BLOCK_ROWS]
+            columns, scores = top_k_rows(score(block, queries), k)
+            candidate_rows.append(block_rows[columns])
+            candidate_scores.append(scores)
+
+        rows = np.concatenate(candidate_rows, axis=1)
+        scores = np.concatenate(candidate_scores, axis=1)
+        columns, top_scores = top_k_rows(scores, k)
+        top_rows = np.take_along_axis(rows, columns, axis=1)
+        return list(zip(top_rows, top_scores))
+
+    @staticmethod
+    def _rerank(
+        vectors: np.ndarray, query: np.ndarray, rows: np.ndarray, k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """读取候选的 float32 向量计算精确分数"""
+        rows = np.sort(rows)
+        columns, scores = top_k_rows((np.asarray(vectors[rows]) @ query)[None, :], k)
+        return rows[columns[0]], scores[0]
+
+    def count(self) -> int:
+        with self._lock:
+            self._consolidate()
+            return len(self.ids)
+
+    def contains(self, ids: Iterable[str]) -> Set[str]:
+        with self._lock:
+            self._consolidate()
+            if self._row_of is None:
+                self._row_of = {id_: row for row, id_ in enumerate(self.ids)}
+            return {id_ for id_ in ids if id_ in self._row_of}
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+                os.remove(self._file(name))
+
+
+def create_index(backend: str = None) -> VectorIndex:
+    """根据配置创建向量索引"""
+    backend = backend or config.vector_backend
+    if backend == "numpy":
+        return NumpyVectorIndex()
+    if backend == "chroma":
+        return ChromaVectorIndex()
+    raise ValueError(f"不支持的向量索引: {backend}")
@@ -4,14 +4,20 @@
 """
 
 import os
-from typing import List, Tuple
+from typing import Iterable, List
 from dataclasses import dataclass
 
+import numpy as np
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
 
 from config import config
+from chunk_store import ChunkStore
+from embedding_cache import CachedEmbeddings
+from embedding_pipeline import EmbeddingPipeline, PipelineStats
+from search_filter import SearchFilter
+from tracing import span
+from vector_index import VectorIndex, create_index
 
 
 @dataclass
@@ -26,50 +32,116 @@ class VectorResult:
 class VectorRetriever:
     """向量检索器"""
 
-    def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model=config.embedding_model,
-            google_api_key=config.google_api_key,
-        )
+    def __init__(
+        self,
+        store: ChunkStore = None,
+        index: VectorIndex = None,
+        embeddings: CachedEmbeddings = None,
+    ):
+        """
+        store: 文档块存储，检索命中的 chunk_id 从中读取文档块（未提供时为空的内存存储）
+        index: 向量索引，默认按 config.vector_backend 创建
+        embeddings: 向量模型，默认使用 config.embedding_model（基准测试等离线场景可替换）
+        """
+        # 查询向量经过缓存，重复查询不再请求向量接口
+        self.embeddings = embeddings or self._create_embeddings()
 
         os.makedirs(config.data_dir, exist_ok=True)
 
-        self.vectorstore = Chroma(
-            collection_name="enterprise_search",
-            embedding_function=self.embeddings,
-            persist_directory=config.data_dir,
-        )
-
-    def build_index(self, documents: List[Document]):
-        """构建向量索引"""
-        if documents:
-            self.vectorstore.add_documents(documents)
-
-    def search(self, query: str, top_k: int = None) -> List[VectorResult]:
-        """向量检索"""
-        top_k = top_k or config.vector_top_k
+        self.store = store if store is not None else ChunkStore(":memory:")
+        self.index = index or create_index()
 
-        # 带分数的相似度搜索
-        results = self.vectorstore.similarity_search_with_relevance_scores(
-            query=query,
-            k=top_k,
+    @staticmethod
+    def _create_embeddings() -> CachedEmbeddings:
+        base_embeddings = GoogleGenerativeAIEmbeddings(
+            model=config.embedding_model,
+            google_api_key=config.google_api_key,
+        )
+        return CachedEmbeddings(
+            base_embeddings,
+            # 多个查询变体合并为一次批量请求
+            embed_queries_fn=lambda texts: base_embeddings.embed_documents(
+                texts, task_type="RETRIEVAL_QUERY"
+            ),
         )
 
-        vector_results = []
-        for rank, (doc, score) in enumerate(results, 1):
-            vector_results.append(VectorResult(document=doc, score=score, rank=rank))
+    def build_index(self, documents: Iterable[Document]) -> PipelineStats:
+        """
+        构建向量索引（以 chunk_id 作为向量 ID）
+        分批并发写入，中断后重新构建时跳过已写入的文档块
+        """
+        pipeline = EmbeddingPipeline(
+            handler=self._add_batch,
+            id_fn=lambda doc: doc.metadata["chunk_id"],
+            batch_size=config.embed_batch_size,
+            max_workers=config.embed_workers,
+            requests_per_minute=config.embed_requests_per_minute,
+            max_retries=config.embed_max_retries,
+            checkpoint_path=config.embed_checkpoint_path,
+        )
+        if pipeline.checkpoint and pipeline.checkpoint.done:
+            # 断点在批次写入索引后立即记录，而 NumPy 索引要到 save() 才落盘：
+            # 中断后断点中可能有不在索引里的 ID，这些文档块需要重新嵌入
+            pipeline.checkpoint.retain(self.index.contains(pipeline.checkpoint.done))
+        return pipeline.run(documents)
+
+    def _add_batch(self, batch: List[Document], ids: List[str]):
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in batch])
+        self.index.add(ids, np.asarray(vectors, dtype=np.float32), batch)
+
+    def delete(self, chunk_ids: List[str]):
+        """按 chunk_id 删除向量"""
+        if chunk_ids:
+            self.index.delete(list(chunk_ids))
+
+    def save(self):
+        """持久化向量索引"""
+        self.index.save()
+
+    def search(
+        self, query: str, top_k: int = None, search_filter: SearchFilter = None
+    ) -> List[VectorResult]:
+        """向量检索（search_filter 限定检索范围，只扫描满足条件的向量）"""
+        return self.search_batch([query], top_k, search_filter)[0]
+
+    def search_batch(
+        self, queries: List[str], top_k: int = None, search_filter: SearchFilter = None
+    ) -> List[List[VectorResult]]:
+        """批量检索多个查询变体（查询向量一次批量获取）"""
+        top_k = top_k or config.vector_top_k
 
-        return vector_results
+        ids = None
+        if search_filter:
+            with span("vector.filter") as filter_span:
+                chunk_ids = self.store.chunk_ids
+                ids = [chunk_ids[row] for row in self.store.filter_rows(search_filter)]
+                filter_span.set_attribute("candidates", len(ids))
+            if not ids:
+                return [[] for _ in queries]
+
+        with span("vector.embed", queries=len(queries)):
+            vectors = np.stack(self.embeddings.embed_queries(queries))
+        with span("vector.index", backend=type(self.index).__name__):
+            batch_hits = self.index.search(vectors, top_k, ids)
+
+        batch_results = []
+        for hits in batch_hits:
+            # 跳过文档块存储中已不存在的向量（如文档已删除但索引尚未同步）
+            hits = [(chunk_id, score) for chunk_id, score in hits if chunk_id in self.store]
+            documents = self.store.get_many([chunk_id for chunk_id, _ in hits])
+            batch_results.append(
+                [
+                    VectorResult(document=document, score=score, rank=rank)
+                    for rank, (document, (_, score)) in enumerate(zip(documents, hits), 1)
+                ]
+            )
+
+        return batch_results
 
     def clear(self):
         """清空索引"""
-        self.vectorstore.delete_collection()
-        self.vectorstore = Chroma(
-            collection_name="enterprise_search",
-            embedding_function=self.embeddings,
-            persist_directory=config.data_dir,
-        )
+        self.index.clear()
 
     def get_doc_count(self) -> int:
         """获取文档数量"""
-        return self.vectorstore._collection.count()
+        return self.index.count()
@@ -25,10 +25,19 @@ class Config:
     chunk_overlap: int = int(os.getenv("CHUNK_OVERLAP", "100"))
     top_k: int = int(os.getenv("TOP_K", "5"))
 
+    # 文档向量化（分批、并发、限速写入）
+    embed_batch_size: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    embed_workers: int = int(os.getenv("EMBED_WORKERS", "4"))
+    embed_requests_per_minute: float = float(os.getenv("EMBED_RPM", "300"))  # 0 表示不限速
+    embed_max_retries: int = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
     # 路径配置
     docs_dir: str = os.path.join(os.path.dirname(__file__), "docs")
     data_dir: str = os.path.join(os.path.dirname(__file__), "data")
     collection_name: str = "knowledge_base"
+    embed_checkpoint_path: str = os.path.join(
+        os.path.dirname(__file__), "data", "embedding_checkpoint.txt"
+    )
 
     def validate(self) -> bool:
         """验证配置"""
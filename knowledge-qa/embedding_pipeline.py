@@ -0,0 +1,213 @@
+"""
+向量化流水线模块
+分批、限速、并发地写入向量库，失败重试，支持断点续传
+enterprise-search 与 knowledge-qa 各自独立部署，本文件在两个项目中各有一份且内容相同，修改时需同步
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Set
+
+from langchain_core.documents import Document
+
+
+class TokenBucket:
+    """令牌桶限速器（线程安全）"""
+
+    def __init__(self, rate_per_second: float, capacity: float = None):
+        self.rate = rate_per_second
+        self.capacity = capacity or max(1.0, rate_per_second)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """获取令牌，不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+
+                wait_seconds = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait_seconds)
+
+
+class EmbeddingCheckpoint:
+    """断点记录：已写入的 ID 逐行追加到文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Set[str] = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+
+    def add(self, ids: List[str]):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(f"{id_}\n" for id_ in ids)
+            self.done.update(ids)
+
+    def retain(self, ids: Set[str]):
+        """只保留 ids 中的记录并重写断点文件（丢弃实际未持久化的条目）"""
+        with self._lock:
+            if ids >= self.done:
+                return
+            self.done &= ids
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(f"{id_}\n" for id_ in self.done)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """全部完成后删除断点文件"""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.done.clear()
+
+
+@dataclass
+class PipelineStats:
+    """流水线统计"""
+
+    items: int = 0
+    batches: int = 0
+    skipped: int = 0  # 断点中已完成而跳过的条目
+    retries: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    last_error: str = ""  # 最后一个失败批次的错误信息
+    seconds: float = 0.0
+
+    @property
+    def items_per_s(self) -> float:
+        return self.items / self.seconds if self.seconds else 0.0
+
+
+class EmbeddingPipelineError(Exception):
+    """部分批次在重试后仍然失败"""
+
+    def __init__(self, stats: PipelineStats):
+        super().__init__(
+            f"{len(stats.failed_ids)} 个条目写入失败，最后的错误: {stats.last_error}"
+        )
+        self.stats = stats
+
+
+class EmbeddingPipeline:
+    """向量化流水线"""
+
+    def __init__(
+        self,
+        handler: Callable[[List[Document], List[str]], None],
+        id_fn: Callable[[Document], str],
+        batch_size: int = 64,
+        max_workers: int = 4,
+        requests_per_minute: float = 0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        checkpoint_path: str = None,
+    ):
+        """
+        handler: 处理一批文档（如 vectorstore.add_documents），失败时抛出异常
+        requests_per_minute: 每分钟请求数上限，0 表示不限速
+        """
+        self.handler = handler
+        self.id_fn = id_fn
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = TokenBucket(requests_per_minute / 60)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoint = EmbeddingCheckpoint(checkpoint_path) if checkpoint_path else None
+        self._stats_lock = threading.Lock()
+
+    def run(self, documents: Iterable[Document]) -> PipelineStats:
+        """
+        执行流水线（惰性读取输入，同时在途的批次不超过 max_workers 的两倍）
+        全部成功后清除断点；有失败批次时保留断点并抛出 EmbeddingPipelineError
+        """
+        stats = PipelineStats()
+        start = time.perf_counter()
+        max_in_flight = self.max_workers * 2
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="embedding"
+        ) as executor:
+            in_flight = set()
+            for batch, ids in self._batches(documents, stats):
+                if len(in_flight) >= max_in_flight:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.add(executor.submit(self._run_batch, batch, ids, stats))
+            wait(in_flight)
+
+        stats.seconds = time.perf_counter() - start
+
+        if stats.failed_ids:
+            raise EmbeddingPipelineError(stats)
+        if self.checkpoint:
+            self.checkpoint.clear()
+        return stats
+
+    def _batches(self, documents: Iterable[Document], stats: PipelineStats):
+        """按批大小切分，跳过断点中已完成的条目"""
+        batch, ids = [], []
+        for doc in documents:
+            id_ = self.id_fn(doc)
+            if self.checkpoint and id_ in self.checkpoint.done:
+                stats.skipped += 1
+                continue
+
+            batch.append(doc)
+            ids.append(id_)
+            if len(batch) >= self.batch_size:
+                yield batch, ids
+                batch, ids = [], []
+
+        if batch:
+            yield batch, ids
+
+    def _run_batch(self, batch: List[Document], ids: List[str], stats: PipelineStats):
+        """执行单个批次，失败时按指数退避加随机抖动重试"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            try:
+                self.handler(batch, ids)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    with self._stats_lock:
+                        stats.failed_ids.extend(ids)
+                        stats.last_error = str(e)
+                    return
+
+                with self._stats_lock:
+                    stats.retries += 1
+                # full jitter: 在 [0, min(max_delay, base * 2^attempt)] 内随机等待
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt)))
+
+        if self.checkpoint:
+            self.checkpoint.add(ids)
+        with self._stats_lock:
+            stats.items += len(batch)
+            stats.batches += 1
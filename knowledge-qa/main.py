@@ -13,6 +13,7 @@ from rich.table import Table
 from rich import print as rprint
 
 from config import config
+from embedding_pipeline import EmbeddingPipelineError
 from document_loader import DocumentLoader
 from text_splitter import TextSplitter
 from vector_store import VectorStore
@@ -55,8 +56,11 @@ class KnowledgeQA:
         all_docs = self.doc_loader.get_all_documents()
         chunks = self.text_splitter.split_documents(all_docs)
 
-        # 存入向量库
-        self.vector_store.add_documents(chunks)
+        # 存入向量库（部分批次失败时保留断点，下次启动时继续写入）
+        try:
+            self.vector_store.add_documents(chunks)
+        except EmbeddingPipelineError as e:
+            console.print(f"[red]❌ 向量写入未完成: {e}，下次启动时将从断点继续[/red]")
 
         # 显示统计
         stats = self.doc_loader.get_stats()
@@ -0,0 +1,123 @@
+"""
+测试向量存储
+"""
+
+import pytest
+import os
+import sys
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_store
+from config import config
+from embedding_pipeline import EmbeddingCheckpoint
+from vector_store import VectorStore
+
+
+class FakeEmbeddings(Embeddings):
+    """向量模型替身：记录被向量化的文本"""
+
+    embedded = []
+
+    def __init__(self, **kwargs):
+        pass
+
+    def embed_documents(self, texts):
+        FakeEmbeddings.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0, 0.0]
+
+
+def make_chunks(source: str, count: int):
+    return [
+        Document(
+            page_content=f"{source} 片段 {i}",
+            metadata={"source": source, "chunk_index": i},
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """使用临时目录和向量模型替身的向量存储"""
+    monkeypatch.setattr(vector_store, "GoogleGenerativeAIEmbeddings", FakeEmbeddings)
+    monkeypatch.setattr(config, "data_dir", str(tmp_path))
+    monkeypatch.setattr(config, "embed_checkpoint_path", str(tmp_path / "checkpoint.txt"))
+    monkeypatch.setattr(config, "embed_batch_size", 2)
+    monkeypatch.setattr(config, "embed_requests_per_minute", 0)
+    FakeEmbeddings.embedded = []
+    return VectorStore()
+
+
+class TestVectorStore:
+    """向量存储测试"""
+
+    def test_add_documents_skips_existing(self, store):
+        """测试重复导入同一文档不再向量化，也不产生重复向量"""
+        chunks = make_chunks("a.txt", 5)
+
+        assert store.add_documents(chunks) == 5
+        assert len(FakeEmbeddings.embedded) == 5
+        # 全部成功后删除断点
+        assert not os.path.exists(config.embed_checkpoint_path)
+
+        store.add_documents(chunks + make_chunks("b.txt", 1))
+        assert FakeEmbeddings.embedded[5:] == ["b.txt 片段 0"]
+        assert store.get_stats()["total_documents"] == 6
+
+    def test_delete_clears_checkpoint(self, store):
+        """测试删除向量后断点失效，重新导入时重新向量化"""
+        chunks = make_chunks("a.txt", 3)
+        store.add_documents(chunks)
+        # 模拟上次导入中断留下的断点
+        EmbeddingCheckpoint(config.embed_checkpoint_path).add(
+            [VectorStore.document_id(doc) for doc in chunks]
+        )
+
+        store.delete_by_source("a.txt")
+        assert not os.path.exists(config.embed_checkpoint_path)
+        assert store.get_stats()["total_documents"] == 0
+
+        store.add_documents(chunks)
+        assert store.get_stats()["total_documents"] == 3
+
+        EmbeddingCheckpoint(config.embed_checkpoint_path).add(["stale"])
+        store.clear()
+        assert not os.path.exists(config.embed_checkpoint_path)
+        assert store.get_stats()["total_documents"] == 0
+
+    def test_checkpoint_reconciled_with_collection(self, store):
+        """测试断点中不在向量库里的片段重新写入"""
+        chunks = make_chunks("a.txt", 4)
+        store.add_documents(chunks[:2])
+        # 模拟断点记录了 4 个片段，但向量库中只有前 2 个
+        EmbeddingCheckpoint(config.embed_checkpoint_path).add(
+            [VectorStore.document_id(doc) for doc in chunks]
+        )
+
+        store.add_documents(chunks)
+        assert store.get_stats()["total_documents"] == 4
+        assert not os.path.exists(config.embed_checkpoint_path)
+
+
+def test_pipeline_in_sync_with_enterprise_search():
+    """两个项目中的向量化流水线保持一致"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    other = os.path.join(os.path.dirname(root), "enterprise-search", "embedding_pipeline.py")
+    if not os.path.exists(other):
+        pytest.skip("enterprise-search 不在同一目录下")
+    with open(os.path.join(root, "embedding_pipeline.py"), encoding="utf-8") as f:
+        ours = f.read()
+    with open(other, encoding="utf-8") as f:
+        assert f.read() == ours
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -3,13 +3,15 @@
 使用 ChromaDB 进行向量存储和检索
 """
 
+import hashlib
 import os
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Set
 from langchain_core.documents import Document
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_chroma import Chroma
 
 from config import config
+from embedding_pipeline import EmbeddingPipeline
 
 
 class VectorStore:
@@ -35,14 +37,55 @@ class VectorStore:
             persist_directory=config.data_dir,
         )
 
+    @staticmethod
+    def document_id(doc: Document) -> str:
+        """由来源、位置和内容生成稳定 ID，重复导入同一文档不会产生重复向量"""
+        key = "\0".join(
+            [
+                str(doc.metadata.get("source", "")),
+                str(doc.metadata.get("chunk_index", "")),
+                doc.page_content,
+            ]
+        )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
     def add_documents(self, documents: List[Document]) -> int:
-        """添加文档到向量存储"""
+        """添加文档到向量存储（分批并发写入，已存在的片段不再重复向量化）"""
         if not documents:
             return 0
 
-        self.vectorstore.add_documents(documents)
+        pipeline = EmbeddingPipeline(
+            handler=self._add_batch,
+            id_fn=self.document_id,
+            batch_size=config.embed_batch_size,
+            max_workers=config.embed_workers,
+            requests_per_minute=config.embed_requests_per_minute,
+            max_retries=config.embed_max_retries,
+            checkpoint_path=config.embed_checkpoint_path,
+        )
+        if pipeline.checkpoint and pipeline.checkpoint.done:
+            # 断点中只保留向量库中确实存在的 ID（如向量库目录被替换后，其余片段重新写入）
+            pipeline.checkpoint.retain(self._existing_ids(pipeline.checkpoint.done))
+        pipeline.run(documents)
         return len(documents)
 
+    def _existing_ids(self, ids: Iterable[str], batch_size: int = 5000) -> Set[str]:
+        """返回 ids 中已在向量库里的 ID（分批查询，SQLite 参数个数有限）"""
+        ids = list(ids)
+        existing: Set[str] = set()
+        for start in range(0, len(ids), batch_size):
+            existing.update(
+                self.vectorstore.get(ids=ids[start : start + batch_size], include=[])["ids"]
+            )
+        return existing
+
+    def _add_batch(self, batch: List[Document], ids: List[str]):
+        existing = self._existing_ids(ids)
+        new = [(doc, id_) for doc, id_ in zip(batch, ids) if id_ not in existing]
+        if new:
+            docs, new_ids = zip(*new)
+            self.vectorstore.add_documents(list(docs), ids=list(new_ids))
+
     def search(
         self,
         query: str,
@@ -79,11 +122,19 @@ class VectorStore:
         )
         if results and results["ids"]:
             self.vectorstore.delete(ids=results["ids"])
+        self._clear_checkpoint()
 
     def clear(self):
         """清空向量存储"""
         self.vectorstore.delete_collection()
         self._load_or_create()
+        self._clear_checkpoint()
+
+    @staticmethod
+    def _clear_checkpoint():
+        """删除向量后断点中的 ID 不再可信，删除断点文件（下次导入逐批检查已存在的片段）"""
+        if os.path.exists(config.embed_checkpoint_path):
+            os.remove(config.embed_checkpoint_path)
 
     def get_stats(self) -> dict:
         """获取存储统计"""